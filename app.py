@@ -1,19 +1,36 @@
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import time
+DEBUT_IMPORT = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, current_app
 from flask_session import Session
+from werkzeug.local import LocalProxy
 import json
 import math
 import datetime
-from dataclasses import dataclass
+import threading
+from dataclasses import dataclass, asdict
 from typing import Dict, List, Optional
 import os
 import hashlib
 import re
+from compression import installer as installer_compression
+from config_modele import MagasinConfiguration, ModeleCouts
+from devises import DEVISE_BASE, ErreurDevise
+from presets import MULTIPLICATEUR_DELAIS_TAILLE, PARAMETRES_SECTEURS, Presets
+from scenarios import ConflitIdempotence, associer, empreinte, empreinte_demande, scenario_idempotent
+
+# Les modules lourds (validation msgspec, jobs, simulation, recommandations, tables
+# partagées) ne sont importés qu'au premier usage : voir SousSystemes et les vues.
+
+# Routes enregistrées par create_app (le nom de la fonction reste le nom d'endpoint)
+ROUTES = []
 
-app = Flask(__name__)
-app.secret_key = 'erp_cost_calculator_maroc_2024_secret_key_secure_123'
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=1)
-Session(app)
+def route(regle: str, **options):
+    """Déclare une vue; elle est ajoutée à l'application par create_app"""
+    def enregistrer(vue):
+        ROUTES.append((regle, vue, options))
+        return vue
+    return enregistrer
 
 # Modèle de données pour les utilisateurs
 class User:
@@ -25,15 +42,19 @@ class User:
         self.date_creation = datetime.datetime.now()
         self.derniere_connexion = datetime.datetime.now()
 
-# Base de données simulée (en production, utiliser PostgreSQL/MySQL)
-users_db = {
-    'admin@erp.ma': User(
-        'admin123', 
-        'Administrateur ERP', 
-        'admin@erp.ma', 
-        hashlib.sha256('admin123'.encode()).hexdigest()
-    )
-}
+def utilisateurs_initiaux() -> Dict[str, User]:
+    """Comptes présents au démarrage de chaque application"""
+    return {
+        'admin@erp.ma': User(
+            'admin123', 
+            'Administrateur ERP', 
+            'admin@erp.ma', 
+            hashlib.sha256('admin123'.encode()).hexdigest()
+        )
+    }
+
+# Base de données simulée (en production, utiliser PostgreSQL/MySQL), propre à chaque application
+users_db = LocalProxy(lambda: current_app.extensions['utilisateurs'])
 
 @dataclass
 class CoutCache:
@@ -48,10 +69,39 @@ class Entreprise:
     secteur: str
     taille: str
     chiffre_affaires: float
-    nombre_employes: int
+    # None : effectif non renseigné (préréglages : effectif type de la taille)
+    nombre_employes: Optional[int]
+
+class LigneCout:
+    """Ligne de coût compacte dont le texte 'details' est rendu à la demande"""
+    __slots__ = ('valeur', 'description', 'gabarit', 'arguments')
+
+    def __init__(self, valeur, description, gabarit, arguments):
+        self.valeur = valeur
+        self.description = description
+        self.gabarit = gabarit
+        self.arguments = arguments
+
+    @property
+    def details(self) -> str:
+        return self.gabarit.format(*self.arguments)
+
+    def to_dict(self, details: bool = True) -> Dict:
+        ligne = {'valeur': self.valeur, 'description': self.description}
+        if details:
+            ligne['details'] = self.details
+        return ligne
+
+def serialiser_lignes(lignes: Dict[str, LigneCout], cle_total: str, details: bool = True) -> Dict:
+    """Convertit des lignes de coût en dictionnaire JSON avec leur total"""
+    couts = {cle: ligne.to_dict(details) for cle, ligne in lignes.items()}
+    couts[cle_total] = sum(ligne.valeur for ligne in lignes.values())
+    return couts
 
 class CalculateurCoutsERP:
-    def __init__(self):
+    def __init__(self, configuration: Optional[MagasinConfiguration] = None):
+        self.configuration = configuration or MagasinConfiguration()
+        self.presets = Presets()
         self.couts_erreurs = self._initialiser_couts_erreurs()
         self.couts_resistance = self._initialiser_couts_resistance()
         self.couts_imprevus = self._initialiser_couts_imprevus()
@@ -140,175 +190,197 @@ class CalculateurCoutsERP:
             )
         ]
     
-    def calculer_couts_erreurs(self, parametres: Dict) -> Dict:
-        couts = {}
+    def lignes_couts_erreurs(self, parametres: Dict, defauts: Optional[Dict] = None) -> Dict[str, LigneCout]:
+        if defauts is None:
+            defauts = self.configuration.courant().defauts
         
+        # Erreurs de planification
+        delai_reel = parametres.get('delai_reel_mois', defauts['delai_reel_mois'])
+        delai_prevue = parametres.get('delai_prevue_mois', defauts['delai_prevue_mois'])
+        cout_jour_homme = parametres.get('cout_jour_homme', defauts['cout_jour_homme'])
+        cout_planification = max(0, (delai_reel - delai_prevue)) * 22 * cout_jour_homme
+        
+        # Erreurs techniques
+        heures_correction = parametres.get('heures_correction', defauts['heures_correction'])
+        taux_horaire_technicien = parametres.get('taux_horaire_technicien', defauts['taux_horaire_technicien'])
+        cout_technique = heures_correction * taux_horaire_technicien
+        
+        # Formation inadéquate
+        nombre_personnes = parametres.get('nombre_personnes_formation', defauts['nombre_personnes_formation'])
+        duree_formation = parametres.get('duree_formation_jours', defauts['duree_formation_jours'])
+        cout_formation_par_jour = parametres.get('cout_formation_par_jour', defauts['cout_formation_par_jour'])
+        cout_formation = nombre_personnes * duree_formation * cout_formation_par_jour
+        
+        # Configuration personnalisée
+        heures_configuration = parametres.get('heures_configuration', defauts['heures_configuration'])
+        taux_horaire_developpeur = parametres.get('taux_horaire_developpeur', defauts['taux_horaire_developpeur'])
+        cout_configuration = heures_configuration * taux_horaire_developpeur
+        
+        return {
+            'erreurs_planification': LigneCout(
+                cout_planification,
+                'Dépassement délais de mise en œuvre',
+                '{} mois de retard × 22 jours × {} MAD/jour',
+                (delai_reel - delai_prevue, cout_jour_homme)
+            ),
+            'erreurs_techniques': LigneCout(
+                cout_technique,
+                'Corrections techniques et bugs',
+                '{} heures × {} MAD/heure',
+                (heures_correction, taux_horaire_technicien)
+            ),
+            'formation_inadequate': LigneCout(
+                cout_formation,
+                'Formation supplémentaire nécessaire',
+                '{} personnes × {} jours × {} MAD/jour',
+                (nombre_personnes, duree_formation, cout_formation_par_jour)
+            ),
+            'configuration_personnalisee': LigneCout(
+                cout_configuration,
+                'Développements spécifiques supplémentaires',
+                '{} heures × {} MAD/heure',
+                (heures_configuration, taux_horaire_developpeur)
+            )
+        }
+    
+    def calculer_couts_erreurs(self, parametres: Dict, details: bool = True, defauts: Optional[Dict] = None) -> Dict:
         try:
-            # Erreurs de planification
-            delai_reel = parametres.get('delai_reel_mois', 12)
-            delai_prevue = parametres.get('delai_prevue_mois', 8)
-            cout_jour_homme = parametres.get('cout_jour_homme', 800)
-            cout_planification = max(0, (delai_reel - delai_prevue)) * 22 * cout_jour_homme
-            
-            # Erreurs techniques
-            heures_correction = parametres.get('heures_correction', 200)
-            taux_horaire_technicien = parametres.get('taux_horaire_technicien', 150)
-            cout_technique = heures_correction * taux_horaire_technicien
-            
-            # Formation inadéquate
-            nombre_personnes = parametres.get('nombre_personnes_formation', 50)
-            duree_formation = parametres.get('duree_formation_jours', 5)
-            cout_formation_par_jour = parametres.get('cout_formation_par_jour', 500)
-            cout_formation = nombre_personnes * duree_formation * cout_formation_par_jour
-            
-            # Configuration personnalisée
-            heures_configuration = parametres.get('heures_configuration', 100)
-            taux_horaire_developpeur = parametres.get('taux_horaire_developpeur', 200)
-            cout_configuration = heures_configuration * taux_horaire_developpeur
-            
-            couts['erreurs_planification'] = {
-                'valeur': cout_planification,
-                'description': 'Dépassement délais de mise en œuvre',
-                'details': f'{delai_reel - delai_prevue} mois de retard × 22 jours × {cout_jour_homme} MAD/jour'
-            }
-            couts['erreurs_techniques'] = {
-                'valeur': cout_technique,
-                'description': 'Corrections techniques et bugs',
-                'details': f'{heures_correction} heures × {taux_horaire_technicien} MAD/heure'
-            }
-            couts['formation_inadequate'] = {
-                'valeur': cout_formation,
-                'description': 'Formation supplémentaire nécessaire',
-                'details': f'{nombre_personnes} personnes × {duree_formation} jours × {cout_formation_par_jour} MAD/jour'
-            }
-            couts['configuration_personnalisee'] = {
-                'valeur': cout_configuration,
-                'description': 'Développements spécifiques supplémentaires',
-                'details': f'{heures_configuration} heures × {taux_horaire_developpeur} MAD/heure'
-            }
-            
-            couts['total_erreurs'] = cout_planification + cout_technique + cout_formation + cout_configuration
-            
+            return serialiser_lignes(self.lignes_couts_erreurs(parametres, defauts), 'total_erreurs', details)
         except Exception as e:
             print(f"Erreur dans calcul_couts_erreurs: {e}")
-            couts['total_erreurs'] = 0
-            
-        return couts
+            return {'total_erreurs': 0}
     
-    def calculer_couts_resistance(self, parametres: Dict) -> Dict:
-        couts = {}
+    def lignes_couts_resistance(self, parametres: Dict, defauts: Optional[Dict] = None) -> Dict[str, LigneCout]:
+        if defauts is None:
+            defauts = self.configuration.courant().defauts
+        
+        # Baisse de productivité
+        taux_baisse_productivite = parametres.get('taux_baisse_productivite', defauts['taux_baisse_productivite'])
+        salaire_moyen_mensuel = parametres.get('salaire_moyen_mensuel', defauts['salaire_moyen_mensuel'])
+        nombre_employes = parametres.get('nombre_employes', defauts['nombre_employes'])
+        duree_mois = parametres.get('duree_adaptation_mois', defauts['duree_adaptation_mois'])
+        cout_productivite = (taux_baisse_productivite / 100) * salaire_moyen_mensuel * nombre_employes * duree_mois
         
+        # Turnover
+        nombre_departs = parametres.get('nombre_departs', defauts['nombre_departs'])
+        cout_embauche = parametres.get('cout_embauche_par_personne', defauts['cout_embauche_par_personne'])
+        cout_formation_nouvel_employe = parametres.get('cout_formation_nouvel_employe', defauts['cout_formation_nouvel_employe'])
+        cout_turnover = nombre_departs * (cout_embauche + cout_formation_nouvel_employe)
+        
+        # Résistance passive
+        heures_inefficacite = parametres.get('heures_inefficacite', defauts['heures_inefficacite'])
+        taux_horaire_moyen = parametres.get('taux_horaire_moyen', defauts['taux_horaire_moyen'])
+        cout_resistance = heures_inefficacite * taux_horaire_moyen
+        
+        # Support supplémentaire
+        heures_support = parametres.get('heures_support', defauts['heures_support'])
+        taux_horaire_support = parametres.get('taux_horaire_support', defauts['taux_horaire_support'])
+        cout_support = heures_support * taux_horaire_support
+        
+        return {
+            'baisse_productivite': LigneCout(
+                cout_productivite,
+                'Perte de productivité pendant adaptation',
+                '{}% × {} MAD × {} employés × {} mois',
+                (taux_baisse_productivite, salaire_moyen_mensuel, nombre_employes, duree_mois)
+            ),
+            'turnover': LigneCout(
+                cout_turnover,
+                'Coûts liés au départ des employés',
+                '{} départs × ({} + {}) MAD',
+                (nombre_departs, cout_embauche, cout_formation_nouvel_employe)
+            ),
+            'resistance_passive': LigneCout(
+                cout_resistance,
+                'Heures perdues en résistance passive',
+                '{} heures × {} MAD/heure',
+                (heures_inefficacite, taux_horaire_moyen)
+            ),
+            'support_supplementaire': LigneCout(
+                cout_support,
+                'Support technique supplémentaire',
+                '{} heures × {} MAD/heure',
+                (heures_support, taux_horaire_support)
+            )
+        }
+    
+    def calculer_couts_resistance(self, parametres: Dict, details: bool = True, defauts: Optional[Dict] = None) -> Dict:
         try:
-            # Baisse de productivité
-            taux_baisse_productivite = parametres.get('taux_baisse_productivite', 15)
-            salaire_moyen_mensuel = parametres.get('salaire_moyen_mensuel', 8000)
-            nombre_employes = parametres.get('nombre_employes', 100)
-            duree_mois = parametres.get('duree_adaptation_mois', 3)
-            cout_productivite = (taux_baisse_productivite / 100) * salaire_moyen_mensuel * nombre_employes * duree_mois
-            
-            # Turnover
-            nombre_departs = parametres.get('nombre_departs', 5)
-            cout_embauche = parametres.get('cout_embauche_par_personne', 10000)
-            cout_formation_nouvel_employe = parametres.get('cout_formation_nouvel_employe', 5000)
-            cout_turnover = nombre_departs * (cout_embauche + cout_formation_nouvel_employe)
-            
-            # Résistance passive
-            heures_inefficacite = parametres.get('heures_inefficacite', 500)
-            taux_horaire_moyen = parametres.get('taux_horaire_moyen', 50)
-            cout_resistance = heures_inefficacite * taux_horaire_moyen
-            
-            # Support supplémentaire
-            heures_support = parametres.get('heures_support', 300)
-            taux_horaire_support = parametres.get('taux_horaire_support', 100)
-            cout_support = heures_support * taux_horaire_support
-            
-            couts['baisse_productivite'] = {
-                'valeur': cout_productivite,
-                'description': 'Perte de productivité pendant adaptation',
-                'details': f'{taux_baisse_productivite}% × {salaire_moyen_mensuel} MAD × {nombre_employes} employés × {duree_mois} mois'
-            }
-            couts['turnover'] = {
-                'valeur': cout_turnover,
-                'description': 'Coûts liés au départ des employés',
-                'details': f'{nombre_departs} départs × ({cout_embauche} + {cout_formation_nouvel_employe}) MAD'
-            }
-            couts['resistance_passive'] = {
-                'valeur': cout_resistance,
-                'description': 'Heures perdues en résistance passive',
-                'details': f'{heures_inefficacite} heures × {taux_horaire_moyen} MAD/heure'
-            }
-            couts['support_supplementaire'] = {
-                'valeur': cout_support,
-                'description': 'Support technique supplémentaire',
-                'details': f'{heures_support} heures × {taux_horaire_support} MAD/heure'
-            }
-            
-            couts['total_resistance'] = cout_productivite + cout_turnover + cout_resistance + cout_support
-            
+            return serialiser_lignes(self.lignes_couts_resistance(parametres, defauts), 'total_resistance', details)
         except Exception as e:
             print(f"Erreur dans calcul_couts_resistance: {e}")
-            couts['total_resistance'] = 0
-            
-        return couts
+            return {'total_resistance': 0}
     
-    def calculer_couts_imprevus(self, parametres: Dict) -> Dict:
-        couts = {}
+    def lignes_couts_imprevus(self, parametres: Dict, defauts: Optional[Dict] = None) -> Dict[str, LigneCout]:
+        if defauts is None:
+            defauts = self.configuration.courant().defauts
+        
+        # Imprévus organisationnels
+        heures_retravail = parametres.get('heures_retravail', defauts['heures_retravail'])
+        taux_horaire_moyen = parametres.get('taux_horaire_moyen', defauts['taux_horaire_moyen'])
+        cout_organisationnel = heures_retravail * taux_horaire_moyen
         
+        # Problèmes de compatibilité
+        heures_integration = parametres.get('heures_integration', defauts['heures_integration'])
+        taux_horaire_technicien = parametres.get('taux_horaire_technicien', defauts['taux_horaire_technicien'])
+        cout_compatibilite = heures_integration * taux_horaire_technicien
+        
+        # Coûts de maintenance imprévus
+        cout_maintenance_annuel = parametres.get('cout_maintenance_annuel', defauts['cout_maintenance_annuel'])
+        taux_imprevu = parametres.get('taux_maintenance_imprevu', defauts['taux_maintenance_imprevu'])
+        cout_maintenance = cout_maintenance_annuel * (taux_imprevu / 100)
+        
+        # Évolutions réglementaires
+        heures_adaptation = parametres.get('heures_adaptation', defauts['heures_adaptation'])
+        taux_horaire_expert = parametres.get('taux_horaire_expert', defauts['taux_horaire_expert'])
+        cout_reglementaire = heures_adaptation * taux_horaire_expert
+        
+        return {
+            'imprevus_organisationnels': LigneCout(
+                cout_organisationnel,
+                'Retravail des processus organisationnels',
+                '{} heures × {} MAD/heure',
+                (heures_retravail, taux_horaire_moyen)
+            ),
+            'problemes_compatibilite': LigneCout(
+                cout_compatibilite,
+                'Intégration avec systèmes existants',
+                '{} heures × {} MAD/heure',
+                (heures_integration, taux_horaire_technicien)
+            ),
+            'maintenance_imprevue': LigneCout(
+                cout_maintenance,
+                'Maintenance supplémentaire non prévue',
+                '{} MAD × {}%',
+                (cout_maintenance_annuel, taux_imprevu)
+            ),
+            'evolutions_reglementaires': LigneCout(
+                cout_reglementaire,
+                'Adaptations réglementaires',
+                '{} heures × {} MAD/heure',
+                (heures_adaptation, taux_horaire_expert)
+            )
+        }
+    
+    def calculer_couts_imprevus(self, parametres: Dict, details: bool = True, defauts: Optional[Dict] = None) -> Dict:
         try:
-            # Imprévus organisationnels
-            heures_retravail = parametres.get('heures_retravail', 300)
-            taux_horaire_moyen = parametres.get('taux_horaire_moyen', 50)
-            cout_organisationnel = heures_retravail * taux_horaire_moyen
-            
-            # Problèmes de compatibilité
-            heures_integration = parametres.get('heures_integration', 400)
-            taux_horaire_technicien = parametres.get('taux_horaire_technicien', 150)
-            cout_compatibilite = heures_integration * taux_horaire_technicien
-            
-            # Coûts de maintenance imprévus
-            cout_maintenance_annuel = parametres.get('cout_maintenance_annuel', 100000)
-            taux_imprevu = parametres.get('taux_maintenance_imprevu', 20)
-            cout_maintenance = cout_maintenance_annuel * (taux_imprevu / 100)
-            
-            # Évolutions réglementaires
-            heures_adaptation = parametres.get('heures_adaptation', 200)
-            taux_horaire_expert = parametres.get('taux_horaire_expert', 250)
-            cout_reglementaire = heures_adaptation * taux_horaire_expert
-            
-            couts['imprevus_organisationnels'] = {
-                'valeur': cout_organisationnel,
-                'description': 'Retravail des processus organisationnels',
-                'details': f'{heures_retravail} heures × {taux_horaire_moyen} MAD/heure'
-            }
-            couts['problemes_compatibilite'] = {
-                'valeur': cout_compatibilite,
-                'description': 'Intégration avec systèmes existants',
-                'details': f'{heures_integration} heures × {taux_horaire_technicien} MAD/heure'
-            }
-            couts['maintenance_imprevue'] = {
-                'valeur': cout_maintenance,
-                'description': 'Maintenance supplémentaire non prévue',
-                'details': f'{cout_maintenance_annuel} MAD × {taux_imprevu}%'
-            }
-            couts['evolutions_reglementaires'] = {
-                'valeur': cout_reglementaire,
-                'description': 'Adaptations réglementaires',
-                'details': f'{heures_adaptation} heures × {taux_horaire_expert} MAD/heure'
-            }
-            
-            couts['total_imprevus'] = cout_organisationnel + cout_compatibilite + cout_maintenance + cout_reglementaire
-            
+            return serialiser_lignes(self.lignes_couts_imprevus(parametres, defauts), 'total_imprevus', details)
         except Exception as e:
             print(f"Erreur dans calcul_couts_imprevus: {e}")
-            couts['total_imprevus'] = 0
-            
-        return couts
+            return {'total_imprevus': 0}
+    
+    def modele(self) -> ModeleCouts:
+        """Version du modèle de coûts actuellement en vigueur"""
+        return self.configuration.courant()
     
-    def calculer_couts_totaux(self, entreprise: Entreprise, parametres: Dict) -> Dict:
+    def calculer_couts_totaux(self, entreprise: Entreprise, parametres: Dict, details: bool = True) -> Dict:
+        # Un seul instantané du modèle pour tout le calcul, même en cas de rechargement concurrent
+        modele = self.modele()
         try:
-            couts_erreurs = self.calculer_couts_erreurs(parametres)
-            couts_resistance = self.calculer_couts_resistance(parametres)
-            couts_imprevus = self.calculer_couts_imprevus(parametres)
+            defauts = self.presets.defauts_pour(modele, entreprise)
+            couts_erreurs = self.calculer_couts_erreurs(parametres, details, defauts)
+            couts_resistance = self.calculer_couts_resistance(parametres, details, defauts)
+            couts_imprevus = self.calculer_couts_imprevus(parametres, details, defauts)
             
             total_general = (
                 couts_erreurs.get('total_erreurs', 0) + 
@@ -329,7 +401,8 @@ class CalculateurCoutsERP:
                 'couts_imprevus': couts_imprevus,
                 'total_general': total_general,
                 'date_calcul': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'pourcentage_ca': (total_general / entreprise.chiffre_affaires * 100) if entreprise.chiffre_affaires > 0 else 0
+                'pourcentage_ca': (total_general / entreprise.chiffre_affaires * 100) if entreprise.chiffre_affaires > 0 else 0,
+                'version_modele': modele.version
             }
         except Exception as e:
             print(f"Erreur dans calcul_couts_totaux: {e}")
@@ -343,11 +416,304 @@ class CalculateurCoutsERP:
                 },
                 'erreur': str(e),
                 'total_general': 0,
-                'pourcentage_ca': 0
+                'pourcentage_ca': 0,
+                'version_modele': modele.version
             }
+    
+    def calculer_reference(self, entreprise: Entreprise, details: bool = True) -> Dict:
+        """Calcul sans paramètres spécifiques, servi depuis le cache des préréglages"""
+        modele = self.modele()
+        resultat = self.presets.reference(modele, entreprise, details)
+        
+        if resultat is None:
+            resultat = self.calculer_couts_totaux(entreprise, {}, details)
+            if 'erreur' not in resultat and resultat['version_modele'] == modele.version:
+                self.presets.memoriser_reference(modele, entreprise, details, resultat)
+            return resultat
+        
+        return {
+            **resultat,
+            'entreprise': asdict(entreprise),
+            'date_calcul': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+
+def entreprise_depuis_demande(demande) -> Entreprise:
+    """Crée l'entreprise à partir d'une demande de calcul validée"""
+    return Entreprise(
+        nom=demande.nom_entreprise,
+        secteur=demande.secteur,
+        taille=demande.taille,
+        chiffre_affaires=demande.chiffre_affaires,
+        nombre_employes=demande.nombre_employes
+    )
+
+RACINE_APP = os.path.dirname(os.path.abspath(__file__))
+
+def configuration_environnement() -> Dict:
+    """Chemins des sous-systèmes lus dans l'environnement, surchargeables par create_app(config)"""
+    return {
+        # Modèle de coûts rechargé à chaud
+        'CHEMIN_MODELE_CONFIG': os.environ.get('ERP_MODELE_CONFIG', os.path.join(RACINE_APP, 'modele_couts.json')),
+        # Mode multi-workers : tables de référence projetées en mémoire depuis un fichier partagé
+        'CHEMIN_TABLES_PARTAGEES': os.environ.get('ERP_TABLES_PARTAGEES'),
+        # Taux de change locaux, appliqués aux résultats calculés en MAD
+        'CHEMIN_TAUX_CHANGE': os.environ.get('ERP_TAUX_CHANGE', os.path.join(RACINE_APP, 'taux_change.json')),
+        # Journal d'activité (connexions, calculs, rapports) écrit en arrière-plan
+        'DOSSIER_JOURNAL': os.environ.get('ERP_JOURNAL', os.path.join(RACINE_APP, 'journal')),
+        # Pages pré-rendues et ressources empreintées (python statique.py), servies si défini
+        'DOSSIER_STATIQUE': os.environ.get('ERP_STATIQUE')
+    }
+
+class sous_systeme:
+    """Attribut construit au premier accès (une seule fois, même en concurrence) et chronométré"""
+
+    def __init__(self, fabrique):
+        self.fabrique = fabrique
+        self.nom = fabrique.__name__
+        self.__doc__ = fabrique.__doc__
 
-# Initialisation du calculateur
-calculateur = CalculateurCoutsERP()
+    def __get__(self, instance, proprietaire):
+        if instance is None:
+            return self
+        with instance._verrou:
+            if self.nom not in instance.__dict__:
+                debut = time.perf_counter()
+                instance.__dict__[self.nom] = self.fabrique(instance)
+                instance.durees_initialisation[self.nom] = round((time.perf_counter() - debut) * 1000, 2)
+        # Les accès suivants lisent directement l'attribut d'instance, sans verrou
+        return instance.__dict__[self.nom]
+
+class SousSystemes:
+    """Sous-systèmes d'une application, initialisés (et leurs modules importés) au premier usage"""
+
+    def __init__(self, config):
+        self.config = config
+        self._verrou = threading.RLock()
+        self.durees_initialisation: Dict[str, float] = {}
+
+    @sous_systeme
+    def calculateur(self):
+        calculateur = CalculateurCoutsERP(MagasinConfiguration(self.config['CHEMIN_MODELE_CONFIG']))
+        calculateur.presets.tables = self.tables_partagees
+        return calculateur
+
+    @sous_systeme
+    def tables_partagees(self):
+        if not self.config.get('CHEMIN_TABLES_PARTAGEES'):
+            return None
+        from tables_partagees import TablesPartagees
+        return TablesPartagees(self.config['CHEMIN_TABLES_PARTAGEES'])
+
+    @sous_systeme
+    def moteur_recommandations(self):
+        """Règles de recommandation compilées une fois"""
+        from recommandations import MoteurRecommandations
+        return MoteurRecommandations()
+
+    @sous_systeme
+    def gestionnaire_jobs(self):
+        """Traitements longs (simulations, balayages) exécutés en arrière-plan"""
+        from jobs import GestionnaireJobs
+        return GestionnaireJobs()
+
+    @sous_systeme
+    def magasin_scenarios(self):
+        """Résultats complets partagés entre demandes identiques (cache du processus)"""
+        from scenarios import MagasinScenarios
+        return MagasinScenarios()
+
+    @sous_systeme
+    def convertisseur_devises(self):
+        from devises import ConvertisseurDevises
+        return ConvertisseurDevises(self.config['CHEMIN_TAUX_CHANGE'])
+
+    @sous_systeme
+    def journal(self):
+        from journal import JournalEvenements
+        return JournalEvenements(self.config['DOSSIER_JOURNAL'])
+
+# Sous-systèmes de l'application courante (app.extensions['sous_systemes'], créés par create_app)
+sous_systemes = LocalProxy(lambda: current_app.extensions['sous_systemes'])
+
+def resultat_scenario(scenario_id: str, version_modele: str, entreprise: Entreprise,
+                      parametres: Dict, details: bool) -> Dict:
+    """Résultat du scénario, calculé puis stocké s'il n'est pas déjà dans le magasin"""
+    resultats = sous_systemes.magasin_scenarios.resultat(scenario_id)
+    if resultats is None:
+        if parametres:
+            resultats = sous_systemes.calculateur.calculer_couts_totaux(entreprise, parametres, details)
+        else:
+            # Cas par défaut servi depuis les références précalculées
+            resultats = sous_systemes.calculateur.calculer_reference(entreprise, details)
+        # Le modèle a pu être rechargé pendant le calcul : pas de résultat stocké sous une autre version
+        if resultats['version_modele'] == version_modele:
+            sous_systemes.magasin_scenarios.enregistrer(scenario_id, resultats)
+    return resultats
+
+def journaliser(type_evenement: str, **donnees):
+    """Ajoute un événement d'activité au journal, sans E/S sur le chemin de la requête"""
+    try:
+        # Les valeurs de l'appelant (email tenté à la connexion) remplacent celles de la session
+        sous_systemes.journal.enregistrer(type_evenement, **{
+            'user_id': session.get('user_id'),
+            'email': session.get('user_email'),
+            'ip': request.remote_addr,
+            **donnees
+        })
+    except Exception as e:
+        # Le journal ne doit jamais faire échouer la requête
+        print(f"❌ Journal indisponible: {str(e)}")
+
+def devise_demandee() -> str:
+    """Devise de la réponse (?devise=EUR), validée contre la table de taux courante"""
+    devise = request.args.get('devise', DEVISE_BASE).strip().upper()
+    sous_systemes.convertisseur_devises.courante().taux_vers(devise)
+    return devise
+
+def en_devise(traitement, devise: str):
+    """Traitement de job dont la progression et le résultat sont convertis dans la devise"""
+    # Résolu pendant la requête : le job s'exécute hors du contexte de l'application
+    convertisseur = sous_systemes.convertisseur_devises
+
+    def traitement_converti(*args, publier):
+        def publier_converti(type_evenement, **donnees):
+            publier(type_evenement, **convertisseur.convertir(donnees, devise))
+        return convertisseur.convertir(traitement(*args, publier=publier_converti), devise)
+    return traitement_converti
+
+# Entreprises d'exemple proposées dans le formulaire
+EXEMPLES_ENTREPRISES = [
+    {
+        'nom': 'Société Industrielle Marocaine (SIM)',
+        'secteur': 'Industrie',
+        'taille': 'Grande',
+        'chiffre_affaires': 50000000,
+        'nombre_employes': 300,
+        'description': 'Entreprise industrielle avec processus complexes'
+    },
+    {
+        'nom': 'Distributeur National (DN)',
+        'secteur': 'Distribution',
+        'taille': 'Moyenne',
+        'chiffre_affaires': 20000000,
+        'nombre_employes': 150,
+        'description': 'Chaîne de distribution nationale'
+    },
+    {
+        'nom': 'PME Services (PME-S)',
+        'secteur': 'Services',
+        'taille': 'Petite',
+        'chiffre_affaires': 5000000,
+        'nombre_employes': 50,
+        'description': 'PME spécialisée dans les services'
+    },
+    {
+        'nom': 'Groupe Textile Marocain (GTM)',
+        'secteur': 'Textile',
+        'taille': 'Grande',
+        'chiffre_affaires': 80000000,
+        'nombre_employes': 500,
+        'description': 'Groupe textile exportateur'
+    }
+]
+
+# Données statistiques simulées pour le Maroc
+STATS_SECTEURS = {
+    'Industrie': {
+        'couts_moyens_erreurs': 450000,
+        'couts_moyens_resistance': 350000,
+        'couts_moyens_imprevus': 300000,
+        'total_moyen': 1100000,
+        'nombre_implementations': 25,
+        'taux_reussite': '72%'
+    },
+    'Services': {
+        'couts_moyens_erreurs': 300000,
+        'couts_moyens_resistance': 250000,
+        'couts_moyens_imprevus': 200000,
+        'total_moyen': 750000,
+        'nombre_implementations': 40,
+        'taux_reussite': '85%'
+    },
+    'Distribution': {
+        'couts_moyens_erreurs': 400000,
+        'couts_moyens_resistance': 300000,
+        'couts_moyens_imprevus': 250000,
+        'total_moyen': 950000,
+        'nombre_implementations': 30,
+        'taux_reussite': '78%'
+    },
+    'Textile': {
+        'couts_moyens_erreurs': 500000,
+        'couts_moyens_resistance': 400000,
+        'couts_moyens_imprevus': 350000,
+        'total_moyen': 1250000,
+        'nombre_implementations': 15,
+        'taux_reussite': '65%'
+    },
+    'Tous': {
+        'couts_moyens_erreurs': 412500,
+        'couts_moyens_resistance': 325000,
+        'couts_moyens_imprevus': 275000,
+        'total_moyen': 1012500,
+        'nombre_implementations': 110,
+        'taux_reussite': '75%'
+    }
+}
+
+def estimer_exemples() -> List[Dict]:
+    """Exemples d'entreprises avec leur estimation de référence (servie depuis le cache des préréglages)"""
+    exemples = []
+    for exemple in EXEMPLES_ENTREPRISES:
+        resultat = sous_systemes.calculateur.calculer_reference(Entreprise(
+            nom=exemple['nom'],
+            secteur=exemple['secteur'],
+            taille=exemple['taille'],
+            chiffre_affaires=exemple['chiffre_affaires'],
+            nombre_employes=exemple['nombre_employes']
+        ), details=False)
+        exemples.append({
+            **exemple,
+            'total_general': resultat['total_general'],
+            'pourcentage_ca': resultat['pourcentage_ca'],
+            'version_modele': resultat['version_modele']
+        })
+    return exemples
+
+def construire_tables_reference() -> Dict:
+    """Tables en lecture seule publiées dans le fichier partagé entre workers"""
+    modele = sous_systemes.calculateur.modele()
+    secteurs = set(PARAMETRES_SECTEURS) | set(modele.secteurs)
+    return {
+        'stats_secteurs': STATS_SECTEURS,
+        'exemples': {exemple['nom']: exemple for exemple in estimer_exemples()},
+        'presets': {
+            f'{secteur}|{taille}': sous_systemes.calculateur.presets.base(modele, secteur, taille)
+            for secteur in sorted(secteurs)
+            for taille in MULTIPLICATEUR_DELAIS_TAILLE
+        }
+    }
+
+def tables_reference():
+    """Tables partagées à jour pour le modèle courant (None hors mode partagé ou pendant un changement de modèle)"""
+    tables_partagees = sous_systemes.tables_partagees
+    if tables_partagees is None:
+        return None
+    
+    modele = sous_systemes.calculateur.modele()
+    meta = tables_partagees.meta
+    if meta.get('version_modele') == modele.version:
+        return tables_partagees
+    if meta.get('modele_charge_le', 0) > modele.charge_le:
+        # Fichier publié par un worker au modèle plus récent : calcul local jusqu'au
+        # rechargement périodique de ce worker, sans prendre le verrou de rechargement
+        return None
+    tables_partagees.publier(
+        construire_tables_reference,
+        {'version_modele': modele.version, 'modele_charge_le': modele.charge_le},
+        a_jour=lambda meta_fichier: meta_fichier.get('version_modele') == modele.version
+    )
+    return tables_partagees
 
 # Fonctions utilitaires pour l'authentification
 def hash_password(password):
@@ -370,43 +736,42 @@ def validate_password(password):
     return True, "Mot de passe valide"
 
 # Routes principales
-@app.route('/')
+@route('/')
 def home():
     """Page d'accueil avec navigation"""
     return render_template('index.html')
 
-@app.route('/signup')
+@route('/signup')
 def signup_page():
     """Page d'inscription"""
     return render_template('signup.html')
 
-@app.route('/login')
+@route('/login')
 def login_page():
     """Page de connexion"""
     return render_template('login.html')
 
-@app.route('/products')
+@route('/products')
 def products_page():
     """Page des produits"""
     return render_template('products.html')
 
-@app.route('/about')
+@route('/about')
 def about_page():
     """Page À propos"""
     return render_template('about.html')
 
-@app.route('/contact')
+@route('/contact')
 def contact_page():
     """Page de contact"""
     return render_template('contact.html')
 
 # Gestion des erreurs 404
-@app.errorhandler(404)
 def page_not_found(e):
     return render_template('404.html'), 404
 
 # API d'authentification
-@app.route('/api/auth/signup', methods=['POST'])
+@route('/api/auth/signup', methods=['POST'])
 def api_signup():
     """API pour l'inscription des utilisateurs"""
     try:
@@ -474,7 +839,7 @@ def api_signup():
         session['user_name'] = nom_complet
         session.permanent = True
         
-        print(f"✅ Nouvel utilisateur inscrit: {email}")
+        journaliser('inscription')
         
         return jsonify({
             'success': True,
@@ -493,7 +858,7 @@ def api_signup():
             'error': f'Erreur lors de l\'inscription: {str(e)}'
         }), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@route('/api/auth/login', methods=['POST'])
 def api_login():
     """API pour la connexion des utilisateurs"""
     try:
@@ -517,6 +882,7 @@ def api_login():
         
         # Vérification de l'existence de l'utilisateur
         if email not in users_db:
+            journaliser('connexion_echec', email=email)
             return jsonify({
                 'success': False,
                 'error': 'Email ou mot de passe incorrect'
@@ -526,6 +892,7 @@ def api_login():
         
         # Vérification du mot de passe
         if user.password_hash != hash_password(password):
+            journaliser('connexion_echec', email=email)
             return jsonify({
                 'success': False,
                 'error': 'Email ou mot de passe incorrect'
@@ -540,7 +907,7 @@ def api_login():
         session['user_name'] = user.nom_complet
         session.permanent = True
         
-        print(f"✅ Utilisateur connecté: {email}")
+        journaliser('connexion')
         
         return jsonify({
             'success': True,
@@ -559,13 +926,12 @@ def api_login():
             'error': f'Erreur lors de la connexion: {str(e)}'
         }), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@route('/api/auth/logout', methods=['POST'])
 def api_logout():
     """API pour la déconnexion"""
     try:
-        user_email = session.get('user_email', 'Inconnu')
+        journaliser('deconnexion')
         session.clear()
-        print(f"✅ Utilisateur déconnecté: {user_email}")
         return jsonify({
             'success': True,
             'message': 'Déconnexion réussie'
@@ -577,7 +943,7 @@ def api_logout():
             'error': 'Erreur lors de la déconnexion'
         }), 500
 
-@app.route('/api/auth/check')
+@route('/api/auth/check')
 def api_check_auth():
     """API pour vérifier l'état d'authentification"""
     try:
@@ -603,7 +969,7 @@ def api_check_auth():
         })
 
 # API pour les calculs ERP (protégées par authentification)
-@app.route('/api/couts/calculer', methods=['POST'])
+@route('/api/couts/calculer', methods=['POST'])
 def calculer_couts():
     """API pour calculer les coûts cachés (nécessite une authentification)"""
     try:
@@ -614,43 +980,77 @@ def calculer_couts():
                 'error': 'Authentification requise. Veuillez vous connecter.'
             }), 401
         
-        data = request.get_json()
+        donnees = request.get_data()
         
-        if not data:
+        if not donnees:
             return jsonify({
                 'success': False,
                 'error': 'Données manquantes'
             }), 400
         
-        # Validation des données obligatoires
-        required_fields = ['nom_entreprise', 'secteur', 'taille', 'chiffre_affaires', 'nombre_employes']
-        for field in required_fields:
-            if not data.get(field):
-                return jsonify({
-                    'success': False,
-                    'error': f'Le champ {field} est obligatoire'
-                }), 400
+        from validation import ErreurValidation, decoder_demande
         
-        # Création de l'objet entreprise
+        # Décodage, conversion et validation des données en une seule passe
         try:
-            entreprise = Entreprise(
-                nom=data.get('nom_entreprise', 'Entreprise Marocaine'),
-                secteur=data.get('secteur', 'Services'),
-                taille=data.get('taille', 'Moyenne'),
-                chiffre_affaires=float(data.get('chiffre_affaires', 10000000)),
-                nombre_employes=int(data.get('nombre_employes', 100))
-            )
-        except (ValueError, TypeError) as e:
+            demande = decoder_demande(donnees)
+        except ErreurValidation as e:
             return jsonify({
                 'success': False,
-                'error': 'Format des données numérique invalide'
+                'error': str(e)
+            }), 400
+        
+        entreprise = entreprise_depuis_demande(demande)
+        parametres = demande.parametres_dict()
+        
+        # Le texte 'details' de chaque ligne n'est rendu que sur demande (?details=true)
+        details = request.args.get('details', 'false').lower() in ('1', 'true', 'oui')
+        
+        try:
+            devise = devise_demandee()
+        except ErreurDevise as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
             }), 400
         
-        # Récupération des paramètres avec valeurs par défaut
-        parametres = data.get('parametres', {})
+        # Identifiant du scénario : empreinte des entrées normalisées et de la version du modèle
+        version_modele = sous_systemes.calculateur.modele().version
+        scenario_id = empreinte(asdict(entreprise), parametres, version_modele, details)
         
-        # Calcul des coûts
-        resultats = calculateur.calculer_couts_totaux(entreprise, parametres)
+        # Nouvelle tentative d'une demande déjà traitée : réponse rejouée sans nouvel historique.
+        # Les clés sont en session, donc connues de tous les workers.
+        cle_idempotence = request.headers.get('Idempotency-Key', '').strip()
+        cles_idempotence = session.get('idempotence', {})
+        demande_id = empreinte_demande(asdict(entreprise), parametres, details)
+        if cle_idempotence:
+            try:
+                deja_traite = scenario_idempotent(cles_idempotence, cle_idempotence, demande_id)
+            except ConflitIdempotence as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 422
+            if deja_traite:
+                # Scénario d'origine s'il est encore en magasin; sinon (autre worker, éviction,
+                # modèle rechargé depuis) recalculé avec le modèle courant
+                resultats = sous_systemes.magasin_scenarios.resultat(deja_traite)
+                if resultats is not None:
+                    scenario_id = deja_traite
+                else:
+                    resultats = resultat_scenario(scenario_id, version_modele, entreprise, parametres, details)
+                journaliser('calcul', nom_entreprise=entreprise.nom, scenario_id=scenario_id,
+                            total_general=resultats['total_general'], devise=devise, rejoue=True)
+                return jsonify({
+                    'success': True,
+                    'scenario_id': scenario_id,
+                    'resultats': sous_systemes.convertisseur_devises.convertir(resultats, devise)
+                })
+        
+        # Calcul des coûts, sauf si un scénario identique est déjà stocké
+        resultats = resultat_scenario(scenario_id, version_modele, entreprise, parametres, details)
+        
+        if cle_idempotence:
+            session['idempotence'] = associer(cles_idempotence, cle_idempotence, demande_id, scenario_id)
         
         # Sauvegarde en session pour historique
         if 'historique' not in session:
@@ -660,18 +1060,24 @@ def calculer_couts():
         if len(session['historique']) >= 50:
             session['historique'] = session['historique'][-49:]
         
+        # Le résumé reste en session; le magasin ne sert que pour le résultat complet
         session['historique'].append({
             'timestamp': datetime.datetime.now().isoformat(),
+            'scenario_id': scenario_id,
             'entreprise': resultats['entreprise'],
             'total_general': resultats['total_general'],
+            'version_modele': resultats['version_modele'],
             'user_id': session['user_id']
         })
         
-        print(f"✅ Calcul effectué pour: {entreprise.nom} par {session['user_email']}")
+        journaliser('calcul', nom_entreprise=entreprise.nom, scenario_id=scenario_id,
+                    total_general=resultats['total_general'], devise=devise)
         
+        # Le magasin garde le résultat en devise de base; la conversion est faite à la sortie
         return jsonify({
             'success': True,
-            'resultats': resultats
+            'scenario_id': scenario_id,
+            'resultats': sous_systemes.convertisseur_devises.convertir(resultats, devise)
         })
     
     except Exception as e:
@@ -681,7 +1087,134 @@ def calculer_couts():
             'error': f'Erreur lors du calcul: {str(e)}'
         }), 500
 
-@app.route('/api/couts/definitions')
+@route('/api/couts/lot', methods=['POST'])
+def calculer_couts_lot():
+    """API pour calculer les coûts d'un lot d'entreprises (tableau JSON, protégé)"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({
+                'success': False,
+                'error': 'Authentification requise. Veuillez vous connecter.'
+            }), 401
+        
+        from validation import ErreurValidation, decoder_lot
+        
+        try:
+            demandes, erreurs = decoder_lot(request.get_data())
+        except ErreurValidation as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        details = request.args.get('details', 'false').lower() in ('1', 'true', 'oui')
+        
+        try:
+            devise = devise_demandee()
+        except ErreurDevise as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        resultats = []
+        for demande in demandes:
+            entreprise = entreprise_depuis_demande(demande)
+            parametres = demande.parametres_dict()
+            if parametres:
+                resultats.append(sous_systemes.calculateur.calculer_couts_totaux(entreprise, parametres, details))
+            else:
+                resultats.append(sous_systemes.calculateur.calculer_reference(entreprise, details))
+        
+        journaliser('calcul_lot', calculs=len(resultats), erreurs=len(erreurs))
+        
+        return jsonify({
+            'success': True,
+            'resultats': sous_systemes.convertisseur_devises.convertir_lot(resultats, devise),
+            'erreurs': erreurs
+        })
+    
+    except Exception as e:
+        print(f"❌ Erreur calcul lot: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Erreur lors du calcul du lot: {str(e)}'
+        }), 500
+
+@route('/api/couts/comparer', methods=['POST'])
+def comparer_scenarios():
+    """API pour comparer une référence à une ou plusieurs variantes (protégé)"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({
+                'success': False,
+                'error': 'Authentification requise. Veuillez vous connecter.'
+            }), 401
+        
+        from comparaison import comparer_lot
+        from validation import ErreurValidation, ReferenceScenario, decoder_comparaison
+        
+        try:
+            reference, variantes = decoder_comparaison(request.get_data())
+        except ErreurValidation as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        try:
+            devise = devise_demandee()
+        except ErreurDevise as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Scénarios stockés (par identifiant) ou calculés puis stockés
+        version_modele = sous_systemes.calculateur.modele().version
+        scenario_ids, resultats = [], []
+        for element in [reference, *variantes]:
+            if isinstance(element, ReferenceScenario):
+                resultat = sous_systemes.magasin_scenarios.resultat(element.scenario_id)
+                if resultat is None:
+                    return jsonify({
+                        'success': False,
+                        'error': f'Scénario inconnu ou expiré: {element.scenario_id}'
+                    }), 404
+                scenario_ids.append(element.scenario_id)
+            else:
+                entreprise = entreprise_depuis_demande(element)
+                parametres = element.parametres_dict()
+                scenario_id = empreinte(asdict(entreprise), parametres, version_modele, False)
+                resultat = resultat_scenario(scenario_id, version_modele, entreprise, parametres, False)
+                scenario_ids.append(scenario_id)
+            resultats.append(resultat)
+        
+        convertis = sous_systemes.convertisseur_devises.convertir_lot(resultats, devise)
+        ecarts = comparer_lot(convertis[0], convertis[1:])
+        journaliser('comparaison', reference=scenario_ids[0], variantes=len(ecarts))
+        for scenario_id, ecart in zip(scenario_ids[1:], ecarts):
+            ecart['scenario_id'] = scenario_id
+        
+        return jsonify({
+            'success': True,
+            'reference': {
+                'scenario_id': scenario_ids[0],
+                'total_general': convertis[0]['total_general'],
+                'version_modele': convertis[0]['version_modele']
+            },
+            'ecarts': ecarts,
+            'devise': convertis[0]['devise']
+        })
+    
+    except Exception as e:
+        print(f"❌ Erreur comparaison: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Erreur lors de la comparaison: {str(e)}'
+        }), 500
+
+@route('/api/couts/definitions')
 def get_definitions_couts():
     """API pour récupérer les définitions des coûts"""
     try:
@@ -692,19 +1225,19 @@ def get_definitions_couts():
                 'description': cout.description,
                 'formule': cout.formule_calcul,
                 'unite': cout.unite
-            } for cout in calculateur.couts_erreurs],
+            } for cout in sous_systemes.calculateur.couts_erreurs],
             'couts_resistance': [{
                 'nom': cout.nom,
                 'description': cout.description,
                 'formule': cout.formule_calcul,
                 'unite': cout.unite
-            } for cout in calculateur.couts_resistance],
+            } for cout in sous_systemes.calculateur.couts_resistance],
             'couts_imprevus': [{
                 'nom': cout.nom,
                 'description': cout.description,
                 'formule': cout.formule_calcul,
                 'unite': cout.unite
-            } for cout in calculateur.couts_imprevus]
+            } for cout in sous_systemes.calculateur.couts_imprevus]
         })
     except Exception as e:
         print(f"❌ Erreur définitions: {str(e)}")
@@ -713,44 +1246,27 @@ def get_definitions_couts():
             'error': 'Erreur lors du chargement des définitions'
         }), 500
 
-@app.route('/api/entreprise/exemples')
+@route('/api/entreprise/exemples')
 def get_exemples_entreprises():
     """API pour récupérer les exemples d'entreprises"""
     try:
-        exemples = [
-            {
-                'nom': 'Société Industrielle Marocaine (SIM)',
-                'secteur': 'Industrie',
-                'taille': 'Grande',
-                'chiffre_affaires': 50000000,
-                'nombre_employes': 300,
-                'description': 'Entreprise industrielle avec processus complexes'
-            },
-            {
-                'nom': 'Distributeur National (DN)',
-                'secteur': 'Distribution',
-                'taille': 'Moyenne',
-                'chiffre_affaires': 20000000,
-                'nombre_employes': 150,
-                'description': 'Chaîne de distribution nationale'
-            },
-            {
-                'nom': 'PME Services (PME-S)',
-                'secteur': 'Services',
-                'taille': 'Petite',
-                'chiffre_affaires': 5000000,
-                'nombre_employes': 50,
-                'description': 'PME spécialisée dans les services'
-            },
-            {
-                'nom': 'Groupe Textile Marocain (GTM)',
-                'secteur': 'Textile',
-                'taille': 'Grande',
-                'chiffre_affaires': 80000000,
-                'nombre_employes': 500,
-                'description': 'Groupe textile exportateur'
+        tables = tables_reference()
+        lignes = tables.lignes('exemples') if tables is not None else estimer_exemples()
+        
+        exemples = [{
+            'nom': ligne['nom'],
+            'secteur': ligne['secteur'],
+            'taille': ligne['taille'],
+            'chiffre_affaires': ligne['chiffre_affaires'],
+            'nombre_employes': ligne['nombre_employes'],
+            'description': ligne['description'],
+            'estimation': {
+                'total_general': ligne['total_general'],
+                'pourcentage_ca': ligne['pourcentage_ca'],
+                'version_modele': ligne['version_modele']
             }
-        ]
+        } for ligne in lignes]
+        
         return jsonify({
             'success': True,
             'exemples': exemples
@@ -762,7 +1278,39 @@ def get_exemples_entreprises():
             'error': 'Erreur lors du chargement des exemples'
         }), 500
 
-@app.route('/api/historique')
+@route('/api/presets')
+def get_presets():
+    """API pour récupérer les paramètres par défaut adaptés à une entreprise"""
+    try:
+        try:
+            entreprise = Entreprise(
+                nom=request.args.get('nom_entreprise', 'Entreprise Marocaine'),
+                secteur=request.args.get('secteur', 'Services'),
+                taille=request.args.get('taille', 'Moyenne'),
+                chiffre_affaires=float(request.args.get('chiffre_affaires', 0)),
+                nombre_employes=int(request.args['nombre_employes']) if request.args.get('nombre_employes') else None
+            )
+        except (ValueError, TypeError):
+            return jsonify({
+                'success': False,
+                'error': 'Format des données numérique invalide'
+            }), 400
+        
+        modele = sous_systemes.calculateur.modele()
+        
+        return jsonify({
+            'success': True,
+            'parametres': sous_systemes.calculateur.presets.defauts_pour(modele, entreprise),
+            'version_modele': modele.version
+        })
+    except Exception as e:
+        print(f"❌ Erreur presets: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors du chargement des paramètres par défaut'
+        }), 500
+
+@route('/api/historique')
 def get_historique():
     """API pour récupérer l'historique des calculs (protégé)"""
     try:
@@ -772,8 +1320,18 @@ def get_historique():
                 'historique': []
             })
         
-        user_historique = [item for item in session.get('historique', []) 
-                          if item.get('user_id') == session['user_id']]
+        user_historique = []
+        for item in session.get('historique', []):
+            if item.get('user_id') != session['user_id']:
+                continue
+            if 'entreprise' not in item:
+                # Entrée sans résumé (ancien format) : résolue si le scénario est encore en magasin
+                resultat = sous_systemes.magasin_scenarios.resultat(item['scenario_id']) if item.get('scenario_id') else None
+                if resultat is None:
+                    continue
+                item = {**item, 'entreprise': resultat['entreprise'], 'total_general': resultat['total_general'],
+                        'version_modele': resultat['version_modele']}
+            user_historique.append(item)
         
         # Trier par date décroissante
         user_historique.sort(key=lambda x: x.get('timestamp', ''), reverse=True)
@@ -789,7 +1347,7 @@ def get_historique():
             'error': 'Erreur lors du chargement de l\'historique'
         }), 500
 
-@app.route('/api/rapport/pdf', methods=['POST'])
+@route('/api/rapport/pdf', methods=['POST'])
 def generer_rapport_pdf():
     """API pour générer un rapport PDF (protégé)"""
     try:
@@ -825,7 +1383,7 @@ def generer_rapport_pdf():
             'details_imprevus': resultats.get('couts_imprevus', {})
         }
         
-        print(f"✅ Rapport généré pour: {session['user_email']}")
+        journaliser('rapport', nom_entreprise=resultats['entreprise']['nom'])
         
         return jsonify({
             'success': True,
@@ -841,61 +1399,34 @@ def generer_rapport_pdf():
             'error': f'Erreur lors de la génération du rapport: {str(e)}'
         }), 500
 
-@app.route('/api/statistiques/secteur', methods=['POST'])
+@route('/api/statistiques/secteur', methods=['POST'])
 def statistiques_par_secteur():
     """API pour les statistiques par secteur"""
     try:
         data = request.get_json()
-        secteur = data.get('secteur', 'Tous')
-        
-        # Données statistiques simulées pour le Maroc
-        stats_secteurs = {
-            'Industrie': {
-                'couts_moyens_erreurs': 450000,
-                'couts_moyens_resistance': 350000,
-                'couts_moyens_imprevus': 300000,
-                'total_moyen': 1100000,
-                'nombre_implementations': 25,
-                'taux_reussite': '72%'
-            },
-            'Services': {
-                'couts_moyens_erreurs': 300000,
-                'couts_moyens_resistance': 250000,
-                'couts_moyens_imprevus': 200000,
-                'total_moyen': 750000,
-                'nombre_implementations': 40,
-                'taux_reussite': '85%'
-            },
-            'Distribution': {
-                'couts_moyens_erreurs': 400000,
-                'couts_moyens_resistance': 300000,
-                'couts_moyens_imprevus': 250000,
-                'total_moyen': 950000,
-                'nombre_implementations': 30,
-                'taux_reussite': '78%'
-            },
-            'Textile': {
-                'couts_moyens_erreurs': 500000,
-                'couts_moyens_resistance': 400000,
-                'couts_moyens_imprevus': 350000,
-                'total_moyen': 1250000,
-                'nombre_implementations': 15,
-                'taux_reussite': '65%'
-            },
-            'Tous': {
-                'couts_moyens_erreurs': 412500,
-                'couts_moyens_resistance': 325000,
-                'couts_moyens_imprevus': 275000,
-                'total_moyen': 1012500,
-                'nombre_implementations': 110,
-                'taux_reussite': '75%'
-            }
-        }
+        # Clé de table toujours textuelle; secteur absent ou inconnu : statistiques 'Tous'
+        secteur = data.get('secteur')
+        secteur = str(secteur) if secteur is not None else 'Tous'
+        
+        try:
+            devise = devise_demandee()
+        except ErreurDevise as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        tables = tables_reference()
+        if tables is not None:
+            # Copie de la vue sur le fichier partagé : le convertisseur attend un dict
+            statistiques = dict(tables.ligne('stats_secteurs', secteur) or tables.ligne('stats_secteurs', 'Tous'))
+        else:
+            statistiques = STATS_SECTEURS.get(secteur, STATS_SECTEURS['Tous'])
         
         return jsonify({
             'success': True,
             'secteur': secteur,
-            'statistiques': stats_secteurs.get(secteur, stats_secteurs['Tous'])
+            'statistiques': sous_systemes.convertisseur_devises.convertir(statistiques, devise)
         })
     
     except Exception as e:
@@ -905,7 +1436,7 @@ def statistiques_par_secteur():
             'error': 'Erreur lors du chargement des statistiques'
         }), 500
 
-@app.route('/api/recommandations', methods=['POST'])
+@route('/api/recommandations', methods=['POST'])
 def get_recommandations():
     """API pour les recommandations personnalisées"""
     try:
@@ -917,86 +1448,243 @@ def get_recommandations():
             }), 400
         
         resultats = data.get('resultats')
+        evaluation = sous_systemes.moteur_recommandations.evaluer(resultats)
         
-        recommandations = []
+        return jsonify({
+            'success': True,
+            'recommandations': evaluation['recommandations'],
+            'regles': evaluation['regles'],
+            'categorie_principale': evaluation['categorie_principale']
+        })
+    
+    except Exception as e:
+        print(f"❌ Erreur recommandations: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la génération des recommandations'
+        }), 500
+
+@route('/api/recommandations/lot', methods=['POST'])
+def get_recommandations_lot():
+    """API pour les recommandations d'un portefeuille de résultats"""
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('resultats'), list):
+            return jsonify({
+                'success': False,
+                'error': 'Liste de résultats manquante'
+            }), 400
         
-        total_erreurs = resultats.get('couts_erreurs', {}).get('total_erreurs', 0)
-        total_resistance = resultats.get('couts_resistance', {}).get('total_resistance', 0)
-        total_imprevus = resultats.get('couts_imprevus', {}).get('total_imprevus', 0)
+        evaluations, synthese = sous_systemes.moteur_recommandations.evaluer_lot(data['resultats'])
         
-        # Recommandations basées sur les coûts les plus élevés
-        couts_par_categorie = [
-            ('Erreurs', total_erreurs),
-            ('Résistance au changement', total_resistance),
-            ('Imprévus', total_imprevus)
-        ]
+        return jsonify({
+            'success': True,
+            'evaluations': evaluations,
+            'synthese': synthese
+        })
+    
+    except Exception as e:
+        print(f"❌ Erreur recommandations lot: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors de la génération des recommandations'
+        }), 500
+
+@route('/api/jobs', methods=['POST'])
+def creer_job():
+    """API pour lancer une simulation ou un balayage en arrière-plan (protégé)"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({
+                'success': False,
+                'error': 'Authentification requise. Veuillez vous connecter.'
+            }), 401
+        
+        from simulation import balayer, simuler
+        from validation import ErreurValidation, decoder_job
+        
+        try:
+            demande_job = decoder_job(request.get_data())
+        except ErreurValidation as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        try:
+            devise = devise_demandee()
+        except ErreurDevise as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        entreprise = entreprise_depuis_demande(demande_job.demande)
+        parametres = demande_job.demande.parametres_dict()
+        
+        if demande_job.type == 'simulation':
+            options = demande_job.simulation
+            job = sous_systemes.gestionnaire_jobs.soumettre(
+                'simulation', session['user_id'], en_devise(simuler, devise),
+                sous_systemes.calculateur, entreprise, parametres, options.iterations, options.variabilite, options.graine
+            )
+        else:
+            options = demande_job.balayage
+            job = sous_systemes.gestionnaire_jobs.soumettre(
+                'balayage', session['user_id'], en_devise(balayer, devise),
+                sous_systemes.calculateur, entreprise, parametres, options.parametre, options.valeurs
+            )
         
-        couts_par_categorie.sort(key=lambda x: x[1], reverse=True)
-        
-        categorie_principale = couts_par_categorie[0][0] if couts_par_categorie else 'Général'
-        
-        if categorie_principale == 'Erreurs':
-            recommandations.extend([
-                "🔧 Renforcer la planification initiale avec une marge de 20%",
-                "📊 Réaliser une étude de faisabilité approfondie",
-                "⏱️ Établir un calendrier réaliste avec jalons intermédiaires",
-                "👥 Impliquer un consultant ERP expérimenté"
-            ])
-        
-        if categorie_principale == 'Résistance au changement':
-            recommandations.extend([
-                "💬 Mettre en place un programme de communication proactive",
-                "🎓 Développer un plan de formation adapté aux différents profils",
-                "🤝 Impliquer les utilisateurs clés dès le début du projet",
-                "🏆 Créer un système de récompense pour l'adoption du nouveau système"
-            ])
-        
-        if categorie_principale == 'Imprévus':
-            recommandations.extend([
-                "🛡️ Prévoir une réserve de 15-25% pour les imprévus",
-                "🔍 Identifier et prioriser les risques en amont",
-                "📋 Mettre en place un comité de suivi des risques",
-                "🔄 Adopter une approche agile avec itérations courtes"
-            ])
-        
-        # Recommandations générales
-        recommandations.extend([
-            "✅ Former une équipe projet dédiée et compétente",
-            "🎯 Choisir un ERP adapté à la taille et au secteur",
-            "📝 Négocier un contrat de support et maintenance clair",
-            "📈 Mesurer régulièrement l'avancement et les écarts",
-            "🔄 Prévoir des revues de projet trimestrielles"
-        ])
+        journaliser('job', type_job=job.type, job_id=job.id)
         
         return jsonify({
             'success': True,
-            'recommandations': recommandations,
-            'categorie_principale': categorie_principale
+            'job': job.to_dict(),
+            'flux_url': f'/api/jobs/{job.id}/flux'
+        }), 202
+    
+    except Exception as e:
+        print(f"❌ Erreur création job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': f'Erreur lors du lancement du traitement: {str(e)}'
+        }), 500
+
+def job_utilisateur(job_id):
+    """Job de l'utilisateur connecté, ou None"""
+    job = sous_systemes.gestionnaire_jobs.job(job_id)
+    if job is None or job.user_id != session.get('user_id'):
+        return None
+    return job
+
+@route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """API pour consulter l'état d'un job (protégé)"""
+    job = job_utilisateur(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Traitement introuvable'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'job': job.to_dict()
+    })
+
+@route('/api/jobs/<job_id>/flux')
+def flux_job(job_id):
+    """Flux Server-Sent Events de la progression d'un job (protégé)"""
+    job = job_utilisateur(job_id)
+    if job is None:
+        return jsonify({
+            'success': False,
+            'error': 'Traitement introuvable'
+        }), 404
+    
+    # Reconnexion EventSource : seuls les événements postérieurs au dernier reçu sont renvoyés
+    dernier_id = request.headers.get('Last-Event-ID', '').strip()
+    dernier_id = int(dernier_id) if dernier_id.isdigit() else 0
+    
+    # Chaque flux ouvert occupe un thread : au-delà de la limite, le client consulte /api/jobs/<id>
+    gestionnaire = sous_systemes.gestionnaire_jobs
+    if not gestionnaire.reserver_flux():
+        reponse = jsonify({
+            'success': False,
+            'error': 'Trop de flux ouverts, consultez l\'état du traitement',
+            'job_url': f'/api/jobs/{job.id}'
         })
+        reponse.status_code = 503
+        reponse.headers['Retry-After'] = '5'
+        return reponse
     
+    reponse = Response(
+        stream_with_context(gestionnaire.flux_sse(job.id, dernier_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    reponse.call_on_close(gestionnaire.liberer_flux)
+    return reponse
+
+@route('/api/devises')
+def get_devises():
+    """API pour consulter la table de taux de change courante"""
+    return jsonify({
+        'success': True,
+        'devises': sous_systemes.convertisseur_devises.courante().to_dict()
+    })
+
+@route('/api/modele')
+def get_modele():
+    """API pour consulter la version et les valeurs par défaut du modèle de coûts"""
+    try:
+        return jsonify({
+            'success': True,
+            'modele': sous_systemes.calculateur.modele().to_dict()
+        })
     except Exception as e:
-        print(f"❌ Erreur recommandations: {str(e)}")
+        print(f"❌ Erreur modèle: {str(e)}")
         return jsonify({
             'success': False,
-            'error': 'Erreur lors de la génération des recommandations'
+            'error': 'Erreur lors du chargement du modèle'
+        }), 500
+
+@route('/api/modele/recharger', methods=['POST'])
+def recharger_modele():
+    """API pour forcer le rechargement de la configuration du modèle (protégé)"""
+    try:
+        if 'user_id' not in session:
+            return jsonify({
+                'success': False,
+                'error': 'Authentification requise'
+            }), 401
+        
+        change = sous_systemes.calculateur.configuration.recharger()
+        
+        return jsonify({
+            'success': True,
+            'recharge': change,
+            'version_modele': sous_systemes.calculateur.modele().version
+        })
+    except Exception as e:
+        print(f"❌ Erreur rechargement modèle: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'Erreur lors du rechargement du modèle'
         }), 500
 
+@route('/api/compression')
+def get_metriques_compression():
+    """API pour consulter les métriques de compression (octets économisés, CPU par codec)"""
+    compression = current_app.extensions['compression']
+    return jsonify({
+        'success': True,
+        'codecs_disponibles': sorted(compression.codecs),
+        'metriques': compression.metriques.to_dict()
+    })
+
 # Route de santé de l'application
-@app.route('/api/health')
+@route('/api/health')
 def health_check():
     """Endpoint de santé de l'application"""
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.datetime.now().isoformat(),
         'version': '1.0.0',
-        'users_count': len(users_db)
+        'version_modele': sous_systemes.calculateur.modele().version,
+        'users_count': len(users_db),
+        'journal': sous_systemes.journal.statistiques(),
+        'scenarios': sous_systemes.magasin_scenarios.statistiques(),
+        'demarrage': {
+            **current_app.config['DEMARRAGE'],
+            'sous_systemes_ms': dict(sous_systemes.durees_initialisation)
+        }
     })
 
 # Middleware pour vérifier l'authentification sur les routes protégées
-@app.before_request
 def check_authentication():
     """Vérifie l'authentification pour les routes protégées"""
-    protected_routes = ['/api/couts/calculer', '/api/historique', '/api/rapport/pdf']
+    protected_routes = ['/api/couts/calculer', '/api/couts/lot', '/api/couts/comparer', '/api/historique', '/api/rapport/pdf', '/api/modele/recharger']
     
     if request.path in protected_routes and request.method == 'POST':
         if 'user_id' not in session:
@@ -1006,7 +1694,7 @@ def check_authentication():
             }), 401
 
 # Initialisation des données de démonstration
-def init_demo_data():
+def init_demo_data(users_db: Dict[str, User]):
     """Initialise des données de démonstration"""
     demo_user = User(
         'demo_user_123',
@@ -1017,12 +1705,60 @@ def init_demo_data():
     users_db['demo@erp.ma'] = demo_user
     print("✅ Données de démonstration initialisées")
 
-# Initialisation au démarrage
-init_demo_data()
+def create_app(config: Optional[Dict] = None) -> Flask:
+    """Construit l'application; les sous-systèmes ne sont initialisés qu'à leur premier usage"""
+    debut = time.perf_counter()
+    
+    app = Flask(__name__)
+    app.secret_key = 'erp_cost_calculator_maroc_2024_secret_key_secure_123'
+    app.config['SESSION_TYPE'] = 'filesystem'
+    app.config['PERMANENT_SESSION_LIFETIME'] = datetime.timedelta(days=1)
+    app.config.update(configuration_environnement())
+    if config:
+        app.config.update(config)
+    Session(app)
+    
+    # État propre à cette application : deux applications d'un même processus ne partagent rien
+    app.extensions['sous_systemes'] = SousSystemes(app.config)
+    app.extensions['utilisateurs'] = utilisateurs_initiaux()
+    
+    for regle, vue, options in ROUTES:
+        app.add_url_rule(regle, view_func=vue, **options)
+    app.register_error_handler(404, page_not_found)
+    app.before_request(check_authentication)
+    installer_compression(app)
+    if app.config['DOSSIER_STATIQUE']:
+        from statique import installer as installer_statique
+        installer_statique(app, app.config['DOSSIER_STATIQUE'])
+    
+    init_demo_data(app.extensions['utilisateurs'])
+    
+    app.config['DEMARRAGE'] = {
+        'import_ms': DUREE_IMPORT_MS,
+        'creation_app_ms': round((time.perf_counter() - debut) * 1000, 2)
+    }
+    print(f"✅ Application prête en {app.config['DEMARRAGE']['creation_app_ms']} ms "
+          f"(import du module: {DUREE_IMPORT_MS} ms)")
+    return app
+
+_app = None
+_verrou_app = threading.Lock()
+
+def __getattr__(nom):
+    """app.app (gunicorn app:app) : application construite au premier accès"""
+    global _app
+    if nom != 'app':
+        raise AttributeError(f"module {__name__!r} has no attribute {nom!r}")
+    with _verrou_app:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+DUREE_IMPORT_MS = round((time.perf_counter() - DEBUT_IMPORT) * 1000, 2)
 
 if __name__ == '__main__':
     print("🚀 Démarrage de l'application ERP Cost Calculator...")
     print("📊 Calculateur des coûts cachés ERP - Version 1.0.0")
     print("🌐 Application accessible sur: http://localhost:5000")
     print("🔐 Compte démo disponible: demo@erp.ma / demo123")
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
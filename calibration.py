@@ -0,0 +1,360 @@
+"""
+Calibration du modèle de coûts sur des projets ERP réels.
+
+À partir d'un jeu de projets terminés (CSV ou JSON, une ligne par projet), le
+module ajuste les valeurs par défaut du modèle puis écrit une nouvelle
+configuration versionnée, rechargée à chaud par l'application :
+
+    python calibration.py projets.csv --version 2025.1 --sortie modele_couts.json
+
+Chaque coût du modèle est linéaire en son taux (coût = volume × taux) : les
+taux sont estimés par moindres carrés sans constante (ou par régression de
+Huber avec --robuste), les volumes par la moyenne (ou la médiane) des valeurs
+observées. Chaque projet est d'abord ramené à l'entreprise de référence des
+préréglages : effectif, chiffre d'affaires et taille (délais) sont neutralisés,
+et pour l'ajustement global le secteur aussi (ratios sectoriels), afin que les
+préréglages ne comptent pas deux fois ces effets. Les mêmes ajustements sont
+faits par secteur lorsque celui-ci compte assez de projets; ces surcharges
+décrivent l'entreprise de référence du secteur et sont encore mises à
+l'échelle de la taille par les préréglages.
+
+Colonnes reconnues : secteur, taille, nombre_employes, chiffre_affaires, les paramètres du modèle
+(delai_reel_mois, heures_correction, ...) et les coûts observés
+(cout_planification, cout_technique, cout_formation, cout_configuration,
+cout_productivite, cout_turnover, cout_resistance, cout_support,
+cout_organisationnel, cout_compatibilite, cout_maintenance, cout_reglementaire).
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config_modele import DEFAUTS_MODELE, PARAMETRES_POURCENTAGES, ModeleCouts
+from presets import (CHIFFRE_AFFAIRES_REFERENCE, EMPLOYES_REFERENCE, MULTIPLICATEUR_DELAIS_TAILLE,
+                     PARAMETRES_DELAIS, PARAMETRES_PAR_EMPLOYE, PARAMETRES_SOUS_LINEAIRES, RATIOS_SECTEURS)
+
+Z_95 = 1.959963984540054
+SEUIL_HUBER = 1.345
+PROJETS_MIN_SECTEUR = 5
+
+
+def _colonne(nom: str) -> Callable[[Dict], Optional[float]]:
+    return lambda projet: projet.get(nom)
+
+
+def _produit(*termes) -> Callable[[Dict], Optional[float]]:
+    """Volume = produit de colonnes du projet et de constantes"""
+    def volume(projet):
+        resultat = 1.0
+        for terme in termes:
+            valeur = projet.get(terme) if isinstance(terme, str) else terme
+            if valeur is None:
+                return None
+            resultat *= valeur
+        return resultat
+    return volume
+
+
+def _retard_jours(projet: Dict) -> Optional[float]:
+    reel, prevu = projet.get('delai_reel_mois'), projet.get('delai_prevue_mois')
+    if reel is None or prevu is None:
+        return None
+    return max(0, reel - prevu) * 22
+
+
+# Taux ajustés : paramètre -> liste de (volume explicatif, coût observé)
+AJUSTEMENTS_TAUX = {
+    'cout_jour_homme': [(_retard_jours, 'cout_planification')],
+    'taux_horaire_technicien': [(_colonne('heures_correction'), 'cout_technique'),
+                                (_colonne('heures_integration'), 'cout_compatibilite')],
+    'cout_formation_par_jour': [(_produit('nombre_personnes_formation', 'duree_formation_jours'), 'cout_formation')],
+    'taux_horaire_developpeur': [(_colonne('heures_configuration'), 'cout_configuration')],
+    'salaire_moyen_mensuel': [(_produit('taux_baisse_productivite', 0.01, 'nombre_employes', 'duree_adaptation_mois'),
+                               'cout_productivite')],
+    'cout_par_depart': [(_colonne('nombre_departs'), 'cout_turnover')],
+    'taux_horaire_moyen': [(_colonne('heures_inefficacite'), 'cout_resistance'),
+                           (_colonne('heures_retravail'), 'cout_organisationnel')],
+    'taux_horaire_support': [(_colonne('heures_support'), 'cout_support')],
+    'taux_maintenance_imprevu': [(_produit('cout_maintenance_annuel', 0.01), 'cout_maintenance')],
+    'taux_horaire_expert': [(_colonne('heures_adaptation'), 'cout_reglementaire')],
+}
+
+# Volumes estimés directement à partir des valeurs observées
+PARAMETRES_OBSERVES = (
+    'delai_prevue_mois', 'delai_reel_mois', 'heures_correction', 'nombre_personnes_formation',
+    'duree_formation_jours', 'heures_configuration', 'taux_baisse_productivite', 'duree_adaptation_mois',
+    'nombre_departs', 'heures_inefficacite', 'heures_support', 'heures_retravail', 'heures_integration',
+    'cout_maintenance_annuel', 'heures_adaptation'
+)
+
+
+def _nombre(valeur) -> Optional[float]:
+    if valeur is None or valeur == '':
+        return None
+    try:
+        nombre = float(valeur)
+    except (TypeError, ValueError):
+        return None
+    return nombre if math.isfinite(nombre) else None
+
+
+def charger_projets(chemin: str) -> List[Dict]:
+    """Charge les projets observés depuis un fichier CSV ou JSON"""
+    with open(chemin, 'r', encoding='utf-8-sig', newline='') as fichier:
+        if chemin.lower().endswith('.json'):
+            lignes = json.load(fichier)
+        else:
+            lignes = list(csv.DictReader(fichier))
+
+    projets = []
+    for ligne in lignes:
+        projet = {cle: (ligne.get(cle) or '').strip() or None for cle in ('secteur', 'taille')}
+        for cle, valeur in ligne.items():
+            if cle not in ('secteur', 'taille'):
+                nombre = _nombre(valeur)
+                if nombre is not None:
+                    projet[cle] = nombre
+        projets.append(projet)
+    return projets
+
+
+def _intervalle(valeur: float, erreur_type: Optional[float]) -> Optional[List[float]]:
+    # Intervalle de confiance à 95% (approximation normale), indéfini pour un seul projet
+    if erreur_type is None:
+        return None
+    return [valeur - Z_95 * erreur_type, valeur + Z_95 * erreur_type]
+
+
+def ajuster_taux(couples: List[Tuple[float, float]], robuste: bool = False, iterations: int = 20) -> Optional[Dict]:
+    """Ajuste y = taux × x (moindres carrés sans constante, ou Huber par moindres carrés repondérés)"""
+    couples = [(x, y) for x, y in couples if x > 0]
+    n = len(couples)
+    if n == 0:
+        return None
+
+    poids = [1.0] * n
+    for _ in range(iterations if robuste else 1):
+        sxx = math.fsum(w * x * x for w, (x, _) in zip(poids, couples))
+        taux = math.fsum(w * x * y for w, (x, y) in zip(poids, couples)) / sxx
+        if not robuste or n < 3:
+            break
+        residus = [y - taux * x for x, y in couples]
+        echelle = statistics.median(abs(r) for r in residus) / 0.6745
+        if echelle == 0:
+            break
+        nouveaux = [min(1.0, SEUIL_HUBER * echelle / abs(r)) if r else 1.0 for r in residus]
+        if max(abs(a - b) for a, b in zip(nouveaux, poids)) < 1e-6:
+            break
+        poids = nouveaux
+
+    sxx = math.fsum(w * x * x for w, (x, _) in zip(poids, couples))
+    residus = [y - taux * x for x, y in couples]
+    sce = math.fsum(w * r * r for w, r in zip(poids, residus))
+    syy = math.fsum(w * y * y for w, (_, y) in zip(poids, couples))
+    erreur_type = math.sqrt(sce / (n - 1) / sxx) if n > 1 else None
+    return {
+        'valeur': taux,
+        'ic95': _intervalle(taux, erreur_type),
+        'n': n,
+        'rmse': math.sqrt(math.fsum(r * r for r in residus) / n),
+        'r2': 1 - sce / syy if syy else 0.0
+    }
+
+
+def ajuster_volume(valeurs: List[float], robuste: bool = False) -> Optional[Dict]:
+    """Estime un volume par défaut (moyenne, ou médiane si robuste) avec son intervalle de confiance"""
+    n = len(valeurs)
+    if n == 0:
+        return None
+    centre = statistics.median(valeurs) if robuste else statistics.fmean(valeurs)
+    ecart = statistics.stdev(valeurs) if n > 1 else None
+    # La médiane est ~1.25 fois moins précise que la moyenne pour des données normales
+    erreur_type = ecart / math.sqrt(n) * (1.2533 if robuste else 1.0) if ecart is not None else None
+    return {
+        'valeur': centre,
+        'ic95': _intervalle(centre, erreur_type),
+        'n': n,
+        'rmse': ecart,
+        'r2': None
+    }
+
+
+def _ratio_secteur(projet: Dict, parametre: str) -> float:
+    return RATIOS_SECTEURS.get(projet.get('secteur'), {}).get(parametre, 1.0)
+
+
+def _ramener_reference(projet: Dict, parametre: str, secteur: bool = False) -> Optional[float]:
+    # Inverse de la mise à l'échelle des préréglages : volume d'une entreprise de référence
+    # (de taille moyenne), et du secteur de référence si secteur est vrai
+    valeur = projet.get(parametre)
+    if valeur is None:
+        return None
+    employes = projet.get('nombre_employes')
+    if employes:
+        ratio = employes / EMPLOYES_REFERENCE
+        if parametre in PARAMETRES_PAR_EMPLOYE:
+            valeur /= ratio
+        elif parametre in PARAMETRES_SOUS_LINEAIRES:
+            valeur /= math.sqrt(ratio)
+    chiffre_affaires = projet.get('chiffre_affaires')
+    if parametre == 'cout_maintenance_annuel' and chiffre_affaires and chiffre_affaires > 0:
+        valeur /= math.sqrt(chiffre_affaires / CHIFFRE_AFFAIRES_REFERENCE)
+    if parametre in PARAMETRES_DELAIS:
+        valeur /= MULTIPLICATEUR_DELAIS_TAILLE.get(projet.get('taille'), 1.0)
+    if secteur:
+        valeur /= _ratio_secteur(projet, parametre)
+    return valeur
+
+
+def ajuster(projets: Iterable[Dict], robuste: bool = False, ramener_secteur: bool = False) -> Dict[str, Dict]:
+    """Ajuste tous les paramètres calibrables sur un ensemble de projets
+
+    Avec ramener_secteur, les valeurs sont celles du secteur de référence (ajustement global,
+    auquel les préréglages appliquent ensuite les ratios sectoriels).
+    """
+    projets = list(projets)
+    ajustements = {}
+
+    for parametre, sources in AJUSTEMENTS_TAUX.items():
+        couples = []
+        for volume, cout in sources:
+            for projet in projets:
+                x, y = volume(projet), projet.get(cout)
+                if x is not None and y is not None:
+                    if ramener_secteur:
+                        y /= _ratio_secteur(projet, parametre)
+                    couples.append((x, y))
+        resultat = ajuster_taux(couples, robuste)
+        if resultat is not None:
+            ajustements[parametre] = resultat
+
+    for parametre in PARAMETRES_OBSERVES:
+        valeurs = [v for v in (_ramener_reference(p, parametre, ramener_secteur) for p in projets) if v is not None]
+        resultat = ajuster_volume(valeurs, robuste)
+        if resultat is not None:
+            ajustements[parametre] = resultat
+
+    return ajustements
+
+
+def _valeurs_modele(ajustements: Dict[str, Dict], base: Dict) -> Dict:
+    valeurs = {}
+    for parametre, resultat in ajustements.items():
+        valeur = max(0.0, resultat['valeur'])
+        if parametre in PARAMETRES_POURCENTAGES and valeur > 100:
+            # Ajustement hors bornes (données bruitées) : borné, signalé dans le rapport
+            valeur = 100.0
+        if valeur != resultat['valeur']:
+            resultat['borne'] = valeur
+        if parametre == 'cout_par_depart':
+            # Répartition du coût par départ selon les proportions du modèle actuel
+            embauche, formation = base['cout_embauche_par_personne'], base['cout_formation_nouvel_employe']
+            part = embauche / (embauche + formation) if embauche + formation else 0.5
+            valeurs['cout_embauche_par_personne'] = round(valeur * part)
+            valeurs['cout_formation_nouvel_employe'] = round(valeur * (1 - part))
+        else:
+            valeurs[parametre] = round(valeur, 2) if valeur < 100 else round(valeur)
+    return valeurs
+
+
+def calibrer(projets: List[Dict], version: str, modele: Optional[ModeleCouts] = None,
+             robuste: bool = False, projets_min_secteur: int = PROJETS_MIN_SECTEUR) -> Tuple[Dict, Dict]:
+    """Calibre le modèle; retourne (configuration, rapport d'ajustement)"""
+    base = modele.defauts if modele else DEFAUTS_MODELE
+    global_ = ajuster(projets, robuste, ramener_secteur=True)
+
+    par_secteur = {}
+    for projet in projets:
+        if projet.get('secteur'):
+            par_secteur.setdefault(projet['secteur'], []).append(projet)
+    secteurs = {secteur: ajuster(liste, robuste)
+                for secteur, liste in sorted(par_secteur.items())
+                if len(liste) >= projets_min_secteur}
+
+    configuration = {
+        'version': version,
+        'defauts': _valeurs_modele(global_, base),
+        'secteurs': {secteur: _valeurs_modele(ajustements, base) for secteur, ajustements in secteurs.items()}
+    }
+    # Même validation que lors du rechargement par l'application
+    ModeleCouts.depuis_dict(configuration)
+
+    rapport = {
+        'nombre_projets': len(projets),
+        'methode': 'huber' if robuste else 'moindres_carres',
+        'global': global_,
+        'secteurs': secteurs
+    }
+    return configuration, rapport
+
+
+def ecrire_configuration(chemin: str, configuration: Dict):
+    """Écrit la configuration de façon atomique (le fichier peut être relu à chaud à tout moment)"""
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    descripteur, temporaire = tempfile.mkstemp(dir=dossier, prefix='.modele-', suffix='.json')
+    try:
+        with os.fdopen(descripteur, 'w', encoding='utf-8') as fichier:
+            json.dump(configuration, fichier, ensure_ascii=False, indent=2)
+        os.chmod(temporaire, 0o644)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+def _afficher_rapport(rapport: Dict, fichier=sys.stdout):
+    def bloc(titre, ajustements):
+        print(f"\n{titre}", file=fichier)
+        print(f"  {'paramètre':<30} {'valeur':>12} {'IC 95%':>27} {'n':>6} {'rmse':>12} {'r2':>6}", file=fichier)
+        for parametre, r in sorted(ajustements.items()):
+            ic95 = f"[{r['ic95'][0]:>11.2f}, {r['ic95'][1]:>11.2f}]" if r['ic95'] else '-'
+            rmse = f"{r['rmse']:.2f}" if r['rmse'] is not None else '-'
+            r2 = f"{r['r2']:.3f}" if r['r2'] is not None else '-'
+            borne = f"  (borné à {r['borne']:g})" if 'borne' in r else ''
+            print(f"  {parametre:<30} {r['valeur']:>12.2f} {ic95:>27} {r['n']:>6} {rmse:>12} {r2:>6}{borne}", file=fichier)
+
+    print(f"📊 Calibration sur {rapport['nombre_projets']} projets ({rapport['methode']})", file=fichier)
+    bloc('Global', rapport['global'])
+    for secteur, ajustements in rapport['secteurs'].items():
+        bloc(f"Secteur {secteur}", ajustements)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibre le modèle de coûts ERP sur des projets réels")
+    parser.add_argument('projets', help="Fichier CSV ou JSON des projets observés")
+    parser.add_argument('--version', required=True, help="Version de la configuration produite")
+    parser.add_argument('--sortie', default='modele_couts.json', help="Fichier de configuration à écrire")
+    parser.add_argument('--base', help="Configuration actuelle (proportions embauche/formation)")
+    parser.add_argument('--robuste', action='store_true', help="Régression de Huber et médianes")
+    parser.add_argument('--min-secteur', type=int, default=PROJETS_MIN_SECTEUR,
+                        help="Nombre minimal de projets pour ajuster un secteur")
+    parser.add_argument('--rapport', help="Fichier JSON où écrire le rapport d'ajustement")
+    args = parser.parse_args(argv)
+
+    debut = time.perf_counter()
+    projets = charger_projets(args.projets)
+    modele = None
+    if args.base:
+        with open(args.base, 'r', encoding='utf-8') as fichier:
+            modele = ModeleCouts.depuis_dict(json.load(fichier))
+
+    configuration, rapport = calibrer(projets, args.version, modele, args.robuste, args.min_secteur)
+    ecrire_configuration(args.sortie, configuration)
+    if args.rapport:
+        with open(args.rapport, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, ensure_ascii=False, indent=2)
+
+    _afficher_rapport(rapport)
+    print(f"\n✅ Configuration {args.version} écrite dans {args.sortie} "
+          f"({time.perf_counter() - debut:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
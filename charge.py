@@ -0,0 +1,332 @@
+"""
+Tests de charge : rejoue des parcours d'utilisateurs contre une instance locale.
+
+Chaque utilisateur virtuel est un thread avec sa propre session (cookies) qui
+enchaîne des parcours tirés au sort selon leur poids, avec des temps de
+réflexion aléatoires entre deux requêtes :
+
+    python charge.py http://localhost:5000 --utilisateurs 20 --duree 60 --montee 10
+
+Le rapport donne, par route, le débit, les centiles de latence et le taux
+d'erreurs (statut HTTP >= 400, 'success': false ou échec réseau), afin de
+comparer objectivement deux versions (stockage des sessions, historique,
+caches...). Les parcours peuvent être remplacés par un fichier JSON
+(--parcours) au format de PARCOURS_PAR_DEFAUT. Dans les corps de requête :
+    "$demande"   demande de calcul aléatoire (parfois identique à la précédente)
+    "$email"     adresse unique pour une inscription
+    "$resultats" résultats du dernier calcul du parcours
+"""
+import argparse
+import gzip
+import http.cookiejar
+import itertools
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+from simulation import quantiles
+
+CENTILES = (50, 90, 95, 99)
+
+ENTREPRISES = [
+    {'nom_entreprise': 'Atlas Industries', 'secteur': 'Industrie', 'taille': 'Grande',
+     'chiffre_affaires': 50000000, 'nombre_employes': 250},
+    {'nom_entreprise': 'Casa Services', 'secteur': 'Services', 'taille': 'Moyenne',
+     'chiffre_affaires': 15000000, 'nombre_employes': 120},
+    {'nom_entreprise': 'Maghreb Distribution', 'secteur': 'Distribution', 'taille': 'Moyenne',
+     'chiffre_affaires': 30000000, 'nombre_employes': 180},
+    {'nom_entreprise': 'Textile Fès', 'secteur': 'Textile', 'taille': 'PME',
+     'chiffre_affaires': 8000000, 'nombre_employes': 60},
+]
+
+# Paramètres qu'un utilisateur ajuste typiquement entre deux calculs, avec leur plage
+PARAMETRES_AJUSTES = {
+    'heures_correction': (100, 600),
+    'nombre_departs': (1, 15),
+    'taux_baisse_productivite': (5, 40),
+    'heures_support': (100, 800),
+    'delai_reel_mois': (8, 24),
+}
+
+PARCOURS_PAR_DEFAUT = {
+    'habitue': {
+        'poids': 3,
+        'etapes': [
+            {'methode': 'POST', 'chemin': '/api/auth/login',
+             'corps': {'email': 'demo@erp.ma', 'password': 'demo123'}},
+            {'methode': 'GET', 'chemin': '/api/couts/definitions'},
+            {'methode': 'GET', 'chemin': '/api/entreprise/exemples'},
+            {'methode': 'POST', 'chemin': '/api/couts/calculer?details=true', 'corps': '$demande', 'repeter': 4},
+            {'methode': 'POST', 'chemin': '/api/recommandations', 'corps': {'resultats': '$resultats'}},
+            {'methode': 'GET', 'chemin': '/api/historique'},
+            {'methode': 'POST', 'chemin': '/api/rapport/pdf', 'corps': {'resultats': '$resultats'}},
+            {'methode': 'POST', 'chemin': '/api/auth/logout'},
+        ]
+    },
+    'nouvel_utilisateur': {
+        'poids': 1,
+        'etapes': [
+            {'methode': 'GET', 'chemin': '/signup'},
+            {'methode': 'POST', 'chemin': '/api/auth/signup',
+             'corps': {'nom_complet': 'Utilisateur Charge', 'email': '$email',
+                       'password': 'charge123', 'confirm_password': 'charge123'}},
+            {'methode': 'GET', 'chemin': '/api/auth/check'},
+            {'methode': 'GET', 'chemin': '/api/couts/definitions'},
+            {'methode': 'POST', 'chemin': '/api/couts/calculer?details=true', 'corps': '$demande', 'repeter': 2},
+            {'methode': 'POST', 'chemin': '/api/recommandations', 'corps': {'resultats': '$resultats'}},
+            {'methode': 'GET', 'chemin': '/api/historique'},
+        ]
+    },
+    'visiteur': {
+        'poids': 1,
+        'etapes': [
+            {'methode': 'GET', 'chemin': '/'},
+            {'methode': 'GET', 'chemin': '/api/entreprise/exemples'},
+            {'methode': 'POST', 'chemin': '/api/statistiques/secteur', 'corps': {'secteur': 'Industrie'}},
+            {'methode': 'GET', 'chemin': '/api/auth/check'},
+        ]
+    },
+}
+
+
+class Statistiques:
+    """Latences et erreurs par route, partagées par tous les utilisateurs virtuels"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.latences: Dict[str, List[float]] = {}
+        self.erreurs: Dict[str, int] = {}
+        self.statuts: Dict[str, Dict[int, int]] = {}
+        self.parcours: Dict[str, int] = {}
+
+    def enregistrer(self, route: str, latence: float, statut: int, erreur: bool):
+        with self._verrou:
+            self.latences.setdefault(route, []).append(latence)
+            self.erreurs[route] = self.erreurs.get(route, 0) + (1 if erreur else 0)
+            statuts = self.statuts.setdefault(route, {})
+            statuts[statut] = statuts.get(statut, 0) + 1
+
+    def parcours_termine(self, nom: str):
+        with self._verrou:
+            self.parcours[nom] = self.parcours.get(nom, 0) + 1
+
+    def rapport(self, duree: float) -> Dict:
+        with self._verrou:
+            routes = {}
+            for route, latences in sorted(self.latences.items()):
+                triees = sorted(latences)
+                routes[route] = {
+                    'requetes': len(triees),
+                    'debit_rps': round(len(triees) / duree, 2),
+                    'erreurs': self.erreurs[route],
+                    'taux_erreur': round(self.erreurs[route] / len(triees) * 100, 2),
+                    'latence_ms': {
+                        'moyenne': round(sum(triees) / len(triees) * 1000, 1),
+                        **{centile: round(valeur * 1000, 1)
+                           for centile, valeur in quantiles(triees, CENTILES).items()},
+                        'max': round(triees[-1] * 1000, 1)
+                    },
+                    'statuts': dict(self.statuts[route])
+                }
+            toutes = sorted(itertools.chain.from_iterable(self.latences.values()))
+            total = len(toutes)
+            erreurs = sum(self.erreurs.values())
+            return {
+                'duree_s': round(duree, 1),
+                'requetes': total,
+                'debit_rps': round(total / duree, 2) if duree else 0,
+                'taux_erreur': round(erreurs / total * 100, 2) if total else 0,
+                'latence_ms': {centile: round(valeur * 1000, 1)
+                               for centile, valeur in quantiles(toutes, CENTILES).items()} if toutes else {},
+                'parcours': dict(self.parcours),
+                'routes': routes
+            }
+
+
+class UtilisateurVirtuel(threading.Thread):
+    """Enchaîne des parcours jusqu'à l'échéance, une nouvelle session (cookies) par parcours"""
+    _compteur = itertools.count()
+
+    def __init__(self, options, parcours: Dict, statistiques: Statistiques, echeance: float, depart: float):
+        numero = next(self._compteur)
+        super().__init__(name=f'utilisateur-{numero}', daemon=True)
+        self.options = options
+        self.parcours = parcours
+        self.statistiques = statistiques
+        self.echeance = echeance
+        self.depart = depart
+        self.numero = numero
+        self.generateur = random.Random(None if options.graine is None else options.graine + numero)
+        self.derniere_demande = None
+        self.resultats = None
+        self._emails = itertools.count()
+
+    def run(self):
+        time.sleep(max(0.0, self.depart - time.monotonic()))
+        noms = list(self.parcours)
+        poids = [self.parcours[nom].get('poids', 1) for nom in noms]
+        while time.monotonic() < self.echeance:
+            nom = self.generateur.choices(noms, poids)[0]
+            self.executer_parcours(self.parcours[nom]['etapes'])
+            self.statistiques.parcours_termine(nom)
+
+    def executer_parcours(self, etapes: List[Dict]):
+        ouvreur = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.resultats = None
+        for etape in etapes:
+            for _ in range(etape.get('repeter', 1)):
+                if time.monotonic() >= self.echeance:
+                    return
+                self.requete(ouvreur, etape)
+                self.reflechir()
+
+    def reflechir(self):
+        # Temps de réflexion exponentiel, borné pour éviter les pauses extrêmes
+        moyenne = self.options.reflexion
+        if moyenne > 0:
+            time.sleep(min(self.generateur.expovariate(1 / moyenne), 5 * moyenne))
+
+    def demande(self) -> Dict:
+        if self.derniere_demande is not None and self.generateur.random() < self.options.repetition:
+            return self.derniere_demande
+        demande = dict(self.generateur.choice(ENTREPRISES))
+        parametres = {}
+        for cle in self.generateur.sample(list(PARAMETRES_AJUSTES), self.generateur.randint(0, 2)):
+            bas, haut = PARAMETRES_AJUSTES[cle]
+            parametres[cle] = self.generateur.randint(bas, haut)
+        demande['parametres'] = parametres
+        self.derniere_demande = demande
+        return demande
+
+    def substituer(self, valeur):
+        if isinstance(valeur, dict):
+            return {cle: self.substituer(v) for cle, v in valeur.items()}
+        if isinstance(valeur, list):
+            return [self.substituer(v) for v in valeur]
+        if valeur == '$demande':
+            return self.demande()
+        if valeur == '$email':
+            return f'charge-{self.numero}-{next(self._emails)}-{int(time.time() * 1000)}@charge.test'
+        if valeur == '$resultats':
+            return self.resultats
+        return valeur
+
+    def requete(self, ouvreur, etape: Dict):
+        methode = etape.get('methode', 'GET')
+        chemin = etape['chemin']
+        route = f"{methode} {chemin.split('?')[0]}"
+        if self.resultats is None and '$resultats' in json.dumps(etape.get('corps')):
+            # Étape dépendante d'un calcul qui a échoué plus tôt dans le parcours
+            return
+        corps = self.substituer(etape['corps']) if 'corps' in etape else None
+
+        entetes = {'Accept': 'application/json'}
+        donnees = None
+        if corps is not None:
+            donnees = json.dumps(corps).encode('utf-8')
+            entetes['Content-Type'] = 'application/json'
+        if self.options.compression:
+            entetes['Accept-Encoding'] = 'gzip'
+        requete = urllib.request.Request(self.options.url.rstrip('/') + chemin,
+                                         data=donnees, headers=entetes, method=methode)
+
+        debut = time.perf_counter()
+        statut, contenu, encodage = 0, b'', None
+        try:
+            with ouvreur.open(requete, timeout=self.options.delai) as reponse:
+                statut = reponse.status
+                contenu = reponse.read()
+                encodage = reponse.headers.get('Content-Encoding')
+        except urllib.error.HTTPError as e:
+            statut = e.code
+            contenu = e.read()
+            encodage = e.headers.get('Content-Encoding')
+        except (urllib.error.URLError, OSError):
+            pass
+        latence = time.perf_counter() - debut
+
+        erreur = statut == 0 or statut >= 400
+        if not erreur and 'json' in entetes['Accept']:
+            reponse_json = self._json(contenu, encodage)
+            if isinstance(reponse_json, dict):
+                erreur = reponse_json.get('success') is False
+                if 'resultats' in reponse_json and isinstance(reponse_json['resultats'], dict):
+                    self.resultats = reponse_json['resultats']
+        self.statistiques.enregistrer(route, latence, statut, erreur)
+
+    @staticmethod
+    def _json(contenu: bytes, encodage: Optional[str]):
+        try:
+            if encodage == 'gzip':
+                contenu = gzip.decompress(contenu)
+            return json.loads(contenu)
+        except (ValueError, OSError):
+            return None
+
+
+def executer(options, parcours: Dict) -> Dict:
+    statistiques = Statistiques()
+    debut = time.monotonic()
+    echeance = debut + options.montee + options.duree
+    utilisateurs = [
+        UtilisateurVirtuel(options, parcours, statistiques, echeance,
+                           debut + options.montee * index / max(1, options.utilisateurs))
+        for index in range(options.utilisateurs)
+    ]
+    for utilisateur in utilisateurs:
+        utilisateur.start()
+    for utilisateur in utilisateurs:
+        utilisateur.join()
+    return statistiques.rapport(time.monotonic() - debut)
+
+
+def _afficher_rapport(rapport: Dict):
+    print(f"\n📊 {rapport['requetes']} requêtes en {rapport['duree_s']} s "
+          f"({rapport['debit_rps']} req/s, {rapport['taux_erreur']}% d'erreurs)")
+    print(f"   Parcours terminés: {rapport['parcours']}")
+    print(f"\n{'Route':<38}{'Req':>7}{'Req/s':>8}{'Err %':>7}{'Moy':>8}"
+          + ''.join(f'{"p" + str(c):>8}' for c in CENTILES) + f"{'Max':>9}")
+    for route, stats in rapport['routes'].items():
+        latence = stats['latence_ms']
+        print(f"{route:<38}{stats['requetes']:>7}{stats['debit_rps']:>8}{stats['taux_erreur']:>7}"
+              f"{latence['moyenne']:>8}" + ''.join(f"{latence['p' + str(c)]:>8}" for c in CENTILES)
+              + f"{latence['max']:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rejoue des parcours d'utilisateurs contre une instance locale")
+    parser.add_argument('url', nargs='?', default='http://localhost:5000', help="URL de l'instance à tester")
+    parser.add_argument('--utilisateurs', type=int, default=10, help="Nombre d'utilisateurs simultanés")
+    parser.add_argument('--duree', type=float, default=60, help="Durée de la phase de charge (secondes)")
+    parser.add_argument('--montee', type=float, default=5, help="Montée en charge progressive (secondes)")
+    parser.add_argument('--reflexion', type=float, default=1.0, help="Temps de réflexion moyen (secondes)")
+    parser.add_argument('--repetition', type=float, default=0.3,
+                        help="Probabilité de resoumettre la même demande de calcul")
+    parser.add_argument('--parcours', help="Fichier JSON de parcours (remplace les parcours par défaut)")
+    parser.add_argument('--compression', action='store_true', help="Envoie Accept-Encoding: gzip")
+    parser.add_argument('--delai', type=float, default=30, help="Délai maximal d'une requête (secondes)")
+    parser.add_argument('--graine', type=int, help="Graine aléatoire (parcours reproductibles)")
+    parser.add_argument('--rapport', help="Fichier JSON où écrire le rapport")
+    options = parser.parse_args(argv)
+
+    parcours = PARCOURS_PAR_DEFAUT
+    if options.parcours:
+        with open(options.parcours, 'r', encoding='utf-8') as fichier:
+            parcours = json.load(fichier)
+
+    print(f"🚀 {options.utilisateurs} utilisateurs sur {options.url} pendant {options.duree} s "
+          f"(montée {options.montee} s, réflexion {options.reflexion} s)")
+    rapport = executer(options, parcours)
+    _afficher_rapport(rapport)
+    if options.rapport:
+        with open(options.rapport, 'w', encoding='utf-8') as fichier:
+            json.dump(rapport, fichier, ensure_ascii=False, indent=2)
+        print(f"\n✅ Rapport écrit dans {options.rapport}")
+
+
+if __name__ == '__main__':
+    main()
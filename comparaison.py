@@ -0,0 +1,88 @@
+"""
+Comparaison de scénarios : écarts par ligne de coût et par catégorie.
+
+Chaque résultat est aplati en un vecteur de montants (lignes de coût, total
+par catégorie, total général) selon un ordre de composantes commun. La
+référence n'est aplatie qu'une fois, puis chaque variante est soustraite
+composante par composante. L'écart retourné ne contient que les composantes
+modifiées, avec leur variation absolue et relative.
+"""
+from typing import Dict, List
+
+from config_modele import CATEGORIES
+
+# Écart en dessous duquel une composante est considérée inchangée
+TOLERANCE = 1e-6
+
+
+def aplatir(resultat: Dict) -> Dict[str, float]:
+    """Montants d'un résultat : 'categorie.ligne' pour les lignes, 'categorie' pour les totaux"""
+    montants = {}
+    for categorie, cle_resultat, cle_total, _ in CATEGORIES:
+        couts = resultat.get(cle_resultat) or {}
+        for cle, ligne in couts.items():
+            if isinstance(ligne, dict) and 'valeur' in ligne:
+                montants[f'{categorie}.{cle}'] = ligne['valeur'] or 0
+        montants[categorie] = couts.get(cle_total, 0) or 0
+    montants['total_general'] = resultat.get('total_general', 0) or 0
+    return montants
+
+
+def _ecart(avant: float, apres: float) -> Dict:
+    delta = apres - avant
+    return {
+        'avant': avant,
+        'apres': apres,
+        'delta': round(delta, 2),
+        'pourcentage': round(delta / avant * 100, 2) if avant else None
+    }
+
+
+def _composantes(reference: Dict[str, float], variantes: List[Dict[str, float]]) -> List[str]:
+    # Ordre de la référence, puis composantes propres aux variantes (autre version du modèle)
+    composantes = list(reference)
+    connues = set(composantes)
+    for variante in variantes:
+        for cle in variante:
+            if cle not in connues:
+                connues.add(cle)
+                composantes.append(cle)
+    return composantes
+
+
+def comparer_lot(reference: Dict, variantes: List[Dict]) -> List[Dict]:
+    """Écarts de chaque variante par rapport à la référence (seules les composantes modifiées)"""
+    montants_reference = aplatir(reference)
+    montants_variantes = [aplatir(variante) for variante in variantes]
+    composantes = _composantes(montants_reference, montants_variantes)
+    vecteur_reference = [montants_reference.get(cle, 0) for cle in composantes]
+    categories = {categorie for categorie, _, _, _ in CATEGORIES}
+
+    ecarts = []
+    for variante, montants in zip(variantes, montants_variantes):
+        vecteur = [montants.get(cle, 0) for cle in composantes]
+        lignes, totaux_categories = {}, {}
+        inchangees = 0
+        for cle, avant, apres in zip(composantes, vecteur_reference, vecteur):
+            if abs(apres - avant) <= TOLERANCE:
+                if '.' in cle:
+                    inchangees += 1
+                continue
+            if cle == 'total_general':
+                continue
+            (totaux_categories if cle in categories else lignes)[cle] = _ecart(avant, apres)
+
+        total_avant, total_apres = montants_reference['total_general'], montants['total_general']
+        ecarts.append({
+            'lignes': lignes,
+            'categories': totaux_categories,
+            'total_general': _ecart(total_avant, total_apres),
+            'pourcentage_ca': {
+                'avant': reference.get('pourcentage_ca', 0),
+                'apres': variante.get('pourcentage_ca', 0),
+                'delta_points': round((variante.get('pourcentage_ca', 0) or 0) - (reference.get('pourcentage_ca', 0) or 0), 4)
+            },
+            'lignes_inchangees': inchangees,
+            'version_modele': variante.get('version_modele')
+        })
+    return ecarts
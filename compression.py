@@ -0,0 +1,330 @@
+"""
+Compression des réponses et requêtes conditionnelles.
+
+Installé par create_app (installer(app)), le middleware :
+- ajoute un ETag aux réponses GET et répond 304 quand If-None-Match correspond;
+- compresse les réponses textuelles (JSON, HTML, JS, CSS) selon Accept-Encoding,
+  en gzip (bibliothèque standard), brotli ou zstd si les modules optionnels
+  'brotli' et 'zstandard' sont installés;
+- compresse au fil de l'eau les réponses en flux, sauf les flux
+  Server-Sent Events dont chaque événement doit partir immédiatement;
+- mesure par codec les octets économisés et le temps CPU consommé.
+"""
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Iterator, Optional
+
+# En dessous, l'entête de compression et le coût CPU ne valent pas le gain
+TAILLE_MINIMALE = 1024
+# Au-delà, zstd (rapide) est préféré à brotli (meilleur taux mais plus lent)
+TAILLE_GRANDE = 512 * 1024
+
+TYPES_COMPRESSIBLES = (
+    'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'
+)
+TYPES_EXCLUS = ('text/event-stream',)
+
+NIVEAU_GZIP = 6
+QUALITE_BROTLI = 5
+NIVEAU_ZSTD = 3
+
+
+class _Codec(ABC):
+    """Compression d'un corps complet ou d'un flux de morceaux"""
+    nom = ''
+
+    @abstractmethod
+    def compresser(self, donnees: bytes) -> bytes:
+        """Corps complet compressé en une fois"""
+
+    @abstractmethod
+    def flux(self):
+        """Compresseur de flux : ajouter(morceau, vider) puis terminer()"""
+
+
+class _FluxGzip:
+    def __init__(self):
+        self._compresseur = zlib.compressobj(NIVEAU_GZIP, zlib.DEFLATED, 31)
+
+    def ajouter(self, morceau: bytes, vider: bool = False) -> bytes:
+        donnees = self._compresseur.compress(morceau)
+        return donnees + self._compresseur.flush(zlib.Z_SYNC_FLUSH) if vider else donnees
+
+    def terminer(self) -> bytes:
+        return self._compresseur.flush()
+
+
+class CodecGzip(_Codec):
+    nom = 'gzip'
+
+    def compresser(self, donnees: bytes) -> bytes:
+        compresseur = zlib.compressobj(NIVEAU_GZIP, zlib.DEFLATED, 31)
+        return compresseur.compress(donnees) + compresseur.flush()
+
+    def flux(self):
+        return _FluxGzip()
+
+
+class _FluxBrotli:
+    def __init__(self, brotli):
+        self._compresseur = brotli.Compressor(quality=QUALITE_BROTLI)
+
+    def ajouter(self, morceau: bytes, vider: bool = False) -> bytes:
+        donnees = self._compresseur.process(morceau)
+        return donnees + self._compresseur.flush() if vider else donnees
+
+    def terminer(self) -> bytes:
+        return self._compresseur.finish()
+
+
+class CodecBrotli(_Codec):
+    nom = 'br'
+
+    def __init__(self, brotli):
+        self._brotli = brotli
+
+    def compresser(self, donnees: bytes) -> bytes:
+        return self._brotli.compress(donnees, quality=QUALITE_BROTLI)
+
+    def flux(self):
+        return _FluxBrotli(self._brotli)
+
+
+class _FluxZstd:
+    def __init__(self, zstandard):
+        self._zstandard = zstandard
+        self._compresseur = zstandard.ZstdCompressor(level=NIVEAU_ZSTD).compressobj()
+
+    def ajouter(self, morceau: bytes, vider: bool = False) -> bytes:
+        donnees = self._compresseur.compress(morceau)
+        return donnees + self._compresseur.flush(self._zstandard.COMPRESSOBJ_FLUSH_BLOCK) if vider else donnees
+
+    def terminer(self) -> bytes:
+        return self._compresseur.flush()
+
+
+class CodecZstd(_Codec):
+    nom = 'zstd'
+
+    def __init__(self, zstandard):
+        self._zstandard = zstandard
+
+    def compresser(self, donnees: bytes) -> bytes:
+        # Un ZstdCompressor n'est pas partageable entre threads : un par appel, sans verrou
+        return self._zstandard.ZstdCompressor(level=NIVEAU_ZSTD).compress(donnees)
+
+    def flux(self):
+        return _FluxZstd(self._zstandard)
+
+
+def codecs_disponibles() -> Dict[str, _Codec]:
+    """gzip toujours; brotli et zstd seulement si leurs modules sont installés"""
+    codecs = {'gzip': CodecGzip()}
+    try:
+        import brotli
+        codecs['br'] = CodecBrotli(brotli)
+    except ImportError:
+        pass
+    try:
+        import zstandard
+        codecs['zstd'] = CodecZstd(zstandard)
+    except ImportError:
+        pass
+    return codecs
+
+
+def est_compressible(mimetype: Optional[str]) -> bool:
+    if not mimetype or mimetype in TYPES_EXCLUS:
+        return False
+    return mimetype.startswith('text/') or mimetype in TYPES_COMPRESSIBLES or mimetype.endswith('+json')
+
+
+class MetriquesCompression:
+    """Compteurs par codec : réponses, octets avant/après, temps CPU"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._codecs: Dict[str, Dict[str, float]] = {}
+        self.non_compressees = 0
+        self.non_modifiees = 0
+
+    def enregistrer(self, codec: str, entree: int, sortie: int, cpu: float):
+        with self._verrou:
+            compteurs = self._codecs.setdefault(codec, {'reponses': 0, 'octets_entree': 0, 'octets_sortie': 0, 'cpu_s': 0.0})
+            compteurs['reponses'] += 1
+            compteurs['octets_entree'] += entree
+            compteurs['octets_sortie'] += sortie
+            compteurs['cpu_s'] += cpu
+
+    def compter(self, attribut: str):
+        with self._verrou:
+            setattr(self, attribut, getattr(self, attribut) + 1)
+
+    def to_dict(self) -> Dict:
+        with self._verrou:
+            codecs = {}
+            for nom, compteurs in self._codecs.items():
+                entree, sortie = compteurs['octets_entree'], compteurs['octets_sortie']
+                codecs[nom] = {
+                    'reponses': compteurs['reponses'],
+                    'octets_entree': entree,
+                    'octets_sortie': sortie,
+                    'octets_economises': entree - sortie,
+                    'ratio': round(sortie / entree, 4) if entree else None,
+                    'cpu_ms': round(compteurs['cpu_s'] * 1000, 2),
+                    'cpu_ms_par_mo': round(compteurs['cpu_s'] * 1000 / (entree / 1e6), 2) if entree else None
+                }
+            return {
+                'codecs': codecs,
+                'non_compressees': self.non_compressees,
+                'non_modifiees': self.non_modifiees
+            }
+
+
+def encodages_acceptes(entete: str) -> Dict[str, float]:
+    """Accept-Encoding -> {encodage: q}"""
+    acceptes = {}
+    for element in entete.split(','):
+        nom, _, parametres = element.strip().partition(';')
+        nom = nom.strip().lower()
+        if not nom:
+            continue
+        q = 1.0
+        parametres = parametres.strip()
+        if parametres.startswith('q='):
+            try:
+                q = float(parametres[2:])
+            except ValueError:
+                q = 0.0
+        acceptes[nom] = q
+    return acceptes
+
+
+class Compression:
+    """Middleware de compression et d'ETag pour une application Flask"""
+
+    def __init__(self, taille_minimale: int = TAILLE_MINIMALE):
+        self.taille_minimale = taille_minimale
+        self.metriques = MetriquesCompression()
+        self._codecs = None
+
+    @property
+    def codecs(self) -> Dict[str, _Codec]:
+        # Modules optionnels importés à la première réponse compressée
+        if self._codecs is None:
+            self._codecs = codecs_disponibles()
+        return self._codecs
+
+    def choisir_codec(self, accept_encoding: str, taille: Optional[int]) -> Optional[_Codec]:
+        acceptes = encodages_acceptes(accept_encoding)
+        if not acceptes:
+            return None
+        if taille is not None and taille >= TAILLE_GRANDE:
+            preferences = ('zstd', 'gzip', 'br')
+        else:
+            preferences = ('br', 'zstd', 'gzip')
+        joker = acceptes.get('*', 0.0)
+        candidats = [(acceptes.get(nom, joker), -rang, nom)
+                     for rang, nom in enumerate(preferences) if nom in self.codecs]
+        candidats = [candidat for candidat in candidats if candidat[0] > 0]
+        if not candidats:
+            return None
+        return self.codecs[max(candidats)[2]]
+
+    def traiter(self, request, response):
+        """after_request : ETag/304 puis compression"""
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 \
+                and not response.is_streamed and not response.direct_passthrough:
+            if 'ETag' not in response.headers:
+                response.add_etag(weak=True)
+                # Revalidation systématique : les réponses dépendent de la session
+                if 'Cache-Control' not in response.headers:
+                    response.headers['Cache-Control'] = 'private, no-cache'
+            response.make_conditional(request)
+            if response.status_code == 304:
+                self.metriques.compter('non_modifiees')
+                return response
+
+        if not est_compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        # Pas de corps (1xx, 204, 304), plage d'octets (206) ou corps déjà encodé
+        if response.status_code < 200 or response.status_code in (204, 206, 304) \
+                or 'Content-Encoding' in response.headers or request.method == 'HEAD':
+            return response
+
+        streame = response.is_streamed or response.direct_passthrough
+        taille = None if streame else response.content_length
+        if taille is not None and taille < self.taille_minimale:
+            self.metriques.compter('non_compressees')
+            return response
+
+        codec = self.choisir_codec(request.headers.get('Accept-Encoding', ''), taille)
+        if codec is None:
+            self.metriques.compter('non_compressees')
+            return response
+
+        if streame:
+            self._compresser_flux(response, codec)
+        else:
+            donnees = response.get_data()
+            debut = time.thread_time()
+            compressees = codec.compresser(donnees)
+            self.metriques.enregistrer(codec.nom, len(donnees), len(compressees), time.thread_time() - debut)
+            response.set_data(compressees)
+
+        response.headers['Content-Encoding'] = codec.nom
+        # Le corps transmis n'est plus celui de l'ETag d'origine
+        etag, faible = response.get_etag()
+        if etag and not faible:
+            response.set_etag(etag, weak=True)
+        response.headers.pop('Accept-Ranges', None)
+        return response
+
+    def _compresser_flux(self, response, codec: _Codec):
+        source = response.response
+        if hasattr(source, 'close'):
+            response.call_on_close(source.close)
+        response.response = self._flux(source, codec)
+        response.direct_passthrough = False
+        response.headers.pop('Content-Length', None)
+
+    def _flux(self, morceaux: Iterable, codec: _Codec) -> Iterator[bytes]:
+        flux = codec.flux()
+        entree = sortie = 0
+        cpu = 0.0
+        for morceau in morceaux:
+            if isinstance(morceau, str):
+                morceau = morceau.encode('utf-8')
+            debut = time.thread_time()
+            # Chaque morceau est vidé pour que le client le reçoive sans attendre la fin du flux
+            donnees = flux.ajouter(morceau, vider=True)
+            cpu += time.thread_time() - debut
+            entree += len(morceau)
+            sortie += len(donnees)
+            if donnees:
+                yield donnees
+        debut = time.thread_time()
+        donnees = flux.terminer()
+        cpu += time.thread_time() - debut
+        sortie += len(donnees)
+        self.metriques.enregistrer(codec.nom, entree, sortie, cpu)
+        if donnees:
+            yield donnees
+
+
+def installer(app) -> Compression:
+    """Enregistre le middleware sur l'application (accessible via app.extensions['compression'])"""
+    from flask import request
+
+    compression = Compression(app.config.get('COMPRESSION_TAILLE_MINIMALE', TAILLE_MINIMALE))
+    app.extensions['compression'] = compression
+
+    @app.after_request
+    def compresser_reponse(response):
+        return compression.traiter(request, response)
+
+    return compression
@@ -0,0 +1,152 @@
+"""
+Configuration versionnée du modèle de coûts ERP.
+
+Les valeurs par défaut du calculateur (taux horaires, durées, volumes...) sont
+lues depuis un fichier JSON rechargé à chaud :
+
+    {
+        "version": "2024.2",
+        "defauts": {"cout_jour_homme": 850, "taux_horaire_technicien": 160},
+        "secteurs": {
+            "Textile": {"taux_baisse_productivite": 20}
+        }
+    }
+
+Les clés absentes de "defauts" reprennent DEFAUTS_MODELE. Chaque rechargement
+construit un nouvel instantané immuable puis le publie par une simple
+affectation : les requêtes lisent toujours un modèle complet, sans verrou.
+"""
+import time
+from typing import Dict, Optional
+
+from rechargement import SourceRechargeable
+
+# Valeurs par défaut historiques du calculateur
+DEFAUTS_MODELE = {
+    # Erreurs
+    'delai_reel_mois': 12,
+    'delai_prevue_mois': 8,
+    'cout_jour_homme': 800,
+    'heures_correction': 200,
+    'taux_horaire_technicien': 150,
+    'nombre_personnes_formation': 50,
+    'duree_formation_jours': 5,
+    'cout_formation_par_jour': 500,
+    'heures_configuration': 100,
+    'taux_horaire_developpeur': 200,
+
+    # Résistance au changement
+    'taux_baisse_productivite': 15,
+    'salaire_moyen_mensuel': 8000,
+    'nombre_employes': 100,
+    'duree_adaptation_mois': 3,
+    'nombre_departs': 5,
+    'cout_embauche_par_personne': 10000,
+    'cout_formation_nouvel_employe': 5000,
+    'heures_inefficacite': 500,
+    'taux_horaire_moyen': 50,
+    'heures_support': 300,
+    'taux_horaire_support': 100,
+
+    # Imprévus
+    'heures_retravail': 300,
+    'heures_integration': 400,
+    'cout_maintenance_annuel': 100000,
+    'taux_maintenance_imprevu': 20,
+    'heures_adaptation': 200,
+    'taux_horaire_expert': 250
+}
+
+# Catégories de coûts des résultats : (clé de catégorie, clé du résultat, clé du total, libellé)
+CATEGORIES = (
+    ('erreurs', 'couts_erreurs', 'total_erreurs', 'Erreurs'),
+    ('resistance', 'couts_resistance', 'total_resistance', 'Résistance au changement'),
+    ('imprevus', 'couts_imprevus', 'total_imprevus', 'Imprévus'),
+)
+
+# Paramètres exprimés en pourcentage, bornés à [0, 100]
+PARAMETRES_POURCENTAGES = frozenset({'taux_baisse_productivite', 'taux_maintenance_imprevu'})
+
+VERSION_PAR_DEFAUT = 'defaut'
+
+
+class ErreurConfiguration(ValueError):
+    """Fichier de configuration du modèle invalide"""
+
+
+class ModeleCouts:
+    """Instantané immuable d'une version du modèle de coûts"""
+    __slots__ = ('version', 'defauts', 'secteurs', 'charge_le')
+
+    def __init__(self, version: str, defauts: Dict, secteurs: Optional[Dict] = None):
+        self.version = version
+        self.defauts = {**DEFAUTS_MODELE, **defauts}
+        self.secteurs = secteurs or {}
+        self.charge_le = time.time()
+
+    def to_dict(self) -> Dict:
+        return {
+            'version': self.version,
+            'defauts': self.defauts,
+            'secteurs': self.secteurs
+        }
+
+    @classmethod
+    def depuis_dict(cls, donnees: Dict) -> 'ModeleCouts':
+        """Construit et valide un modèle depuis le contenu du fichier JSON"""
+        if not isinstance(donnees, dict):
+            raise ErreurConfiguration("La configuration doit être un objet JSON")
+
+        version = donnees.get('version')
+        if not version:
+            raise ErreurConfiguration("Le champ version est obligatoire")
+
+        defauts = _valider_valeurs(donnees.get('defauts', {}), 'defauts')
+        secteurs = donnees.get('secteurs', {})
+        if not isinstance(secteurs, dict):
+            raise ErreurConfiguration("Le champ secteurs doit être un objet")
+
+        return cls(
+            str(version),
+            defauts,
+            {secteur: _valider_valeurs(valeurs, f'secteurs.{secteur}')
+             for secteur, valeurs in secteurs.items()}
+        )
+
+
+def _valider_valeurs(valeurs: Dict, chemin: str) -> Dict:
+    if not isinstance(valeurs, dict):
+        raise ErreurConfiguration(f"Le champ {chemin} doit être un objet")
+    for cle, valeur in valeurs.items():
+        if cle not in DEFAUTS_MODELE:
+            raise ErreurConfiguration(f"Paramètre inconnu: {chemin}.{cle}")
+        if isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or valeur < 0:
+            raise ErreurConfiguration(f"Valeur invalide pour {chemin}.{cle}: {valeur!r}")
+        if cle in PARAMETRES_POURCENTAGES and valeur > 100:
+            raise ErreurConfiguration(f"Pourcentage supérieur à 100 pour {chemin}.{cle}: {valeur!r}")
+    return dict(valeurs)
+
+
+class MagasinConfiguration(SourceRechargeable):
+    """Source du modèle courant, rechargée à chaud depuis un fichier JSON"""
+    libelle = 'Configuration du modèle'
+
+    def __init__(self, chemin: Optional[str] = None, intervalle_verification: float = 5.0):
+        super().__init__(chemin, intervalle_verification, ModeleCouts(VERSION_PAR_DEFAUT, {}))
+
+    def construire(self, donnees: Dict) -> ModeleCouts:
+        return ModeleCouts.depuis_dict(donnees)
+
+    def accepter(self, modele: ModeleCouts, force: bool) -> bool:
+        if modele.version == self._courant.version and not force:
+            if modele.to_dict() != self._courant.to_dict():
+                print(f"❌ Configuration modifiée sans changement de version ({modele.version}): ignorée")
+            return False
+        return True
+
+    def annoncer(self, modele: ModeleCouts):
+        print(f"✅ Modèle de coûts chargé: version {modele.version}")
+
+    def courant(self) -> ModeleCouts:
+        """Retourne le modèle courant en vérifiant périodiquement le fichier"""
+        return self.instantane()
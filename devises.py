@@ -0,0 +1,131 @@
+"""
+Conversion des résultats dans d'autres devises.
+
+Les taux proviennent d'une table locale versionnée (JSON, sans accès réseau),
+gardée en mémoire et rechargée quand le fichier change :
+
+    {
+        "version": "2026-10",
+        "base": "MAD",
+        "taux": {"EUR": 0.0925, "USD": 0.1085}
+    }
+
+Chaque taux donne le nombre d'unités de la devise pour une unité de la devise
+de base. Les calculs restent faits en devise de base; la conversion est une
+étape de post-traitement appliquée en une passe à tous les montants d'un
+résultat (ou d'un lot), avec un seul instantané de la table pour toute la
+réponse. Les textes 'details' restent exprimés en devise de base.
+"""
+from typing import Dict, Iterable, List, Optional
+
+from rechargement import SourceRechargeable
+
+DEVISE_BASE = 'MAD'
+VERSION_PAR_DEFAUT = 'defaut'
+
+# Clés dont la valeur est un montant (les pourcentages et effectifs ne sont pas convertis)
+CLES_MONETAIRES = frozenset({
+    'chiffre_affaires', 'total_general', 'total_erreurs', 'total_resistance',
+    'total_imprevus', 'moyenne', 'total_moyen', 'p5', 'p50', 'p95',
+    'couts_moyens_erreurs', 'couts_moyens_resistance', 'couts_moyens_imprevus'
+})
+# 'valeur' n'est un montant que dans une ligne de coût (ailleurs, ex. point de balayage, c'est un paramètre)
+CLES_MONETAIRES_LIGNE = CLES_MONETAIRES | {'valeur'}
+# Sous-arbres jamais convertis, même s'ils portent des clés monétaires (quantiles en % du CA)
+CLES_NON_MONETAIRES = frozenset({'pourcentage_ca'})
+
+
+class ErreurDevise(ValueError):
+    """Devise absente de la table de taux"""
+
+
+class TableTaux:
+    """Instantané immuable d'une table de taux"""
+    __slots__ = ('version', 'base', 'taux')
+
+    def __init__(self, version: str, base: str, taux: Dict[str, float]):
+        self.version = version
+        self.base = base
+        self.taux = {base: 1.0, **taux}
+
+    @classmethod
+    def depuis_dict(cls, donnees: Dict) -> 'TableTaux':
+        if not isinstance(donnees, dict):
+            raise ValueError("La table de taux doit être un objet JSON")
+        version = donnees.get('version')
+        if not isinstance(version, str) or not version:
+            raise ValueError("Version de la table de taux manquante")
+        base = donnees.get('base', DEVISE_BASE)
+        if base != DEVISE_BASE:
+            raise ValueError(f"Devise de base {base} non supportée (attendu {DEVISE_BASE})")
+        taux = {}
+        for code, valeur in (donnees.get('taux') or {}).items():
+            if not isinstance(valeur, (int, float)) or isinstance(valeur, bool) or valeur <= 0:
+                raise ValueError(f"Taux invalide pour {code}: {valeur!r}")
+            taux[code.upper()] = float(valeur)
+        return cls(version, base, taux)
+
+    def taux_vers(self, devise: str) -> float:
+        try:
+            return self.taux[devise]
+        except KeyError:
+            raise ErreurDevise(f"Devise non supportée: {devise} (disponibles: {', '.join(sorted(self.taux))})")
+
+    def to_dict(self) -> Dict:
+        return {'version': self.version, 'base': self.base, 'taux': dict(self.taux)}
+
+
+def _convertir(noeud, facteur: float):
+    if isinstance(noeud, dict):
+        monetaires = CLES_MONETAIRES_LIGNE if 'description' in noeud else CLES_MONETAIRES
+        return {cle: (valeur if cle in CLES_NON_MONETAIRES
+                      else round(valeur * facteur, 2)
+                      if cle in monetaires and isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+                      else _convertir(valeur, facteur))
+                for cle, valeur in noeud.items()}
+    if isinstance(noeud, list):
+        return [_convertir(valeur, facteur) for valeur in noeud]
+    return noeud
+
+
+class ConvertisseurDevises(SourceRechargeable):
+    """Table de taux courante, rechargée à chaud depuis un fichier JSON"""
+    libelle = 'Table de taux'
+
+    def __init__(self, chemin: Optional[str] = None, intervalle_verification: float = 5.0):
+        super().__init__(chemin, intervalle_verification, TableTaux(VERSION_PAR_DEFAUT, DEVISE_BASE, {}))
+
+    def construire(self, donnees: Dict) -> TableTaux:
+        return TableTaux.depuis_dict(donnees)
+
+    def annoncer(self, table: TableTaux):
+        print(f"✅ Taux de change chargés: version {table.version} ({', '.join(sorted(table.taux))})")
+
+    def courante(self) -> TableTaux:
+        """Retourne la table courante en vérifiant périodiquement le fichier"""
+        return self.instantane()
+
+    def metadonnees(self, devise: str, table: Optional[TableTaux] = None) -> Dict:
+        table = table or self.courante()
+        return {
+            'code': devise,
+            'base': table.base,
+            'taux': table.taux_vers(devise),
+            'version_taux': table.version
+        }
+
+    def convertir_lot(self, resultats: Iterable[Dict], devise: str) -> List[Dict]:
+        """Copies converties des résultats, tous au même taux; les originaux (en cache) ne sont pas modifiés"""
+        table = self.courante()
+        devise = devise.upper()
+        facteur = table.taux_vers(devise)
+        metadonnees = self.metadonnees(devise, table)
+        convertis = []
+        for resultat in resultats:
+            copie = _convertir(resultat, facteur) if facteur != 1.0 else dict(resultat)
+            copie['devise'] = metadonnees
+            convertis.append(copie)
+        return convertis
+
+    def convertir(self, resultat: Dict, devise: str) -> Dict:
+        return self.convertir_lot((resultat,), devise)[0]
@@ -0,0 +1,186 @@
+"""
+Exécution des traitements longs (simulations, balayages) en arrière-plan.
+
+Chaque job publie ses événements (progression, résultats partiels, résultat
+final) sur un bus en mémoire. Les clients s'y abonnent via un flux
+Server-Sent Events : les événements déjà émis sont rejoués, puis les suivants
+sont transmis au fil de l'eau. Chaque événement porte un numéro (id:) : un
+client qui se reconnecte avec Last-Event-ID ne reçoit que la suite.
+
+Un flux ouvert occupe un thread du serveur tant qu'il attend. Leur nombre est
+donc borné (flux_max, au-delà le client consulte l'état du job) et chaque flux
+est fermé après duree_max_flux secondes; le client EventSource se reconnecte
+alors de lui-même et reprend au dernier événement reçu.
+"""
+import json
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+EVENEMENTS_FINAUX = ('resultat', 'erreur')
+
+
+class BusEvenements:
+    """Pub/sub en mémoire : un historique et des files d'abonnés par job
+
+    Les files reçoivent des couples (numéro, événement), numérotés à partir de 1 par job.
+    """
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self._historiques: Dict[str, List[Dict]] = {}
+        self._abonnes: Dict[str, List[queue.Queue]] = {}
+
+    def publier(self, job_id: str, evenement: Dict):
+        with self._verrou:
+            historique = self._historiques.setdefault(job_id, [])
+            historique.append(evenement)
+            numero = len(historique)
+            abonnes = list(self._abonnes.get(job_id, ()))
+        for file in abonnes:
+            file.put((numero, evenement))
+
+    def abonner(self, job_id: str, depuis: int = 0) -> queue.Queue:
+        """Nouvelle file d'abonné, préremplie avec les événements publiés après le numéro depuis"""
+        file = queue.Queue()
+        with self._verrou:
+            for numero, evenement in enumerate(self._historiques.get(job_id, ()), start=1):
+                if numero > depuis:
+                    file.put((numero, evenement))
+            self._abonnes.setdefault(job_id, []).append(file)
+        return file
+
+    def desabonner(self, job_id: str, file: queue.Queue):
+        with self._verrou:
+            abonnes = self._abonnes.get(job_id, [])
+            if file in abonnes:
+                abonnes.remove(file)
+            if not abonnes:
+                self._abonnes.pop(job_id, None)
+
+    def oublier(self, job_id: str):
+        with self._verrou:
+            self._historiques.pop(job_id, None)
+
+
+class Job:
+    __slots__ = ('id', 'type', 'user_id', 'statut', 'cree_le', 'termine_le', 'resultat', 'erreur')
+
+    def __init__(self, type_job: str, user_id: str):
+        self.id = uuid.uuid4().hex
+        self.type = type_job
+        self.user_id = user_id
+        self.statut = 'en_attente'
+        self.cree_le = time.time()
+        self.termine_le = None
+        self.resultat = None
+        self.erreur = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'type': self.type,
+            'statut': self.statut,
+            'resultat': self.resultat,
+            'erreur': self.erreur
+        }
+
+
+class GestionnaireJobs:
+    """File de jobs exécutés par un pool de threads, avec publication de leur progression"""
+
+    def __init__(self, nombre_workers: int = 2, retention: float = 600.0,
+                 flux_max: int = 64, duree_max_flux: float = 300.0):
+        self.bus = BusEvenements()
+        self.retention = retention
+        self.flux_max = flux_max
+        self.duree_max_flux = duree_max_flux
+        self._executeur = ThreadPoolExecutor(max_workers=nombre_workers, thread_name_prefix='job')
+        self._jobs: Dict[str, Job] = {}
+        self._verrou = threading.Lock()
+        self._flux_ouverts = 0
+
+    def soumettre(self, type_job: str, user_id: str, traitement: Callable, *args) -> Job:
+        """Lance traitement(*args, publier=...) en arrière-plan"""
+        self._purger()
+        job = Job(type_job, user_id)
+        with self._verrou:
+            self._jobs[job.id] = job
+        self._executeur.submit(self._executer, job, traitement, args)
+        return job
+
+    def job(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def _executer(self, job: Job, traitement: Callable, args):
+        job.statut = 'en_cours'
+
+        def publier(type_evenement: str, **donnees):
+            self.bus.publier(job.id, {'type': type_evenement, **donnees})
+
+        try:
+            job.resultat = traitement(*args, publier=publier)
+            job.statut = 'termine'
+            publier('resultat', resultat=job.resultat)
+        except Exception as e:
+            print(f"❌ Erreur job {job.type} {job.id}: {str(e)}")
+            job.statut = 'erreur'
+            job.erreur = str(e)
+            publier('erreur', message=str(e))
+        finally:
+            job.termine_le = time.time()
+
+    def _purger(self):
+        limite = time.time() - self.retention
+        with self._verrou:
+            expires = [job_id for job_id, job in self._jobs.items()
+                       if job.termine_le is not None and job.termine_le < limite]
+            for job_id in expires:
+                del self._jobs[job_id]
+        for job_id in expires:
+            self.bus.oublier(job_id)
+
+    def reserver_flux(self) -> bool:
+        """Réserve une place de flux SSE; False si flux_max flux sont déjà ouverts"""
+        with self._verrou:
+            if self._flux_ouverts >= self.flux_max:
+                return False
+            self._flux_ouverts += 1
+            return True
+
+    def liberer_flux(self):
+        with self._verrou:
+            self._flux_ouverts -= 1
+
+    def flux_sse(self, job_id: str, dernier_id: int = 0, intervalle_ping: float = 15.0) -> Iterator[str]:
+        """Événements du job postérieurs à dernier_id au format Server-Sent Events
+
+        Le flux se termine à l'événement final, après duree_max_flux secondes (le client
+        se reconnecte avec Last-Event-ID) ou dès que le job n'existe plus.
+        """
+        file = self.bus.abonner(job_id, dernier_id)
+        fin = time.monotonic() + self.duree_max_flux
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                # Job purgé (ou inconnu) sans événement en attente : rien ne viendra plus
+                if file.empty() and self.job(job_id) is None:
+                    yield 'event: erreur\ndata: {"type": "erreur", "message": "Traitement introuvable ou expiré"}\n\n'
+                    return
+                restant = fin - time.monotonic()
+                if restant <= 0:
+                    return
+                try:
+                    numero, evenement = file.get(timeout=min(intervalle_ping, restant))
+                except queue.Empty:
+                    # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                    yield ': ping\n\n'
+                    continue
+                yield f"id: {numero}\nevent: {evenement['type']}\ndata: {json.dumps(evenement, ensure_ascii=False)}\n\n"
+                if evenement['type'] in EVENEMENTS_FINAUX:
+                    return
+        finally:
+            self.bus.desabonner(job_id, file)
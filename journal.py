@@ -0,0 +1,348 @@
+"""
+Journal d'activité en ajout seul, écrit en arrière-plan.
+
+Les vues ne font qu'ajouter l'événement à une file en mémoire (aucune E/S sur
+le chemin de la requête); un thread d'écriture le vide par lots dans des
+segments JSON Lines. Chaque processus (worker gunicorn) écrit ses propres
+segments, numérotés par pid :
+
+    journal/evenements-4242-000001.jsonl.gz   segment clos, compressé
+    journal/evenements-4242-000002.jsonl      segment courant du pid 4242
+    journal/evenements-4243-000001.jsonl      segment courant du pid 4243
+
+Un segment est clos puis compressé quand il dépasse taille_segment. Quand la
+file est pleine (disque lent ou saturé) ou que le dossier est inaccessible,
+l'événement est rejeté et compté plutôt que de bloquer ou faire échouer la
+requête; le nombre d'événements perdus est exposé par statistiques() et
+journalisé dès que l'écriture reprend. La lecture fusionne les segments de
+tous les processus par horodatage.
+
+Consultation et export :
+
+    python journal.py requete --type calcul --depuis 2026-10-01 --format csv
+    python journal.py resume
+"""
+import argparse
+import atexit
+import csv
+import datetime
+import gzip
+import heapq
+import json
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+PREFIXE = 'evenements-'
+MOTIF_SEGMENT = re.compile(r'^evenements-(\d+)-(\d{6})\.jsonl(\.gz)?$')
+
+# Messages affichés sur la console par le thread d'écriture (comme les anciens print)
+MESSAGES = {
+    'inscription': "Nouvel utilisateur inscrit: {email}",
+    'connexion': "Utilisateur connecté: {email}",
+    'connexion_echec': "Échec de connexion: {email}",
+    'deconnexion': "Utilisateur déconnecté: {email}",
+    'calcul': "Calcul effectué pour: {nom_entreprise} par {email}",
+    'calcul_lot': "Lot de {calculs} calculs effectué par {email}",
+    'comparaison': "Comparaison de {variantes} variantes par {email}",
+    'rapport': "Rapport généré pour: {email}",
+    'job': "Job {type_job} {job_id} lancé par {email}",
+    'evenements_perdus': "{perdus} événements perdus (file du journal pleine)",
+}
+
+_FIN = object()
+
+
+class JournalEvenements:
+    """File d'événements vidée par lots dans les segments rotatifs du processus par un thread d'écriture"""
+
+    def __init__(self, dossier: str, taille_segment: int = 8 * 1024 * 1024, taille_file: int = 10000,
+                 taille_lot: int = 500, intervalle: float = 0.5, afficher: bool = True,
+                 synchroniser: bool = True):
+        self.dossier = dossier
+        self.taille_segment = taille_segment
+        self.taille_file = taille_file
+        self.taille_lot = taille_lot
+        self.intervalle = intervalle
+        self.afficher = afficher
+        self.synchroniser = synchroniser
+        self._verrou = threading.Lock()
+        self.ecrits = 0
+        self.perdus = 0
+        self._perdus_signales = 0
+        self.erreur: Optional[str] = None
+        # Dossier et segment ouverts par le thread d'écriture, jamais pendant une requête
+        self._fichier = None
+        self._numero = None
+        self._demarrer()
+        atexit.register(self.fermer)
+
+    def _demarrer(self):
+        self._pid = os.getpid()
+        self._file = queue.Queue(maxsize=self.taille_file)
+        self._fichier = None
+        self._numero = None
+        self._thread = threading.Thread(target=self._ecrire, name='journal', daemon=True)
+        self._thread.start()
+
+    def enregistrer(self, type_evenement: str, **donnees):
+        """Ajoute un événement sans attendre; rejeté (et compté) si la file est pleine"""
+        if os.getpid() != self._pid:
+            # Processus issu d'un fork (gunicorn --preload) : le thread d'écriture n'y existe pas
+            with self._verrou:
+                if os.getpid() != self._pid:
+                    self._demarrer()
+        evenement = {'ts': time.time(), 'type': type_evenement, **donnees}
+        try:
+            self._file.put_nowait(evenement)
+        except queue.Full:
+            with self._verrou:
+                self.perdus += 1
+
+    def fermer(self, delai: float = 5.0):
+        """Vide la file puis arrête le thread d'écriture"""
+        if os.getpid() != self._pid or not self._thread.is_alive():
+            return
+        self._file.put(_FIN)
+        self._thread.join(delai)
+
+    def statistiques(self) -> Dict:
+        with self._verrou:
+            return {
+                'en_attente': self._file.qsize(),
+                'ecrits': self.ecrits,
+                'perdus': self.perdus,
+                'segment': os.path.basename(self._chemin(self._numero)) if self._numero else None,
+                'erreur': self.erreur
+            }
+
+    def _chemin(self, numero: int, compresse: bool = False) -> str:
+        return os.path.join(self.dossier, f'{PREFIXE}{self._pid}-{numero:06d}.jsonl' + ('.gz' if compresse else ''))
+
+    def _dernier_segment(self) -> int:
+        # On reprend le dernier segment non compressé de ce pid, ou on ouvre le suivant
+        numeros = [(int(m.group(2)), bool(m.group(3)))
+                   for m in map(MOTIF_SEGMENT.match, os.listdir(self.dossier))
+                   if m and int(m.group(1)) == self._pid]
+        if not numeros:
+            return 1
+        numero, compresse = max(numeros)
+        return numero + 1 if compresse else numero
+
+    def _ouvrir(self):
+        if self._numero is None:
+            os.makedirs(self.dossier, exist_ok=True)
+            self._numero = self._dernier_segment()
+        self._fichier = open(self._chemin(self._numero), 'ab')
+
+    def _ecrire(self):
+        termine = False
+        while not termine:
+            try:
+                lot = [self._file.get(timeout=self.intervalle)]
+            except queue.Empty:
+                continue
+            while len(lot) < self.taille_lot:
+                try:
+                    lot.append(self._file.get_nowait())
+                except queue.Empty:
+                    break
+            if _FIN in lot:
+                lot = [evenement for evenement in lot if evenement is not _FIN]
+                termine = True
+            nombre = len(lot)
+            try:
+                self._ecrire_lot(lot)
+            except Exception as e:
+                # Le thread ne doit jamais mourir : le lot est compté perdu, le segment rouvert au lot suivant
+                with self._verrou:
+                    self.perdus += nombre
+                    nouvelle_erreur = str(e) != self.erreur
+                    self.erreur = str(e)
+                if nouvelle_erreur:
+                    print(f"❌ Journal: écriture impossible ({e}), {nombre} événements perdus")
+                self._liberer()
+        self._liberer()
+
+    def _liberer(self):
+        if self._fichier is not None:
+            try:
+                self._fichier.close()
+            except OSError:
+                pass
+            self._fichier = None
+
+    def _ecrire_lot(self, lot: List[Dict]):
+        with self._verrou:
+            perdus = self.perdus - self._perdus_signales
+        if perdus:
+            lot.append({'ts': time.time(), 'type': 'evenements_perdus', 'perdus': perdus})
+        if not lot:
+            return
+
+        lignes = b''.join(json.dumps(evenement, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+                          for evenement in lot)
+        if self._fichier is None:
+            self._ouvrir()
+        self._fichier.write(lignes)
+        self._fichier.flush()
+        if self.synchroniser:
+            os.fsync(self._fichier.fileno())
+        with self._verrou:
+            self.ecrits += len(lot)
+            self._perdus_signales += perdus
+            self.erreur = None
+
+        if self.afficher:
+            for evenement in lot:
+                message = MESSAGES.get(evenement['type'])
+                if message:
+                    try:
+                        print(f"✅ {message.format_map(evenement)}")
+                    except KeyError:
+                        print(f"✅ {evenement['type']}")
+
+        if self._fichier.tell() >= self.taille_segment:
+            self._rotation()
+
+    def _rotation(self):
+        # Le segment suivant est ouvert avant la compression : un échec de celle-ci
+        # laisse simplement le segment clos non compressé (toujours lisible)
+        self._liberer()
+        chemin = self._chemin(self._numero)
+        self._numero += 1
+        self._ouvrir()
+        try:
+            with open(chemin, 'rb') as source, gzip.open(chemin + '.gz.tmp', 'wb') as destination:
+                shutil.copyfileobj(source, destination)
+            os.replace(chemin + '.gz.tmp', chemin + '.gz')
+            os.remove(chemin)
+        except OSError as e:
+            print(f"❌ Journal: compression de {os.path.basename(chemin)} impossible ({e})")
+
+
+def segments(dossier: str) -> Dict[int, List[str]]:
+    """Segments du journal de chaque processus (pid), dans l'ordre chronologique"""
+    par_pid: Dict[int, List] = {}
+    for nom in os.listdir(dossier):
+        m = MOTIF_SEGMENT.match(nom)
+        if m:
+            par_pid.setdefault(int(m.group(1)), []).append((int(m.group(2)), bool(m.group(3)), nom))
+    resultat = {}
+    for pid, trouves in par_pid.items():
+        # Un segment clos peut exister sous les deux formes le temps de sa compression
+        compresses = {numero for numero, compresse, _ in trouves if compresse}
+        resultat[pid] = [os.path.join(dossier, nom) for numero, compresse, nom in sorted(trouves)
+                         if compresse or numero not in compresses]
+    return resultat
+
+
+def _lire_segments(chemins: List[str]) -> Iterator[Dict]:
+    for chemin in chemins:
+        ouvrir = gzip.open if chemin.endswith('.gz') else open
+        try:
+            fichier = ouvrir(chemin, 'rt', encoding='utf-8')
+        except FileNotFoundError:
+            # Compressé puis supprimé entre le listage et la lecture
+            if chemin.endswith('.gz') or not os.path.exists(chemin + '.gz'):
+                continue
+            fichier = gzip.open(chemin + '.gz', 'rt', encoding='utf-8')
+        with fichier:
+            for ligne in fichier:
+                try:
+                    yield json.loads(ligne)
+                except ValueError:
+                    # Dernière ligne tronquée (arrêt brutal pendant une écriture)
+                    continue
+
+
+def lire(dossier: str, types: Optional[List[str]] = None, depuis: Optional[float] = None,
+         jusqu_a: Optional[float] = None, user_id: Optional[str] = None) -> Iterator[Dict]:
+    """Événements de tous les processus, fusionnés par horodatage et filtrés par type, période et utilisateur"""
+    def filtrer(evenements: Iterator[Dict]) -> Iterator[Dict]:
+        for evenement in evenements:
+            if types and evenement.get('type') not in types:
+                continue
+            if depuis is not None and evenement['ts'] < depuis:
+                continue
+            if jusqu_a is not None and evenement['ts'] >= jusqu_a:
+                continue
+            if user_id and evenement.get('user_id') != user_id:
+                continue
+            yield evenement
+
+    flux = [filtrer(_lire_segments(chemins)) for _, chemins in sorted(segments(dossier).items())]
+    return heapq.merge(*flux, key=lambda evenement: evenement['ts'])
+
+
+def _horodatage(texte: Optional[str]) -> Optional[float]:
+    if not texte:
+        return None
+    return datetime.datetime.fromisoformat(texte).timestamp()
+
+
+def _exporter(evenements: Iterator[Dict], format_sortie: str, sortie):
+    if format_sortie == 'jsonl':
+        for evenement in evenements:
+            sortie.write(json.dumps(evenement, ensure_ascii=False) + '\n')
+        return
+    # CSV : colonnes communes puis données propres à chaque type, en JSON
+    ecrivain = csv.writer(sortie)
+    ecrivain.writerow(['date', 'type', 'user_id', 'email', 'donnees'])
+    for evenement in evenements:
+        donnees = {cle: valeur for cle, valeur in evenement.items()
+                   if cle not in ('ts', 'type', 'user_id', 'email')}
+        ecrivain.writerow([
+            datetime.datetime.fromtimestamp(evenement['ts']).isoformat(timespec='seconds'),
+            evenement['type'], evenement.get('user_id', ''), evenement.get('email', ''),
+            json.dumps(donnees, ensure_ascii=False) if donnees else ''
+        ])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Consulte et exporte le journal d'activité")
+    parser.add_argument('--dossier', default=os.environ.get('ERP_JOURNAL', 'journal'), help="Dossier du journal")
+    commandes = parser.add_subparsers(dest='commande', required=True)
+
+    requete = commandes.add_parser('requete', help="Exporte les événements filtrés")
+    requete.add_argument('--type', action='append', dest='types', help="Type d'événement (répétable)")
+    requete.add_argument('--depuis', help="Date ISO de début (incluse)")
+    requete.add_argument('--jusqu-a', help="Date ISO de fin (exclue)")
+    requete.add_argument('--user', help="Identifiant d'utilisateur")
+    requete.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    requete.add_argument('--sortie', help="Fichier de sortie (sortie standard par défaut)")
+
+    resume = commandes.add_parser('resume', help="Nombre d'événements par jour et par type")
+    resume.add_argument('--depuis', help="Date ISO de début (incluse)")
+
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.dossier):
+        parser.error(f"Dossier de journal introuvable: {args.dossier}")
+
+    if args.commande == 'requete':
+        evenements = lire(args.dossier, args.types, _horodatage(args.depuis),
+                          _horodatage(args.jusqu_a), args.user)
+        if args.sortie:
+            with open(args.sortie, 'w', encoding='utf-8', newline='') as sortie:
+                _exporter(evenements, args.format, sortie)
+        else:
+            _exporter(evenements, args.format, sys.stdout)
+        return
+
+    compteurs: Dict[str, Dict[str, int]] = {}
+    for evenement in lire(args.dossier, depuis=_horodatage(args.depuis)):
+        jour = datetime.date.fromtimestamp(evenement['ts']).isoformat()
+        par_type = compteurs.setdefault(jour, {})
+        par_type[evenement['type']] = par_type.get(evenement['type'], 0) + 1
+    for jour, par_type in sorted(compteurs.items()):
+        details = ', '.join(f'{type_evenement}: {nombre}' for type_evenement, nombre in sorted(par_type.items()))
+        print(f"{jour}  {sum(par_type.values()):>6}  {details}")
+
+
+if __name__ == '__main__':
+    main()
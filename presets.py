@@ -0,0 +1,190 @@
+"""
+Préréglages de paramètres selon le secteur et la taille de l'entreprise.
+
+Les profils sectoriels reprennent les valeurs de référence proposées dans le
+formulaire (entreprise d'environ 100 employés et 10 M MAD de chiffre
+d'affaires). Ils sont exprimés en ratios du secteur Services, de sorte qu'une
+nouvelle version du modèle de coûts se répercute sur tous les secteurs.
+Les volumes liés à l'effectif et au chiffre d'affaires sont ensuite mis à
+l'échelle de l'entreprise réelle.
+"""
+import math
+import threading
+from collections import OrderedDict
+from typing import Dict, Mapping, Optional, Tuple
+
+from config_modele import ModeleCouts
+
+# Valeurs de référence par secteur (entreprise de référence)
+PARAMETRES_SECTEURS = {
+    'Industrie': {
+        'delai_prevue_mois': 10, 'delai_reel_mois': 15, 'cout_jour_homme': 1000,
+        'heures_correction': 300, 'heures_configuration': 150, 'taux_horaire_developpeur': 200,
+        'taux_baisse_productivite': 20, 'salaire_moyen_mensuel': 9000, 'duree_adaptation_mois': 4,
+        'nombre_departs': 8, 'heures_support': 400, 'taux_horaire_support': 120,
+        'heures_retravail': 400, 'heures_integration': 500, 'cout_maintenance_annuel': 150000,
+        'taux_maintenance_imprevu': 25, 'heures_adaptation': 250, 'taux_horaire_expert': 300
+    },
+    'Services': {
+        'delai_prevue_mois': 8, 'delai_reel_mois': 12, 'cout_jour_homme': 800,
+        'heures_correction': 200, 'heures_configuration': 100, 'taux_horaire_developpeur': 200,
+        'taux_baisse_productivite': 15, 'salaire_moyen_mensuel': 8000, 'duree_adaptation_mois': 3,
+        'nombre_departs': 5, 'heures_support': 300, 'taux_horaire_support': 100,
+        'heures_retravail': 300, 'heures_integration': 400, 'cout_maintenance_annuel': 100000,
+        'taux_maintenance_imprevu': 20, 'heures_adaptation': 200, 'taux_horaire_expert': 250
+    },
+    'Distribution': {
+        'delai_prevue_mois': 9, 'delai_reel_mois': 14, 'cout_jour_homme': 900,
+        'heures_correction': 250, 'heures_configuration': 120, 'taux_horaire_developpeur': 200,
+        'taux_baisse_productivite': 18, 'salaire_moyen_mensuel': 7500, 'duree_adaptation_mois': 3,
+        'nombre_departs': 6, 'heures_support': 350, 'taux_horaire_support': 110,
+        'heures_retravail': 350, 'heures_integration': 450, 'cout_maintenance_annuel': 120000,
+        'taux_maintenance_imprevu': 22, 'heures_adaptation': 220, 'taux_horaire_expert': 280
+    },
+    'Textile': {
+        'delai_prevue_mois': 11, 'delai_reel_mois': 16, 'cout_jour_homme': 950,
+        'heures_correction': 350, 'heures_configuration': 180, 'taux_horaire_developpeur': 220,
+        'taux_baisse_productivite': 22, 'salaire_moyen_mensuel': 6500, 'duree_adaptation_mois': 5,
+        'nombre_departs': 10, 'heures_support': 450, 'taux_horaire_support': 130,
+        'heures_retravail': 450, 'heures_integration': 550, 'cout_maintenance_annuel': 180000,
+        'taux_maintenance_imprevu': 28, 'heures_adaptation': 280, 'taux_horaire_expert': 320
+    }
+}
+SECTEUR_REFERENCE = 'Services'
+
+# Entreprise de référence des profils sectoriels
+EMPLOYES_REFERENCE = 100
+CHIFFRE_AFFAIRES_REFERENCE = 10000000
+
+# Effectif retenu lorsque nombre_employes n'est pas renseigné
+EFFECTIF_PAR_TAILLE = {'PME': 25, 'Petite': 25, 'Moyenne': 100, 'Grande': 300}
+
+# Les durées de projet s'allongent avec la taille de l'organisation
+MULTIPLICATEUR_DELAIS_TAILLE = {'PME': 0.75, 'Petite': 0.75, 'Moyenne': 1.0, 'Grande': 1.25}
+
+# Volumes proportionnels à l'effectif
+PARAMETRES_PAR_EMPLOYE = ('nombre_personnes_formation', 'nombre_departs')
+# Volumes qui croissent moins vite que l'effectif (racine carrée du ratio)
+PARAMETRES_SOUS_LINEAIRES = ('heures_support', 'heures_inefficacite', 'heures_retravail')
+PARAMETRES_DELAIS = ('delai_prevue_mois', 'delai_reel_mois')
+
+RATIOS_SECTEURS = {
+    secteur: {
+        cle: valeur / PARAMETRES_SECTEURS[SECTEUR_REFERENCE][cle]
+        for cle, valeur in valeurs.items()
+        if valeur != PARAMETRES_SECTEURS[SECTEUR_REFERENCE][cle]
+    }
+    for secteur, valeurs in PARAMETRES_SECTEURS.items()
+}
+
+
+def _arrondir(valeur: float) -> int:
+    # Valeurs entières, comme les champs du formulaire
+    return int(round(valeur))
+
+
+def cle_preset(modele: ModeleCouts, secteur: str, taille: str) -> Tuple[str, str]:
+    """Identifiant du préréglage (secteurs et tailles inconnus ramenés à la référence)"""
+    return (
+        secteur if secteur in RATIOS_SECTEURS or secteur in modele.secteurs else SECTEUR_REFERENCE,
+        taille if taille in MULTIPLICATEUR_DELAIS_TAILLE else 'Moyenne'
+    )
+
+
+class Presets:
+    """Dérive les valeurs par défaut d'une entreprise et met en cache les calculs de référence"""
+
+    def __init__(self, taille_cache: int = 1024):
+        self.taille_cache = taille_cache
+        # Caches lus et modifiés par les threads des requêtes : toujours sous self._verrou
+        self._verrou = threading.Lock()
+        self._bases = {}
+        self._references = OrderedDict()
+        self._version = None
+        # Tables partagées entre workers (TablesPartagees), si le mode est activé
+        self.tables = None
+
+    def _verifier_version(self, modele: ModeleCouts):
+        # Appelé sous self._verrou : tout changement de modèle invalide les préréglages compilés
+        if modele.version != self._version:
+            self._bases = {}
+            self._references = OrderedDict()
+            self._version = modele.version
+
+    def _memoriser_base(self, modele: ModeleCouts, cle: Tuple[str, str], base: Dict):
+        with self._verrou:
+            # Pas de préréglage d'une ancienne version dans le cache d'une nouvelle
+            if self._version == modele.version:
+                self._bases[cle] = base
+
+    def base(self, modele: ModeleCouts, secteur: str, taille: str) -> Mapping:
+        """Valeurs par défaut du préréglage secteur/taille pour l'entreprise de référence"""
+        cle = cle_preset(modele, secteur, taille)
+        # Mode partagé : la ligne est lue dans le fichier projeté, sans copie dans ce processus
+        if self.tables is not None and self.tables.meta.get('version_modele') == modele.version:
+            base = self.tables.ligne('presets', f'{cle[0]}|{cle[1]}')
+            if base is not None:
+                return base
+        with self._verrou:
+            self._verifier_version(modele)
+            base = self._bases.get(cle)
+        if base is None:
+            secteur_preset, taille_preset = cle
+            defauts = modele.defauts
+            base = dict(defauts)
+            for parametre, ratio in RATIOS_SECTEURS.get(secteur_preset, {}).items():
+                base[parametre] = _arrondir(defauts[parametre] * ratio)
+            # Les surcharges du fichier de configuration (entreprise de référence du secteur)
+            # remplacent les ratios, puis les délais suivent la taille comme les autres secteurs
+            base.update(modele.secteurs.get(secteur_preset, {}))
+            for parametre in PARAMETRES_DELAIS:
+                base[parametre] = _arrondir(base[parametre] * MULTIPLICATEUR_DELAIS_TAILLE[taille_preset])
+            self._memoriser_base(modele, cle, base)
+        return base
+
+    def defauts_pour(self, modele: ModeleCouts, entreprise) -> Dict:
+        """Valeurs par défaut adaptées au secteur, à la taille, à l'effectif et au chiffre d'affaires"""
+        defauts = dict(self.base(modele, entreprise.secteur, entreprise.taille))
+
+        nombre_employes = entreprise.nombre_employes
+        if nombre_employes is None:
+            nombre_employes = EFFECTIF_PAR_TAILLE.get(entreprise.taille, EMPLOYES_REFERENCE)
+        ratio_effectif = nombre_employes / EMPLOYES_REFERENCE
+        defauts['nombre_employes'] = nombre_employes
+        # Au moins une personne dès qu'il y a des employés; aucune pour un effectif nul
+        plancher = 1 if nombre_employes > 0 else 0
+        for parametre in PARAMETRES_PAR_EMPLOYE:
+            defauts[parametre] = max(plancher, round(defauts[parametre] * ratio_effectif))
+        facteur = math.sqrt(ratio_effectif)
+        for parametre in PARAMETRES_SOUS_LINEAIRES:
+            defauts[parametre] = round(defauts[parametre] * facteur)
+
+        if entreprise.chiffre_affaires and entreprise.chiffre_affaires > 0:
+            ratio_ca = entreprise.chiffre_affaires / CHIFFRE_AFFAIRES_REFERENCE
+            defauts['cout_maintenance_annuel'] = round(defauts['cout_maintenance_annuel'] * math.sqrt(ratio_ca))
+
+        return defauts
+
+    def reference(self, modele: ModeleCouts, entreprise, details: bool) -> Optional[Dict]:
+        """Résultat de référence en cache pour cette entreprise, s'il existe"""
+        cle = self._cle_reference(entreprise, details)
+        with self._verrou:
+            self._verifier_version(modele)
+            resultat = self._references.get(cle)
+            if resultat is not None:
+                self._references.move_to_end(cle)
+            return resultat
+
+    def memoriser_reference(self, modele: ModeleCouts, entreprise, details: bool, resultat: Dict):
+        cle = self._cle_reference(entreprise, details)
+        with self._verrou:
+            if self._version != modele.version:
+                return
+            self._references[cle] = resultat
+            while len(self._references) > self.taille_cache:
+                self._references.popitem(last=False)
+
+    @staticmethod
+    def _cle_reference(entreprise, details: bool) -> Tuple:
+        return (entreprise.secteur, entreprise.taille, entreprise.nombre_employes,
+                entreprise.chiffre_affaires, details)
@@ -0,0 +1,89 @@
+"""
+Fichiers JSON rechargés à chaud.
+
+Une SourceRechargeable garde en mémoire un instantané immuable construit depuis
+un fichier JSON. Les lecteurs appellent instantane() : au plus une fois par
+intervalle, un seul thread compare la signature du fichier (inode, date,
+taille) et le relit s'il a changé, sans jamais bloquer les autres. Un fichier
+absent, en cours d'écriture ou invalide est ignoré : le dernier instantané
+valide reste servi.
+"""
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+
+class SourceRechargeable(ABC):
+    """Instantané construit depuis un fichier JSON et republié quand le fichier change"""
+    # Désignation du fichier dans les messages ("Configuration du modèle", ...)
+    libelle = 'Fichier'
+
+    def __init__(self, chemin: Optional[str], intervalle_verification: float, initial):
+        self.chemin = chemin
+        self.intervalle_verification = intervalle_verification
+        self._courant = initial
+        self._signature = None
+        self._prochaine_verification = 0.0
+        # Ne protège que le rechargement : la lecture de l'instantané courant n'est jamais bloquée
+        self._verrou_rechargement = threading.Lock()
+        self.recharger()
+
+    @abstractmethod
+    def construire(self, donnees: Dict):
+        """Instantané validé depuis le contenu JSON du fichier (ValueError si invalide)"""
+
+    def accepter(self, nouveau, force: bool) -> bool:
+        """Décide si un instantané relu remplace le courant"""
+        return True
+
+    def annoncer(self, nouveau):
+        """Message affiché après publication d'un nouvel instantané"""
+
+    def instantane(self):
+        """Retourne l'instantané courant en vérifiant périodiquement le fichier"""
+        if self.chemin and time.monotonic() >= self._prochaine_verification:
+            if self._verrou_rechargement.acquire(blocking=False):
+                try:
+                    self._recharger_si_modifie()
+                finally:
+                    self._verrou_rechargement.release()
+        return self._courant
+
+    def recharger(self, force: bool = False) -> bool:
+        """Relit le fichier; retourne True si un nouvel instantané a été publié"""
+        with self._verrou_rechargement:
+            return self._recharger_si_modifie(force)
+
+    def _recharger_si_modifie(self, force: bool = False) -> bool:
+        self._prochaine_verification = time.monotonic() + self.intervalle_verification
+
+        try:
+            stat = os.stat(self.chemin) if self.chemin else None
+        except FileNotFoundError:
+            stat = None
+        if stat is None:
+            return False
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if signature == self._signature and not force:
+            return False
+
+        try:
+            with open(self.chemin, 'r', encoding='utf-8') as fichier:
+                nouveau = self.construire(json.load(fichier))
+        except (OSError, ValueError) as e:
+            # Fichier en cours d'écriture ou invalide : on garde l'instantané actuel
+            print(f"❌ {self.libelle} ignorée ({self.chemin}): {e}")
+            return False
+
+        self._signature = signature
+        if not self.accepter(nouveau, force):
+            return False
+
+        # Publication atomique du nouvel instantané
+        self._courant = nouveau
+        self.annoncer(nouveau)
+        return True
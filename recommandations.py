@@ -0,0 +1,230 @@
+"""
+Moteur de règles pour les recommandations personnalisées.
+
+Chaque règle compare une métrique d'un résultat de calcul à un seuil et peut
+être restreinte à certains secteurs ou tailles d'entreprise. Métriques
+disponibles :
+
+    total_general, pourcentage_ca
+    total.<categorie>          total d'une catégorie (erreurs, resistance, imprevus)
+    part.<categorie>           part de la catégorie dans le total général (%)
+    principale.<categorie>     1 si la catégorie est la plus coûteuse, 0 sinon
+    ligne.<cle>                valeur d'une ligne de coût (turnover, ...)
+    part_ligne.<cle>           part de la ligne dans le total général (%)
+
+Les règles sont compilées en un index par métrique et par compartiment
+(secteur, taille), trié par seuil : une évaluation ne consulte que les
+compartiments de l'entreprise et ne parcourt que les règles déclenchées
+(recherche dichotomique), quel que soit le nombre de règles déclarées.
+"""
+from bisect import bisect_right
+from collections import Counter
+from itertools import product
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from config_modele import CATEGORIES
+
+OPERATEURS = ('>=', '<')
+
+# Priorité 1 : catégorie principale, 2 : constats ciblés, 3 : bonnes pratiques générales
+REGLES_RECOMMANDATIONS = [
+    # Catégorie principale
+    {'id': 'erreurs-planification', 'metrique': 'principale.erreurs', 'seuil': 1, 'priorite': 1,
+     'message': "🔧 Renforcer la planification initiale avec une marge de 20%"},
+    {'id': 'erreurs-faisabilite', 'metrique': 'principale.erreurs', 'seuil': 1, 'priorite': 1,
+     'message': "📊 Réaliser une étude de faisabilité approfondie"},
+    {'id': 'erreurs-calendrier', 'metrique': 'principale.erreurs', 'seuil': 1, 'priorite': 1,
+     'message': "⏱️ Établir un calendrier réaliste avec jalons intermédiaires"},
+    {'id': 'erreurs-consultant', 'metrique': 'principale.erreurs', 'seuil': 1, 'priorite': 1,
+     'message': "👥 Impliquer un consultant ERP expérimenté"},
+    {'id': 'resistance-communication', 'metrique': 'principale.resistance', 'seuil': 1, 'priorite': 1,
+     'message': "💬 Mettre en place un programme de communication proactive"},
+    {'id': 'resistance-formation', 'metrique': 'principale.resistance', 'seuil': 1, 'priorite': 1,
+     'message': "🎓 Développer un plan de formation adapté aux différents profils"},
+    {'id': 'resistance-utilisateurs-cles', 'metrique': 'principale.resistance', 'seuil': 1, 'priorite': 1,
+     'message': "🤝 Impliquer les utilisateurs clés dès le début du projet"},
+    {'id': 'resistance-recompense', 'metrique': 'principale.resistance', 'seuil': 1, 'priorite': 1,
+     'message': "🏆 Créer un système de récompense pour l'adoption du nouveau système"},
+    {'id': 'imprevus-reserve', 'metrique': 'principale.imprevus', 'seuil': 1, 'priorite': 1,
+     'message': "🛡️ Prévoir une réserve de 15-25% pour les imprévus"},
+    {'id': 'imprevus-risques', 'metrique': 'principale.imprevus', 'seuil': 1, 'priorite': 1,
+     'message': "🔍 Identifier et prioriser les risques en amont"},
+    {'id': 'imprevus-comite', 'metrique': 'principale.imprevus', 'seuil': 1, 'priorite': 1,
+     'message': "📋 Mettre en place un comité de suivi des risques"},
+    {'id': 'imprevus-agile', 'metrique': 'principale.imprevus', 'seuil': 1, 'priorite': 1,
+     'message': "🔄 Adopter une approche agile avec itérations courtes"},
+
+    # Ratios et lignes de coût
+    {'id': 'ca-critique', 'metrique': 'pourcentage_ca', 'seuil': 10, 'priorite': 2,
+     'message': "⚠️ Les coûts cachés dépassent 10% du CA : revoir le périmètre ou phaser le déploiement"},
+    {'id': 'ca-provision', 'metrique': 'pourcentage_ca', 'seuil': 5, 'priorite': 2,
+     'message': "💰 Provisionner les coûts cachés dans le budget du projet"},
+    {'id': 'ligne-turnover', 'metrique': 'part_ligne.turnover', 'seuil': 10, 'priorite': 2,
+     'message': "🧲 Prévoir un plan de rétention des collaborateurs clés pendant le projet"},
+    {'id': 'ligne-productivite', 'metrique': 'part_ligne.baisse_productivite', 'seuil': 25, 'priorite': 2,
+     'message': "📉 Planifier le démarrage sur une période de faible activité"},
+    {'id': 'ligne-formation', 'metrique': 'part_ligne.formation_inadequate', 'seuil': 10, 'priorite': 2,
+     'message': "🧑‍🏫 Former des utilisateurs relais chargés d'accompagner leurs équipes"},
+    {'id': 'ligne-compatibilite', 'metrique': 'part_ligne.problemes_compatibilite', 'seuil': 15, 'priorite': 2,
+     'message': "🔌 Auditer les interfaces avec les systèmes existants avant l'intégration"},
+    {'id': 'ligne-configuration', 'metrique': 'part_ligne.configuration_personnalisee', 'seuil': 10, 'priorite': 2,
+     'message': "🧩 Limiter les développements spécifiques au profit du standard de l'ERP"},
+    {'id': 'ligne-reglementaire', 'metrique': 'part_ligne.evolutions_reglementaires', 'seuil': 10, 'priorite': 2,
+     'message': "⚖️ Organiser une veille réglementaire (fiscalité, CNSS) avec l'éditeur"},
+
+    # Secteur et taille
+    {'id': 'secteur-industrie', 'metrique': 'total_general', 'seuil': 0, 'priorite': 2, 'secteurs': ['Industrie'],
+     'message': "🏭 Tester tôt l'intégration avec les outils de production (GPAO, MES)"},
+    {'id': 'secteur-distribution', 'metrique': 'total_general', 'seuil': 0, 'priorite': 2, 'secteurs': ['Distribution'],
+     'message': "🚚 Sécuriser les flux logistiques et de stock pendant la bascule"},
+    {'id': 'secteur-textile', 'metrique': 'total_general', 'seuil': 0, 'priorite': 2, 'secteurs': ['Textile'],
+     'message': "🧵 Modéliser les variantes articles (tailles, coloris) dès le paramétrage"},
+    {'id': 'taille-pme', 'metrique': 'total_general', 'seuil': 0, 'priorite': 2, 'tailles': ['PME', 'Petite'],
+     'message': "☁️ Privilégier un ERP standard en mode SaaS pour limiter l'effort interne"},
+    {'id': 'taille-grande', 'metrique': 'total_general', 'seuil': 0, 'priorite': 2, 'tailles': ['Grande'],
+     'message': "🏢 Déployer par vagues successives (sites, filiales) après un pilote"},
+
+    # Recommandations générales
+    {'id': 'general-equipe', 'metrique': 'total_general', 'seuil': 0, 'priorite': 3,
+     'message': "✅ Former une équipe projet dédiée et compétente"},
+    {'id': 'general-choix-erp', 'metrique': 'total_general', 'seuil': 0, 'priorite': 3,
+     'message': "🎯 Choisir un ERP adapté à la taille et au secteur"},
+    {'id': 'general-contrat', 'metrique': 'total_general', 'seuil': 0, 'priorite': 3,
+     'message': "📝 Négocier un contrat de support et maintenance clair"},
+    {'id': 'general-mesure', 'metrique': 'total_general', 'seuil': 0, 'priorite': 3,
+     'message': "📈 Mesurer régulièrement l'avancement et les écarts"},
+    {'id': 'general-revues', 'metrique': 'total_general', 'seuil': 0, 'priorite': 3,
+     'message': "🔄 Prévoir des revues de projet trimestrielles"},
+]
+
+
+class Regle:
+    """Règle compilée"""
+    __slots__ = ('id', 'metrique', 'operateur', 'seuil', 'priorite', 'ordre', 'message', 'secteurs', 'tailles')
+
+    def __init__(self, definition: Dict, ordre: int):
+        operateur = definition.get('operateur', '>=')
+        if operateur not in OPERATEURS:
+            raise ValueError(f"Opérateur inconnu pour la règle {definition.get('id')}: {operateur}")
+        self.id = definition['id']
+        self.metrique = definition['metrique']
+        self.operateur = operateur
+        self.seuil = float(definition['seuil'])
+        self.priorite = definition.get('priorite', 2)
+        self.ordre = ordre
+        self.message = definition['message']
+        self.secteurs = frozenset(definition['secteurs']) if definition.get('secteurs') else None
+        self.tailles = frozenset(definition['tailles']) if definition.get('tailles') else None
+
+    def compartiments(self) -> Iterable[Tuple[Optional[str], Optional[str]]]:
+        """Compartiments (secteur, taille) de l'index; None : tous les secteurs ou toutes les tailles"""
+        return product(sorted(self.secteurs) if self.secteurs else [None],
+                       sorted(self.tailles) if self.tailles else [None])
+
+
+class _IndexMetrique:
+    """Règles d'une métrique triées par seuil, par opérateur"""
+    __slots__ = ('seuils_min', 'regles_min', 'seuils_max', 'regles_max')
+
+    def __init__(self, regles: List[Regle]):
+        superieures = sorted((r for r in regles if r.operateur == '>='), key=lambda r: r.seuil)
+        inferieures = sorted((r for r in regles if r.operateur == '<'), key=lambda r: r.seuil)
+        self.seuils_min = [r.seuil for r in superieures]
+        self.regles_min = superieures
+        self.seuils_max = [r.seuil for r in inferieures]
+        self.regles_max = inferieures
+
+    def declenchees(self, valeur: float) -> List[Regle]:
+        # valeur >= seuil : préfixe de la liste triée; valeur < seuil : suffixe
+        return (self.regles_min[:bisect_right(self.seuils_min, valeur)] +
+                self.regles_max[bisect_right(self.seuils_max, valeur):])
+
+
+def extraire_metriques(resultats: Dict) -> Dict[str, float]:
+    """Calcule les métriques d'un résultat de calcul"""
+    total_general = resultats.get('total_general', 0) or 0
+    metriques = {
+        'total_general': total_general,
+        'pourcentage_ca': resultats.get('pourcentage_ca', 0) or 0
+    }
+
+    totaux = []
+    for categorie, cle_resultat, cle_total, _ in CATEGORIES:
+        couts = resultats.get(cle_resultat, {}) or {}
+        total = couts.get(cle_total, 0) or 0
+        totaux.append((categorie, total))
+        metriques[f'total.{categorie}'] = total
+        metriques[f'part.{categorie}'] = total / total_general * 100 if total_general else 0
+        for cle, ligne in couts.items():
+            if isinstance(ligne, dict) and 'valeur' in ligne:
+                valeur = ligne['valeur'] or 0
+                metriques[f'ligne.{cle}'] = valeur
+                metriques[f'part_ligne.{cle}'] = valeur / total_general * 100 if total_general else 0
+
+    # Première catégorie la plus coûteuse (ordre de déclaration en cas d'égalité)
+    principale = max(totaux, key=lambda item: item[1])[0]
+    for categorie, _ in totaux:
+        metriques[f'principale.{categorie}'] = 1 if categorie == principale else 0
+    return metriques
+
+
+def libelle_categorie(metriques: Dict[str, float]) -> str:
+    for categorie, _, _, libelle in CATEGORIES:
+        if metriques.get(f'principale.{categorie}'):
+            return libelle
+    return 'Général'
+
+
+class MoteurRecommandations:
+    """Évalue un ensemble de règles compilées sur un ou plusieurs résultats"""
+
+    def __init__(self, regles: Iterable[Dict] = REGLES_RECOMMANDATIONS):
+        compilees = [Regle(definition, ordre) for ordre, definition in enumerate(regles)]
+        par_metrique = {}
+        for regle in compilees:
+            for compartiment in regle.compartiments():
+                par_metrique.setdefault(regle.metrique, {}).setdefault(compartiment, []).append(regle)
+        self.regles = compilees
+        # {métrique: {(secteur, taille): index}} : une règle restreinte n'est jamais filtrée à l'évaluation
+        self.index = {
+            metrique: {compartiment: _IndexMetrique(liste) for compartiment, liste in compartiments.items()}
+            for metrique, compartiments in par_metrique.items()
+        }
+
+    def _declenchees(self, metriques: Dict[str, float], secteur: Optional[str], taille: Optional[str]) -> List[Regle]:
+        # Une règle figure dans un seul des compartiments applicables : pas de doublon
+        applicables = dict.fromkeys(((None, None), (secteur, None), (None, taille), (secteur, taille)))
+        declenchees = []
+        for metrique, compartiments in self.index.items():
+            valeur = metriques.get(metrique)
+            if valeur is None:
+                continue
+            for compartiment in applicables:
+                index = compartiments.get(compartiment)
+                if index is not None:
+                    declenchees.extend(index.declenchees(valeur))
+        declenchees.sort(key=lambda r: (r.priorite, r.ordre))
+        return declenchees
+
+    def evaluer(self, resultats: Dict) -> Dict:
+        """Recommandations pour un résultat de calcul"""
+        entreprise = resultats.get('entreprise', {}) or {}
+        metriques = extraire_metriques(resultats)
+        regles = self._declenchees(metriques, entreprise.get('secteur'), entreprise.get('taille'))
+        return {
+            'recommandations': [r.message for r in regles],
+            'regles': [r.id for r in regles],
+            'categorie_principale': libelle_categorie(metriques)
+        }
+
+    def evaluer_lot(self, liste_resultats: Iterable[Dict]) -> Tuple[List[Dict], Dict]:
+        """Recommandations pour un portefeuille de résultats et synthèse des règles déclenchées"""
+        evaluations = [self.evaluer(resultats) for resultats in liste_resultats]
+        frequences = Counter(regle for evaluation in evaluations for regle in evaluation['regles'])
+        categories = Counter(evaluation['categorie_principale'] for evaluation in evaluations)
+        synthese = {
+            'nombre_resultats': len(evaluations),
+            'regles': {regle.id: frequences.get(regle.id, 0) for regle in self.regles},
+            'categories_principales': dict(categories)
+        }
+        return evaluations, synthese
@@ -0,0 +1,126 @@
+"""
+Magasin de scénarios adressés par leur contenu.
+
+Un scénario est identifié par l'empreinte SHA-256 de ses entrées normalisées
+(entreprise, paramètres, version du modèle, rendu des détails) : deux demandes
+identiques partagent le même résultat stocké. Le magasin est un cache propre
+au processus : l'historique garde, à côté de l'identifiant, le résumé du
+scénario (entreprise, total, version du modèle) pour rester complet après un
+redémarrage, une éviction ou sur un autre worker.
+
+Les clés d'idempotence (en-tête Idempotency-Key) associent une demande d'un
+utilisateur à un scénario. Elles sont gardées dans la session de l'utilisateur,
+donc partagées entre workers par le stockage de session : une nouvelle
+tentative est rejouée sans nouvelle entrée d'historique. Le conflit est jugé
+sur l'empreinte de la demande, sans la version du modèle : une nouvelle
+tentative après un rechargement du modèle n'est pas une autre demande.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+# Clés d'idempotence conservées par utilisateur
+DUREE_IDEMPOTENCE = 24 * 3600
+CAPACITE_IDEMPOTENCE = 100
+
+
+class ConflitIdempotence(ValueError):
+    """Clé d'idempotence déjà utilisée pour une demande différente"""
+
+
+def _normaliser(valeur):
+    """Représentation canonique : 1000.0 et 1000 donnent la même empreinte"""
+    if isinstance(valeur, float) and valeur.is_integer():
+        return int(valeur)
+    if isinstance(valeur, dict):
+        return {cle: _normaliser(v) for cle, v in valeur.items()}
+    if isinstance(valeur, str):
+        return valeur.strip()
+    return valeur
+
+
+def _sha256(contenu: Dict) -> str:
+    canonique = json.dumps(contenu, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonique.encode('utf-8')).hexdigest()
+
+
+def empreinte_demande(entreprise: Dict, parametres: Dict, details: bool) -> str:
+    """Empreinte des entrées fournies par l'utilisateur, indépendante de la version du modèle"""
+    return _sha256({
+        'entreprise': _normaliser(entreprise),
+        'parametres': _normaliser(parametres),
+        'details': bool(details)
+    })
+
+
+def empreinte(entreprise: Dict, parametres: Dict, version_modele: str, details: bool) -> str:
+    """Identifiant de scénario : SHA-256 du JSON canonique des entrées"""
+    return _sha256({
+        'entreprise': _normaliser(entreprise),
+        'parametres': _normaliser(parametres),
+        'version_modele': version_modele,
+        'details': bool(details)
+    })
+
+
+def scenario_idempotent(cles: Dict[str, List], cle: str, demande: str) -> Optional[str]:
+    """Scénario déjà associé à la clé dans la table de session, ou None si la clé est nouvelle (ou expirée)
+
+    Lève ConflitIdempotence si la clé a servi à une demande différente (empreinte_demande).
+    """
+    entree = cles.get(cle)
+    # Entrées d'un format antérieur ([scenario_id, expiration]) : clé considérée comme nouvelle
+    if entree is None or len(entree) != 3 or entree[2] <= time.time():
+        return None
+    if entree[0] != demande:
+        raise ConflitIdempotence("Clé d'idempotence déjà utilisée pour une autre demande")
+    return entree[1]
+
+
+def associer(cles: Dict[str, List], cle: str, demande: str, scenario_id: str) -> Dict[str, List]:
+    """Nouvelle table de session : clés expirées retirées, les plus anciennes au-delà de la capacité"""
+    maintenant = time.time()
+    table = {c: entree for c, entree in cles.items() if entree[-1] > maintenant and c != cle}
+    table[cle] = [demande, scenario_id, maintenant + DUREE_IDEMPOTENCE]
+    while len(table) > CAPACITE_IDEMPOTENCE:
+        del table[next(iter(table))]
+    return table
+
+
+class MagasinScenarios:
+    """Résultats par identifiant de scénario (LRU borné, propre au processus)"""
+
+    def __init__(self, capacite: int = 5000):
+        self.capacite = capacite
+        self._resultats: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._verrou = threading.Lock()
+        self.succes = 0
+        self.echecs = 0
+
+    def resultat(self, scenario_id: str) -> Optional[Dict]:
+        with self._verrou:
+            resultat = self._resultats.get(scenario_id)
+            if resultat is None:
+                self.echecs += 1
+                return None
+            self._resultats.move_to_end(scenario_id)
+            self.succes += 1
+            return resultat
+
+    def enregistrer(self, scenario_id: str, resultat: Dict):
+        with self._verrou:
+            self._resultats[scenario_id] = resultat
+            self._resultats.move_to_end(scenario_id)
+            while len(self._resultats) > self.capacite:
+                self._resultats.popitem(last=False)
+
+    def statistiques(self) -> Dict:
+        with self._verrou:
+            return {
+                'scenarios': len(self._resultats),
+                'succes': self.succes,
+                'echecs': self.echecs
+            }
@@ -9,7 +9,8 @@ const appState = {
     statistiques: null,
     user: null,
     isAuthenticated: false,
-    lastCalculation: null
+    lastCalculation: null,
+    calculEnCours: false
 };
 
 // Initialisation de l'application
@@ -701,8 +702,8 @@ async function chargerExemple(type) {
                 document.getElementById('chiffre_affaires').value = formatNumberInputValue(exemple.chiffre_affaires);
                 document.getElementById('nombre_employes').value = exemple.nombre_employes;
                 
-                // Adapter les paramètres au secteur
-                adaptParamsToSecteur();
+                // Adapter les paramètres au secteur et à la taille
+                await adaptParamsToSecteur();
                 
                 showSuccess(`Exemple ${exemple.secteur} chargé avec succès`);
             } else {
@@ -719,10 +720,28 @@ async function chargerExemple(type) {
     }
 }
 
-// Adaptation des paramètres selon le secteur
-function adaptParamsToSecteur() {
+// Adaptation des paramètres selon le secteur, la taille et l'effectif
+async function adaptParamsToSecteur() {
     const secteur = document.getElementById('secteur').value;
-    const params = getSecteurParams(secteur);
+    let params = getSecteurParams(secteur);
+    
+    // Préréglages calculés par le serveur (repli sur les valeurs locales en cas d'échec)
+    try {
+        const query = new URLSearchParams({
+            secteur: secteur,
+            taille: document.getElementById('taille').value,
+            chiffre_affaires: document.getElementById('chiffre_affaires').value.replace(/[^\d]/g, '') || '0',
+            // Effectif vide : non renseigné, le serveur retient celui de la taille
+            nombre_employes: document.getElementById('nombre_employes').value.replace(/[^\d]/g, '')
+        });
+        const response = await fetch(`/api/presets?${query}`);
+        const data = await response.json();
+        if (data.success && data.parametres) {
+            params = data.parametres;
+        }
+    } catch (error) {
+        console.error('Erreur chargement préréglages:', error);
+    }
     
     // Mettre à jour les paramètres par défaut
     for (const [key, value] of Object.entries(params)) {
@@ -911,20 +930,33 @@ async function calculerCouts() {
         return;
     }
     
+    // Double-clic : la demande en cours suffit
+    if (appState.calculEnCours) return;
+    appState.calculEnCours = true;
+    
     try {
         showLoading('Calcul des coûts en cours...');
         
         // Récupérer les données du formulaire
         const formData = getFormData();
         
-        // Appel à l'API
-        const response = await fetch('/api/couts/calculer', {
+        // Une clé par calcul : une nouvelle tentative est servie par le serveur sans recalcul
+        const requete = {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
+                'Idempotency-Key': genererCleIdempotence()
             },
             body: JSON.stringify(formData)
-        });
+        };
+        
+        // Appel à l'API (détails textuels inclus pour le rapport), relancé une fois en cas d'erreur réseau
+        let response;
+        try {
+            response = await fetch('/api/couts/calculer?details=true', requete);
+        } catch (erreurReseau) {
+            response = await fetch('/api/couts/calculer?details=true', requete);
+        }
         
         const data = await response.json();
         
@@ -942,10 +974,18 @@ async function calculerCouts() {
         console.error('❌ Erreur calcul:', error);
         showError('Erreur lors du calcul des coûts: ' + error.message);
     } finally {
+        appState.calculEnCours = false;
         hideLoading();
     }
 }
 
+function genererCleIdempotence() {
+    if (window.crypto && crypto.randomUUID) {
+        return crypto.randomUUID();
+    }
+    return Date.now().toString(36) + Math.random().toString(36).slice(2);
+}
+
 // Récupération des données du formulaire
 function getFormData() {
     // Récupérer les valeurs numériques en nettoyant les séparateurs
@@ -970,7 +1010,6 @@ function getFormData() {
         heures_correction: getNumericValue('heures_correction'),
         heures_configuration: getNumericValue('heures_configuration'),
         taux_horaire_developpeur: getNumericValue('taux_horaire_developpeur'),
-        taux_horaire_technicien: 150,
         
         // Résistance
         taux_baisse_productivite: getNumericValue('taux_baisse_productivite'),
@@ -979,10 +1018,6 @@ function getFormData() {
         nombre_departs: getNumericValue('nombre_departs'),
         heures_support: getNumericValue('heures_support'),
         taux_horaire_support: getNumericValue('taux_horaire_support'),
-        cout_embauche_par_personne: 10000,
-        cout_formation_nouvel_employe: 5000,
-        taux_horaire_moyen: 50,
-        heures_inefficacite: 500,
         
         // Imprévus
         heures_retravail: getNumericValue('heures_retravail'),
@@ -0,0 +1,97 @@
+"""
+Simulations de Monte-Carlo et balayages de paramètres.
+
+Ces traitements sont exécutés comme jobs (voir jobs.py) et publient leur
+progression au fil du calcul : quantiles partiels pour une simulation, points
+calculés pour un balayage.
+"""
+import random
+from typing import Callable, Dict, List, Sequence
+
+# Paramètres incertains perturbés à chaque tirage (le délai prévu et l'effectif sont connus)
+PARAMETRES_CERTAINS = ('delai_prevue_mois', 'nombre_employes', 'cout_maintenance_annuel')
+QUANTILES = (5, 50, 95)
+NOMBRE_PUBLICATIONS = 20
+
+
+def quantiles(valeurs_triees: Sequence[float], centiles: Sequence[int] = QUANTILES) -> Dict[str, float]:
+    """Quantiles par interpolation linéaire sur des valeurs déjà triées"""
+    n = len(valeurs_triees)
+    resultat = {}
+    for centile in centiles:
+        position = (n - 1) * centile / 100
+        bas = int(position)
+        haut = min(bas + 1, n - 1)
+        fraction = position - bas
+        resultat[f'p{centile}'] = valeurs_triees[bas] * (1 - fraction) + valeurs_triees[haut] * fraction
+    return resultat
+
+
+def _totaux(calculateur, valeurs: Dict) -> Dict[str, float]:
+    erreurs = sum(ligne.valeur for ligne in calculateur.lignes_couts_erreurs({}, valeurs).values())
+    resistance = sum(ligne.valeur for ligne in calculateur.lignes_couts_resistance({}, valeurs).values())
+    imprevus = sum(ligne.valeur for ligne in calculateur.lignes_couts_imprevus({}, valeurs).values())
+    return {
+        'total_erreurs': erreurs,
+        'total_resistance': resistance,
+        'total_imprevus': imprevus,
+        'total_general': erreurs + resistance + imprevus
+    }
+
+
+def simuler(calculateur, entreprise, parametres: Dict, iterations: int = 2000,
+            variabilite: float = 0.2, graine=None, *, publier: Callable) -> Dict:
+    """Distribution des coûts cachés quand les paramètres incertains varient autour de leur valeur"""
+    modele = calculateur.modele()
+    base = {**calculateur.presets.defauts_pour(modele, entreprise), **parametres}
+    incertains = [cle for cle in base if cle not in PARAMETRES_CERTAINS]
+    generateur = random.Random(graine)
+    # Distribution triangulaire asymétrique : les dépassements sont plus probables que les économies
+    bas, haut = max(0.0, 1 - variabilite), 1 + 2 * variabilite
+
+    tirages = {cle: [] for cle in ('total_erreurs', 'total_resistance', 'total_imprevus', 'total_general')}
+    pas = max(1, iterations // NOMBRE_PUBLICATIONS)
+
+    for iteration in range(1, iterations + 1):
+        valeurs = dict(base)
+        for cle in incertains:
+            valeurs[cle] = base[cle] * generateur.triangular(bas, haut, 1)
+        for cle, total in _totaux(calculateur, valeurs).items():
+            tirages[cle].append(total)
+
+        if iteration % pas == 0 and iteration < iterations:
+            publier('progression', fait=iteration, total=iterations,
+                    quantiles=quantiles(sorted(tirages['total_general'])))
+
+    chiffre_affaires = entreprise.chiffre_affaires
+    repartition = {cle: quantiles(sorted(valeurs)) for cle, valeurs in tirages.items()}
+    return {
+        'iterations': iterations,
+        'variabilite': variabilite,
+        'quantiles': repartition,
+        'moyenne': sum(tirages['total_general']) / iterations,
+        'pourcentage_ca': {centile: (valeur / chiffre_affaires * 100) if chiffre_affaires > 0 else 0
+                           for centile, valeur in repartition['total_general'].items()},
+        'version_modele': modele.version
+    }
+
+
+def balayer(calculateur, entreprise, parametres: Dict, parametre: str,
+            valeurs: List[float], *, publier: Callable) -> Dict:
+    """Coût total pour chaque valeur d'un paramètre, les autres restant fixés"""
+    points = []
+    for index, valeur in enumerate(valeurs, 1):
+        resultat = calculateur.calculer_couts_totaux(entreprise, {**parametres, parametre: valeur}, details=False)
+        point = {
+            'valeur': valeur,
+            'total_general': resultat['total_general'],
+            'pourcentage_ca': resultat['pourcentage_ca']
+        }
+        points.append(point)
+        if index < len(valeurs):
+            publier('progression', fait=index, total=len(valeurs), point=point)
+    return {
+        'parametre': parametre,
+        'points': points,
+        'version_modele': calculateur.modele().version
+    }
@@ -0,0 +1,404 @@
+"""
+Pages statiques pré-rendues et ressources empreintées.
+
+Étape de construction :
+
+    python statique.py --sortie build
+
+- rend une fois les pages sans contenu dynamique (accueil, produits, à propos,
+  contact, connexion, inscription, 404);
+- minifie prudemment scripts.js et style.css (commentaires et indentation
+  retirés, chaînes et gabarits laissés intacts);
+- nomme chaque ressource d'après l'empreinte de son contenu
+  (style.3f2a9c41d0.css) et réécrit les pages pour y faire référence;
+- précompresse pages et ressources (gzip) et écrit un manifeste.
+
+Chaque construction produit une nouvelle version, publiée d'un coup en
+remplaçant le pointeur courant.json (os.replace) :
+
+    build/courant.json                 {"version": "20261019T111405-k3j2"}
+    build/versions/20261019T111405-k3j2/manifest.json, pages/, assets/
+
+Les ressources de la version précédente sont recopiées dans la nouvelle (une
+page déjà chargée par un navigateur les trouve encore) et seules les
+CONSERVER_VERSIONS dernières versions sont gardées. Un serveur en cours
+d'exécution reste sur la version lue à son démarrage.
+
+Mode de service : quand ERP_STATIQUE désigne le dossier construit,
+create_app sert les pages depuis la mémoire et les ressources sous /assets/
+avec « Cache-Control: public, max-age=31536000, immutable » (leur nom change
+dès que leur contenu change).
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Dict, Optional
+
+from compression import encodages_acceptes
+
+RACINE = os.path.dirname(os.path.abspath(__file__))
+PREFIXE_ASSETS = '/assets'
+CACHE_IMMUABLE = 'public, max-age=31536000, immutable'
+# Les pages gardent leur URL : revalidées à chaque visite (ETag), jamais figées
+CACHE_PAGES = 'public, no-cache'
+
+# Endpoint -> gabarit (la page 404 est servie par le gestionnaire d'erreur)
+PAGES = {
+    'home': 'index.html',
+    'products_page': 'products.html',
+    'about_page': 'about.html',
+    'contact_page': 'contact.html',
+    'login_page': 'login.html',
+    'signup_page': 'signup.html',
+    '404': '404.html',
+}
+
+MOTIF_RESSOURCE = re.compile(r"""url_for\(\s*'static'\s*,\s*filename\s*=\s*'([^']+)'\s*\)""")
+TYPES_PRECOMPRESSES = ('.html', '.css', '.js', '.svg', '.json')
+POINTEUR = 'courant.json'
+CONSERVER_VERSIONS = 5
+
+
+class ErreurConstruction(ValueError):
+    """Dossier de sortie qui n'est pas un dossier de construction"""
+
+
+def _segments(source: str, javascript: bool):
+    """Découpe le source en ('code' | 'chaine' | 'commentaire', texte)
+
+    Chaînes '...', "..." (et `...` ainsi que les expressions régulières en
+    JavaScript) sont rendues telles quelles; seul le code est retouché.
+    """
+    i, n = 0, len(source)
+    debut = 0
+    precedent = ''
+    while i < n:
+        c = source[i]
+        suivant = source[i + 1] if i + 1 < n else ''
+        if c == '/' and suivant == '*':
+            fin = source.find('*/', i + 2)
+            fin = n if fin < 0 else fin + 2
+            yield 'code', source[debut:i]
+            yield 'commentaire', source[i:fin]
+            i = debut = fin
+            continue
+        if javascript and c == '/' and suivant == '/':
+            fin = source.find('\n', i)
+            fin = n if fin < 0 else fin
+            yield 'code', source[debut:i]
+            yield 'commentaire', source[i:fin]
+            i = debut = fin
+            continue
+        delimiteurs = '\'"`' if javascript else '\'"'
+        regex = javascript and c == '/' and (precedent == '' or precedent in '(,=:[!&|?{};+-*%<>~^')
+        if c in delimiteurs or regex:
+            j = i + 1
+            dans_classe = False
+            while j < n:
+                if source[j] == '\\':
+                    j += 2
+                    continue
+                if regex:
+                    if source[j] == '[':
+                        dans_classe = True
+                    elif source[j] == ']':
+                        dans_classe = False
+                    elif source[j] == '/' and not dans_classe:
+                        break
+                    elif source[j] == '\n':
+                        break
+                elif source[j] == c:
+                    break
+                j += 1
+            yield 'code', source[debut:i]
+            yield 'chaine', source[i:j + 1]
+            i = debut = j + 1
+            precedent = ')'
+            continue
+        if not c.isspace():
+            precedent = c
+        i += 1
+    yield 'code', source[debut:]
+
+
+def minifier_css(source: str) -> str:
+    morceaux = []
+    for nature, texte in _segments(source, javascript=False):
+        if nature == 'commentaire':
+            continue
+        if nature == 'code':
+            texte = re.sub(r'\s+', ' ', texte)
+            texte = re.sub(r'\s*([{};,>])\s*', r'\1', texte)
+            texte = texte.replace(';}', '}')
+        morceaux.append(texte)
+    return ''.join(morceaux).strip() + '\n'
+
+
+def minifier_js(source: str) -> str:
+    """Retire commentaires, indentation et lignes vides; les fins de ligne sont gardées (ASI)"""
+    morceaux, code = [], []
+
+    def vider_code():
+        texte = ''.join(code).replace('\r\n', '\n')
+        texte = re.sub(r'[ \t]*\n\s*', '\n', texte)
+        morceaux.append(re.sub(r'[ \t]+', ' ', texte))
+        code.clear()
+
+    for nature, texte in _segments(source, javascript=True):
+        if nature == 'chaine':
+            vider_code()
+            morceaux.append(texte)
+        elif nature == 'commentaire':
+            # Un commentaire de bloc peut séparer deux instructions : on garde le saut de ligne
+            code.append('\n' if texte.startswith('/*') and '\n' in texte else ' ')
+        else:
+            code.append(texte)
+    vider_code()
+    return ''.join(morceaux).strip() + '\n'
+
+
+MINIFICATEURS = {'.css': minifier_css, '.js': minifier_js}
+
+
+def _empreinte(donnees: bytes) -> str:
+    return hashlib.sha256(donnees).hexdigest()[:10]
+
+
+def _ecrire(chemin: str, donnees: bytes):
+    with open(chemin, 'wb') as fichier:
+        fichier.write(donnees)
+    if chemin.endswith(TYPES_PRECOMPRESSES):
+        with open(chemin + '.gz', 'wb') as fichier:
+            fichier.write(gzip.compress(donnees, compresslevel=9, mtime=0))
+
+
+def _verifier_sortie(sortie: str):
+    # Jamais de suppression ni d'écriture dans un dossier qui n'a pas été produit ici
+    if not os.path.exists(sortie):
+        return
+    if not os.path.isdir(sortie):
+        raise ErreurConstruction(f"{sortie} n'est pas un dossier")
+    contenu = set(os.listdir(sortie))
+    if contenu and POINTEUR not in contenu:
+        raise ErreurConstruction(f"{sortie} n'est pas vide et ne contient pas de construction ({POINTEUR})")
+
+
+def version_courante(dossier: str) -> Optional[str]:
+    """Dossier de la version publiée, ou None si rien n'a encore été construit"""
+    try:
+        with open(os.path.join(dossier, POINTEUR), 'r', encoding='utf-8') as fichier:
+            return os.path.join(dossier, 'versions', json.load(fichier)['version'])
+    except FileNotFoundError:
+        return None
+
+
+def _reprendre_assets(precedente: Optional[str], dossier_assets: str) -> Dict[str, str]:
+    """Recopie les ressources de la version précédente (pages encore en cache chez les clients)"""
+    if precedente is None:
+        return {}
+    with open(os.path.join(precedente, 'manifest.json'), 'r', encoding='utf-8') as fichier:
+        assets = json.load(fichier)['assets']
+    for nom_empreinte in assets.values():
+        for nom in (nom_empreinte, nom_empreinte + '.gz'):
+            source = os.path.join(precedente, 'assets', nom)
+            if os.path.exists(source) and not os.path.exists(os.path.join(dossier_assets, nom)):
+                shutil.copy2(source, dossier_assets)
+    return assets
+
+
+def _publier(sortie: str, version: str):
+    # Remplacement atomique du pointeur : les lecteurs voient l'ancienne ou la nouvelle version
+    temporaire = os.path.join(sortie, POINTEUR + '.tmp')
+    with open(temporaire, 'w', encoding='utf-8') as fichier:
+        json.dump({'version': version}, fichier)
+    os.replace(temporaire, os.path.join(sortie, POINTEUR))
+
+
+def _purger_versions(sortie: str, courante: str):
+    dossier_versions = os.path.join(sortie, 'versions')
+    versions = sorted(nom for nom in os.listdir(dossier_versions)
+                      if os.path.exists(os.path.join(dossier_versions, nom, 'manifest.json')))
+    for nom in versions[:-CONSERVER_VERSIONS]:
+        if nom != courante:
+            shutil.rmtree(os.path.join(dossier_versions, nom), ignore_errors=True)
+
+
+def construire(sortie: str, racine: str = RACINE) -> Dict:
+    """Construit une nouvelle version des pages et ressources dans sortie, la publie et retourne son manifeste"""
+    from flask import url_for
+
+    from app import create_app
+
+    _verifier_sortie(sortie)
+    precedente = version_courante(sortie)
+    dossier_versions = os.path.join(sortie, 'versions')
+    os.makedirs(dossier_versions, exist_ok=True)
+    dossier_version = tempfile.mkdtemp(prefix=time.strftime('%Y%m%dT%H%M%S-'), dir=dossier_versions)
+    # mkdtemp crée le dossier en 0700 : il doit rester lisible par le serveur
+    os.chmod(dossier_version, 0o755)
+    version = os.path.basename(dossier_version)
+    dossier_assets = os.path.join(dossier_version, 'assets')
+    dossier_pages = os.path.join(dossier_version, 'pages')
+    os.makedirs(dossier_assets)
+    os.makedirs(dossier_pages)
+
+    # Ressources référencées par les gabarits : minifiées puis nommées d'après leur contenu
+    references = set()
+    for gabarit in PAGES.values():
+        with open(os.path.join(racine, gabarit), 'r', encoding='utf-8') as fichier:
+            references.update(MOTIF_RESSOURCE.findall(fichier.read()))
+
+    assets, tailles = {}, {}
+    for nom in sorted(references):
+        with open(os.path.join(racine, nom), 'rb') as fichier:
+            donnees = fichier.read()
+        base, extension = os.path.splitext(nom)
+        minificateur = MINIFICATEURS.get(extension)
+        if minificateur:
+            texte = minificateur(donnees.decode('utf-8'))
+            tailles[nom] = {'source': len(donnees), 'minifie': len(texte.encode('utf-8'))}
+            donnees = texte.encode('utf-8')
+        nom_empreinte = f'{base}.{_empreinte(donnees)}{extension}'
+        _ecrire(os.path.join(dossier_assets, nom_empreinte), donnees)
+        assets[nom] = nom_empreinte
+    precedents = sorted(set(_reprendre_assets(precedente, dossier_assets).values()) - set(assets.values()))
+
+    # Pages rendues une fois, avec les URL des ressources empreintées
+    app = create_app({'DOSSIER_STATIQUE': None})
+    app.template_folder = racine
+
+    def url_for_construction(endpoint, **valeurs):
+        if endpoint == 'static':
+            return f"{PREFIXE_ASSETS}/{assets[valeurs['filename']]}"
+        return url_for(endpoint, **valeurs)
+
+    pages = {}
+    with app.test_request_context('/'):
+        app.jinja_env.globals['url_for'] = url_for_construction
+        environnement = app.jinja_env
+        for endpoint, gabarit in PAGES.items():
+            html = environnement.get_template(gabarit).render().encode('utf-8')
+            _ecrire(os.path.join(dossier_pages, gabarit), html)
+            pages[endpoint] = {'fichier': gabarit, 'etag': _empreinte(html)}
+
+    manifeste = {
+        'version': version,
+        'construit_le': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'prefixe_assets': PREFIXE_ASSETS,
+        'assets': assets,
+        'assets_precedents': precedents,
+        'pages': pages,
+        'minification': tailles
+    }
+    with open(os.path.join(dossier_version, 'manifest.json'), 'w', encoding='utf-8') as fichier:
+        json.dump(manifeste, fichier, ensure_ascii=False, indent=2)
+
+    _publier(sortie, version)
+    _purger_versions(sortie, version)
+    return manifeste
+
+
+def _gzip_accepte(request) -> bool:
+    acceptes = encodages_acceptes(request.headers.get('Accept-Encoding', ''))
+    return acceptes.get('gzip', acceptes.get('*', 0.0)) > 0
+
+
+class ServeurStatique:
+    """Pages pré-rendues (gardées en mémoire) et ressources empreintées d'un dossier construit"""
+
+    def __init__(self, dossier: str):
+        # Version lue une fois : une construction ultérieure ne modifie pas ce qui est servi
+        self.dossier = version_courante(dossier)
+        if self.dossier is None:
+            raise ErreurConstruction(f"Aucune construction publiée dans {dossier} ({POINTEUR} absent)")
+        with open(os.path.join(self.dossier, 'manifest.json'), 'r', encoding='utf-8') as fichier:
+            self.manifeste = json.load(fichier)
+        self.fichiers_assets = set(self.manifeste['assets'].values()) | set(self.manifeste.get('assets_precedents', []))
+        self._pages = {}
+        for endpoint, page in self.manifeste['pages'].items():
+            chemin = os.path.join(self.dossier, 'pages', page['fichier'])
+            with open(chemin, 'rb') as fichier:
+                brut = fichier.read()
+            compresse = None
+            if os.path.exists(chemin + '.gz'):
+                with open(chemin + '.gz', 'rb') as fichier:
+                    compresse = fichier.read()
+            self._pages[endpoint] = (brut, compresse, page['etag'])
+
+    def page(self, endpoint: str, statut: int = 200):
+        from flask import Response, request
+
+        brut, compresse, etag = self._pages[endpoint]
+        gzip_accepte = compresse is not None and _gzip_accepte(request)
+        reponse = Response(compresse if gzip_accepte else brut, status=statut, mimetype='text/html')
+        if gzip_accepte:
+            reponse.headers['Content-Encoding'] = 'gzip'
+        reponse.vary.add('Accept-Encoding')
+        reponse.set_etag(etag, weak=True)
+        reponse.headers['Cache-Control'] = CACHE_PAGES
+        return reponse.make_conditional(request) if statut == 200 else reponse
+
+    def vue_page(self, endpoint: str):
+        def vue():
+            return self.page(endpoint)
+        vue.__name__ = endpoint
+        return vue
+
+    def asset(self, nom: str):
+        from flask import abort, request, send_from_directory
+
+        if nom not in self.fichiers_assets:
+            abort(404)
+        dossier = os.path.join(self.dossier, 'assets')
+        if _gzip_accepte(request) and os.path.exists(os.path.join(dossier, nom + '.gz')):
+            reponse = send_from_directory(dossier, nom + '.gz', mimetype=_type_mime(nom))
+            reponse.headers['Content-Encoding'] = 'gzip'
+        else:
+            reponse = send_from_directory(dossier, nom)
+        reponse.vary.add('Accept-Encoding')
+        reponse.headers['Cache-Control'] = CACHE_IMMUABLE
+        return reponse
+
+
+def _type_mime(nom: str) -> Optional[str]:
+    import mimetypes
+    return mimetypes.guess_type(nom)[0]
+
+
+def installer(app, dossier: str) -> ServeurStatique:
+    """Remplace les vues des pages statiques et ajoute /assets/ (noms d'endpoint inchangés)"""
+    serveur = ServeurStatique(dossier)
+    for endpoint in serveur.manifeste['pages']:
+        if endpoint in app.view_functions:
+            app.view_functions[endpoint] = serveur.vue_page(endpoint)
+    app.add_url_rule(f'{PREFIXE_ASSETS}/<path:nom>', 'asset', serveur.asset)
+    if '404' in serveur.manifeste['pages']:
+        app.register_error_handler(404, lambda e: serveur.page('404', 404))
+    app.extensions['statique'] = serveur
+    return serveur
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pré-rend les pages et empreinte les ressources statiques")
+    parser.add_argument('--sortie', default=os.path.join(RACINE, 'build'), help="Dossier de sortie")
+    args = parser.parse_args(argv)
+
+    debut = time.perf_counter()
+    try:
+        manifeste = construire(args.sortie)
+    except ErreurConstruction as e:
+        parser.error(str(e))
+    for nom, tailles in manifeste['minification'].items():
+        print(f"📦 {nom}: {tailles['source']} -> {tailles['minifie']} octets ({manifeste['assets'][nom]})")
+    print(f"✅ {len(manifeste['pages'])} pages et {len(manifeste['assets'])} ressources construites "
+          f"dans {args.sortie}, version {manifeste['version']} publiée ({time.perf_counter() - debut:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
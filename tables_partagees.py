@@ -0,0 +1,303 @@
+"""
+Tables de référence en lecture seule partagées entre processus.
+
+Les tables (statistiques sectorielles, exemples, préréglages) sont écrites une
+fois dans un fichier binaire compact puis projetées en mémoire (mmap) par
+chaque worker : les pages sont partagées par le noyau au lieu d'être
+dupliquées dans chaque processus.
+
+Format du fichier :
+    8 octets   signature MAGIQUE
+    4 octets   longueur de l'entête JSON (little-endian)
+    n octets   entête JSON (méta, colonnes et décalages de chaque table), complété à 8 octets
+    m × 8      valeurs numériques float64, une matrice lignes × colonnes par table
+    annexe     clés et textes (JSON par ligne) en UTF-8, index des clés triées, index des textes
+
+Seul l'entête, de taille indépendante du nombre de lignes, est décodé par
+chaque worker. Les clés sont cherchées par dichotomie directement dans le
+fichier et une ligne est une vue (LigneTable) qui lit ses cellules à la
+demande : aucune copie des tables n'est conservée dans les processus.
+
+Le fichier est régénéré dans un fichier temporaire puis publié par
+os.replace : un lecteur voit soit l'ancienne version complète, soit la nouvelle.
+"""
+import json
+import math
+import mmap
+import os
+import struct
+import tempfile
+import time
+from array import array
+from collections.abc import Mapping
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows : pas de verrou inter-processus
+    fcntl = None
+
+MAGIQUE = b'ERPTAB02'
+_ENTETE = struct.Struct('<8sI')
+# Index des clés (triées) : décalage et longueur de la clé, position de la ligne
+_INDEX = struct.Struct('<III')
+# Index des textes (par position) : décalage et longueur du JSON de la ligne
+_TEXTE = struct.Struct('<II')
+
+
+def _numerique(valeur) -> bool:
+    return isinstance(valeur, (int, float)) and not isinstance(valeur, bool)
+
+
+def ecrire_tables(chemin: str, tables: Dict[str, Dict[str, Dict]], meta: Optional[Dict] = None):
+    """Sérialise les tables {nom: {cle_ligne: {colonne: valeur}}} puis publie le fichier atomiquement"""
+    entete = {'meta': meta or {}, 'tables': {}}
+    valeurs = array('d')
+    annexe = bytearray()
+
+    for nom, lignes in tables.items():
+        cles = list(lignes)
+        colonnes = sorted({colonne for ligne in lignes.values()
+                           for colonne, valeur in ligne.items() if _numerique(valeur)})
+        entiers = [colonne for colonne in colonnes
+                   if all(isinstance(ligne.get(colonne, 0), int) for ligne in lignes.values())]
+        debut_valeurs = len(valeurs)
+        for cle in cles:
+            ligne = lignes[cle]
+            valeurs.extend(float(ligne.get(colonne, math.nan)) for colonne in colonnes)
+
+        # Clés et textes d'abord, puis leurs index (décalages relatifs au début de l'annexe)
+        encodees = [cle.encode('utf-8') for cle in cles]
+        textes = [json.dumps({colonne: valeur for colonne, valeur in lignes[cle].items() if not _numerique(valeur)},
+                             ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                  for cle in cles]
+        decalages_cles, decalages_textes = [], []
+        for donnees, decalages in ((encodees, decalages_cles), (textes, decalages_textes)):
+            for element in donnees:
+                decalages.append(len(annexe))
+                annexe += element
+        debut_index = len(annexe)
+        for position in sorted(range(len(cles)), key=encodees.__getitem__):
+            annexe += _INDEX.pack(decalages_cles[position], len(encodees[position]), position)
+        debut_textes = len(annexe)
+        for decalage, texte in zip(decalages_textes, textes):
+            annexe += _TEXTE.pack(decalage, len(texte))
+
+        entete['tables'][nom] = {
+            'colonnes': colonnes,
+            'entiers': entiers,
+            'lignes': len(cles),
+            'valeurs': debut_valeurs,
+            'index': debut_index,
+            'textes': debut_textes
+        }
+    entete['nombre_valeurs'] = len(valeurs)
+
+    if valeurs.itemsize != 8 or struct.pack('=d', 1.0) != struct.pack('<d', 1.0):
+        raise RuntimeError("Format float64 little-endian requis")
+
+    donnees_entete = json.dumps(entete, ensure_ascii=False).encode('utf-8')
+    donnees_entete += b' ' * (-(_ENTETE.size + len(donnees_entete)) % 8)
+
+    dossier = os.path.dirname(os.path.abspath(chemin))
+    descripteur, temporaire = tempfile.mkstemp(dir=dossier, prefix='.tables-')
+    try:
+        with os.fdopen(descripteur, 'wb') as fichier:
+            fichier.write(_ENTETE.pack(MAGIQUE, len(donnees_entete)))
+            fichier.write(donnees_entete)
+            fichier.write(valeurs.tobytes())
+            fichier.write(annexe)
+            fichier.flush()
+            os.fsync(fichier.fileno())
+        os.chmod(temporaire, 0o644)
+        os.replace(temporaire, chemin)
+    except BaseException:
+        if os.path.exists(temporaire):
+            os.remove(temporaire)
+        raise
+
+
+class _Table:
+    """Description d'une table (taille indépendante du nombre de lignes)"""
+    __slots__ = ('colonnes', 'rangs', 'entiers', 'lignes', 'valeurs', 'index', 'textes')
+
+    def __init__(self, description: Dict):
+        self.colonnes = description['colonnes']
+        self.rangs = {colonne: rang for rang, colonne in enumerate(self.colonnes)}
+        self.entiers = frozenset(description['entiers'])
+        self.lignes = description['lignes']
+        self.valeurs = description['valeurs']
+        self.index = description['index']
+        self.textes = description['textes']
+
+
+class LigneTable(Mapping):
+    """Ligne d'une table, lue dans le fichier projeté à chaque accès (aucune copie conservée)"""
+    __slots__ = ('_projection', '_table', '_position', '_textes')
+
+    def __init__(self, projection: '_Projection', table: _Table, position: int):
+        self._projection = projection
+        self._table = table
+        self._position = position
+        self._textes = None
+
+    def _numerique(self, rang: int) -> float:
+        return self._projection.valeurs[self._table.valeurs + self._position * len(self._table.colonnes) + rang]
+
+    def _lire_textes(self) -> Dict:
+        if self._textes is None:
+            self._textes = self._projection.textes(self._table, self._position)
+        return self._textes
+
+    def __getitem__(self, colonne: str):
+        rang = self._table.rangs.get(colonne)
+        if rang is not None:
+            valeur = self._numerique(rang)
+            if not math.isnan(valeur):
+                return int(valeur) if colonne in self._table.entiers else valeur
+        return self._lire_textes()[colonne]
+
+    def __iter__(self) -> Iterator[str]:
+        for rang, colonne in enumerate(self._table.colonnes):
+            if not math.isnan(self._numerique(rang)):
+                yield colonne
+        yield from self._lire_textes()
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+
+class _Projection:
+    """Fichier de tables projeté en mémoire (une version donnée)"""
+    __slots__ = ('signature', 'meta', 'tables', 'valeurs', '_annexe', '_mmap')
+
+    def __init__(self, chemin: str):
+        with open(chemin, 'rb') as fichier:
+            stat = os.fstat(fichier.fileno())
+            self._mmap = mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        self.signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magique, longueur = _ENTETE.unpack_from(self._mmap, 0)
+        if magique != MAGIQUE:
+            raise ValueError(f"Fichier de tables invalide: {chemin}")
+        debut = _ENTETE.size + longueur
+        entete = json.loads(bytes(self._mmap[_ENTETE.size:debut]).decode('utf-8'))
+
+        self.meta = entete['meta']
+        self.tables = {nom: _Table(description) for nom, description in entete['tables'].items()}
+        fin_valeurs = debut + entete['nombre_valeurs'] * 8
+        # Vue sans copie sur les valeurs numériques
+        self.valeurs = memoryview(self._mmap)[debut:fin_valeurs].cast('d')
+        self._annexe = fin_valeurs
+
+    def _octets(self, decalage: int, longueur: int) -> bytes:
+        debut = self._annexe + decalage
+        return self._mmap[debut:debut + longueur]
+
+    def position(self, table: _Table, cle: str) -> Optional[int]:
+        """Position de la ligne par dichotomie sur l'index des clés triées"""
+        recherchee = cle.encode('utf-8')
+        bas, haut = 0, table.lignes
+        while bas < haut:
+            milieu = (bas + haut) // 2
+            decalage, longueur, position = _INDEX.unpack_from(self._mmap, self._annexe + table.index + milieu * _INDEX.size)
+            courante = self._octets(decalage, longueur)
+            if courante < recherchee:
+                bas = milieu + 1
+            elif courante > recherchee:
+                haut = milieu
+            else:
+                return position
+        return None
+
+    def textes(self, table: _Table, position: int) -> Dict:
+        decalage, longueur = _TEXTE.unpack_from(self._mmap, self._annexe + table.textes + position * _TEXTE.size)
+        return json.loads(self._octets(decalage, longueur).decode('utf-8'))
+
+    def ligne(self, nom: str, cle: str) -> Optional[LigneTable]:
+        table = self.tables.get(nom)
+        if table is None:
+            return None
+        position = self.position(table, cle)
+        return LigneTable(self, table, position) if position is not None else None
+
+    def lignes(self, nom: str) -> List[LigneTable]:
+        table = self.tables.get(nom)
+        if table is None:
+            return []
+        return [LigneTable(self, table, position) for position in range(table.lignes)]
+
+
+class TablesPartagees:
+    """Accès en lecture aux tables partagées, reprojetées quand le fichier est régénéré"""
+
+    def __init__(self, chemin: str, intervalle_verification: float = 2.0):
+        self.chemin = chemin
+        self.intervalle_verification = intervalle_verification
+        self._projection = None
+        self._prochaine_verification = 0.0
+
+    def _courante(self) -> Optional[_Projection]:
+        if time.monotonic() >= self._prochaine_verification:
+            self.recharger()
+        return self._projection
+
+    def recharger(self) -> bool:
+        """Reprojette le fichier s'il a été remplacé; retourne True en cas de changement"""
+        self._prochaine_verification = time.monotonic() + self.intervalle_verification
+        try:
+            stat = os.stat(self.chemin)
+        except FileNotFoundError:
+            return False
+
+        projection = self._projection
+        if projection is not None and projection.signature == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return False
+
+        try:
+            nouvelle = _Projection(self.chemin)
+        except (OSError, ValueError) as e:
+            print(f"❌ Tables partagées illisibles ({self.chemin}): {e}")
+            return False
+
+        # L'ancienne projection est libérée quand plus aucune requête ne l'utilise
+        self._projection = nouvelle
+        return True
+
+    @property
+    def meta(self) -> Dict:
+        projection = self._courante()
+        return projection.meta if projection else {}
+
+    def ligne(self, nom: str, cle: str) -> Optional[LigneTable]:
+        projection = self._courante()
+        return projection.ligne(nom, cle) if projection else None
+
+    def lignes(self, nom: str) -> List[LigneTable]:
+        """Lignes de la table dans l'ordre d'écriture"""
+        projection = self._courante()
+        return projection.lignes(nom) if projection else []
+
+    def publier(self, construire: Callable[[], Dict], meta: Dict,
+                a_jour: Optional[Callable[[Dict], bool]] = None) -> bool:
+        """Régénère le fichier sauf s'il est à jour (métadonnées égales par défaut); un seul processus à la fois"""
+        a_jour = a_jour or meta.__eq__
+        projection = self._courante()
+        if projection is not None and a_jour(projection.meta):
+            return False
+
+        with open(self.chemin + '.lock', 'a') as verrou:
+            if fcntl is not None:
+                fcntl.flock(verrou, fcntl.LOCK_EX)
+            try:
+                # Un autre worker a pu publier la même version pendant l'attente du verrou
+                self.recharger()
+                if self._projection is not None and a_jour(self._projection.meta):
+                    return False
+                ecrire_tables(self.chemin, construire(), meta)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(verrou, fcntl.LOCK_UN)
+
+        self.recharger()
+        return True
@@ -0,0 +1,165 @@
+"""
+Validation et conversion des demandes de calcul.
+
+Le schéma est compilé une seule fois avec msgspec à partir des paramètres du
+modèle de coûts : le corps JSON est décodé, typé et borné en une seule passe.
+Les nombres transmis sous forme de chaîne ("1500") sont convertis, les champs
+inconnus, les valeurs négatives et les pourcentages supérieurs à 100 sont
+rejetés avec le chemin du champ fautif.
+"""
+from typing import Annotated, Dict, List, Literal, Optional, Tuple, Union
+
+import msgspec
+
+from config_modele import DEFAUTS_MODELE, PARAMETRES_POURCENTAGES
+
+# Bornes communes à tous les montants et volumes
+VALEUR_MAX = 1e15
+Montant = Annotated[float, msgspec.Meta(ge=0, le=VALEUR_MAX)]
+Pourcentage = Annotated[float, msgspec.Meta(ge=0, le=100)]
+Effectif = Annotated[int, msgspec.Meta(ge=0, le=10_000_000)]
+Texte = Annotated[str, msgspec.Meta(min_length=1, max_length=200)]
+IdentifiantScenario = Annotated[str, msgspec.Meta(pattern='^[0-9a-f]{64}$')]
+
+
+class ErreurValidation(ValueError):
+    """Demande de calcul invalide"""
+
+
+# Un champ optionnel par paramètre du modèle : les champs absents restent UNSET
+Parametres = msgspec.defstruct(
+    'Parametres',
+    [(cle, Union[Pourcentage if cle in PARAMETRES_POURCENTAGES else Montant, msgspec.UnsetType], msgspec.UNSET)
+     for cle in DEFAUTS_MODELE],
+    forbid_unknown_fields=True
+)
+
+
+class DemandeCalcul(msgspec.Struct, forbid_unknown_fields=True):
+    nom_entreprise: Texte
+    secteur: Texte
+    taille: Texte
+    chiffre_affaires: Montant
+    nombre_employes: Effectif
+    parametres: Parametres = msgspec.field(default_factory=Parametres)
+
+    def parametres_dict(self) -> Dict:
+        """Paramètres explicitement fournis (les valeurs entières restent des entiers)"""
+        return {
+            cle: int(valeur) if valeur.is_integer() else valeur
+            for cle, valeur in msgspec.structs.asdict(self.parametres).items()
+            if valeur is not msgspec.UNSET
+        }
+
+
+class OptionsSimulation(msgspec.Struct, forbid_unknown_fields=True):
+    iterations: Annotated[int, msgspec.Meta(ge=1, le=100_000)] = 2000
+    variabilite: Annotated[float, msgspec.Meta(ge=0, le=1)] = 0.2
+    graine: Optional[int] = None
+
+
+class OptionsBalayage(msgspec.Struct, forbid_unknown_fields=True):
+    parametre: Literal[tuple(DEFAUTS_MODELE)]
+    valeurs: Annotated[List[Montant], msgspec.Meta(min_length=1, max_length=1000)]
+
+
+class DemandeJob(msgspec.Struct, forbid_unknown_fields=True):
+    type: Literal['simulation', 'balayage']
+    demande: DemandeCalcul
+    simulation: OptionsSimulation = msgspec.field(default_factory=OptionsSimulation)
+    balayage: Optional[OptionsBalayage] = None
+
+
+class ReferenceScenario(msgspec.Struct, forbid_unknown_fields=True):
+    """Scénario déjà calculé, désigné par son identifiant dans le magasin"""
+    scenario_id: IdentifiantScenario
+
+
+class DemandeComparaison(msgspec.Struct, forbid_unknown_fields=True):
+    # Chaque élément est une demande de calcul ou une ReferenceScenario
+    reference: msgspec.Raw
+    variantes: Annotated[List[msgspec.Raw], msgspec.Meta(min_length=1, max_length=100)]
+
+
+_decodeur_demande = msgspec.json.Decoder(DemandeCalcul, strict=False)
+_decodeur_reference = msgspec.json.Decoder(ReferenceScenario)
+_decodeur_comparaison = msgspec.json.Decoder(DemandeComparaison)
+_decodeur_job = msgspec.json.Decoder(DemandeJob, strict=False)
+_decodeur_lot = msgspec.json.Decoder(List[msgspec.Raw])
+_decodeur_champs = msgspec.json.Decoder(Dict[str, msgspec.Raw])
+
+
+def _message(erreur: Exception) -> str:
+    return f"Données invalides: {erreur}"
+
+
+def decoder_demande(donnees: bytes) -> DemandeCalcul:
+    """Décode et valide le corps JSON d'une demande de calcul"""
+    try:
+        return _decodeur_demande.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise ErreurValidation(_message(e)) from e
+
+
+def decoder_job(donnees: bytes) -> DemandeJob:
+    """Décode et valide une demande de job (simulation ou balayage)"""
+    try:
+        job = _decodeur_job.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise ErreurValidation(_message(e)) from e
+    if job.type == 'balayage' and job.balayage is None:
+        raise ErreurValidation("Données invalides: options de balayage manquantes - at `$.balayage`")
+    if job.balayage is not None and job.balayage.parametre in PARAMETRES_POURCENTAGES:
+        # Le type des valeurs balayées dépend du paramètre choisi : borne vérifiée après décodage
+        for index, valeur in enumerate(job.balayage.valeurs):
+            if valeur > 100:
+                raise ErreurValidation(f"Données invalides: Expected `float` <= 100.0 - at `$.balayage.valeurs[{index}]`")
+    return job
+
+
+def decoder_lot(donnees: bytes) -> Tuple[List[DemandeCalcul], List[Dict]]:
+    """Décode un tableau JSON de demandes; les lignes invalides sont rapportées individuellement"""
+    try:
+        lignes = _decodeur_lot.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise ErreurValidation(_message(e)) from e
+
+    demandes, erreurs = [], []
+    decoder = _decodeur_demande.decode
+    for index, ligne in enumerate(lignes):
+        try:
+            demandes.append(decoder(ligne))
+        except (msgspec.ValidationError, msgspec.DecodeError) as e:
+            erreurs.append({'ligne': index, 'error': _message(e)})
+    return demandes, erreurs
+
+
+def _decoder_scenario(donnees: bytes, chemin: str) -> Union[ReferenceScenario, DemandeCalcul]:
+    try:
+        return _decodeur_reference.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        erreur_reference = e
+    try:
+        # Un objet portant scenario_id est une référence : son erreur est celle à rapporter
+        reference = 'scenario_id' in _decodeur_champs.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError):
+        reference = False
+    if reference:
+        raise ErreurValidation(f"Données invalides ({chemin}): {erreur_reference}") from erreur_reference
+    try:
+        return _decodeur_demande.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise ErreurValidation(f"Données invalides ({chemin}): {e}") from e
+
+
+def decoder_comparaison(donnees: bytes) -> Tuple[Union[ReferenceScenario, DemandeCalcul],
+                                                 List[Union[ReferenceScenario, DemandeCalcul]]]:
+    """Décode une comparaison : un scénario de référence et ses variantes"""
+    try:
+        comparaison = _decodeur_comparaison.decode(donnees)
+    except (msgspec.ValidationError, msgspec.DecodeError) as e:
+        raise ErreurValidation(_message(e)) from e
+    reference = _decoder_scenario(comparaison.reference, '$.reference')
+    variantes = [_decoder_scenario(variante, f'$.variantes[{index}]')
+                 for index, variante in enumerate(comparaison.variantes)]
+    return reference, variantes